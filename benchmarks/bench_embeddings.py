@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latencia de cola del cliente de embeddings (embedding_client.py)
+
+Levanta el servidor falso de OpenAI (fake_services.py) con latencia log-normal y una
+fracción de respuestas rezagadas, y compara el mismo workload con distintos modos:
+    - plain:  sin hedging (un request por llamada, solo reintentos)
+    - hedged: request duplicado después del percentil configurado
+
+Reporta p50/p95/p99, llamadas que excedieron el deadline y la amplificación de carga
+(intentos por llamada) de cada modo.
+
+Uso:
+    python benchmarks/bench_embeddings.py [--calls 400] [--concurrency 8]
+                                          [--latency-ms 120] [--slow-rate 0.03] [--slow-ms 2000]
+                                          [--budget-ms 0] [--output resultados.json]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+from synthetic import run_metadata, summarize_latencies, write_results
+from loadtest import BENCH_DIR, _free_port, _wait_http
+
+import embedding_client  # noqa: E402  (src/api está en sys.path vía synthetic)
+from embedding_client import EmbeddingClient, EmbeddingDeadlineExceeded
+
+
+def run_mode(base_url: str, mode: str, args) -> Dict[str, Any]:
+    """Ejecutar el workload completo con un cliente nuevo en el modo indicado"""
+    embedding_client.EMBEDDING_HEDGE = mode == "hedged"
+    embedding_client.EMBEDDING_HEDGE_PERCENTILE = args.hedge_percentile
+    embedding_client.EMBEDDING_HEDGE_MAX_RATIO = args.hedge_max_ratio
+    client = EmbeddingClient("sk-fake", args.model, base_url=base_url)
+
+    def call(i: int):
+        start = time.perf_counter()
+        deadline = time.monotonic() + args.budget_ms / 1000 if args.budget_ms else None
+        try:
+            client.embed_query(f"consulta de prueba {mode} {i}", deadline=deadline)
+            ok = True
+        except EmbeddingDeadlineExceeded:
+            ok = False
+        return (time.perf_counter() - start) * 1000, ok
+
+    # Calentamiento: llena la ventana de latencias usada para calcular la demora de hedging
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(call, range(args.warmup)))
+    warm_stats = client.stats()
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        outcomes = list(executor.map(call, range(args.warmup, args.warmup + args.calls)))
+
+    stats = client.stats()
+    latencies = [ms for ms, ok in outcomes if ok]
+    calls = stats["calls"] - warm_stats["calls"]
+    attempts = stats["attempts"] - warm_stats["attempts"]
+    return {
+        "benchmark": "embed_query",
+        "params": {
+            "mode": mode,
+            "concurrency": args.concurrency,
+            "latency_ms": args.latency_ms,
+            "slow_rate": args.slow_rate,
+            "slow_ms": args.slow_ms,
+            "budget_ms": args.budget_ms,
+        },
+        "latency_ms": summarize_latencies(latencies),
+        "deadline_exceeded": sum(1 for _, ok in outcomes if not ok),
+        "attempts_per_call": round(attempts / calls, 3) if calls else 0.0,
+        "hedges": stats["hedges"] - warm_stats["hedges"],
+        "hedge_wins": stats["hedge_wins"] - warm_stats["hedge_wins"],
+        "retries": stats["retries"] - warm_stats["retries"],
+        "hedge_delay_ms": stats["hedge_delay_ms"],
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Latencia de cola del cliente de embeddings")
+    parser.add_argument("--calls", type=int, default=400, help="Llamadas medidas por modo")
+    parser.add_argument("--warmup", type=int, default=50, help="Llamadas de calentamiento por modo")
+    parser.add_argument("--concurrency", type=int, default=8, help="Llamadas concurrentes")
+    parser.add_argument("--modes", default="plain,hedged", help="Modos a comparar")
+    parser.add_argument("--model", default="text-embedding-3-large")
+    parser.add_argument("--budget-ms", type=float, default=0.0, help="Deadline por llamada (0 = EMBEDDING_TIMEOUT)")
+    parser.add_argument("--hedge-percentile", type=float, default=embedding_client.EMBEDDING_HEDGE_PERCENTILE)
+    parser.add_argument("--hedge-max-ratio", type=float, default=embedding_client.EMBEDDING_HEDGE_MAX_RATIO)
+    # OpenAI falso
+    parser.add_argument("--latency-ms", type=float, default=120.0, help="Latencia mediana del OpenAI falso")
+    parser.add_argument("--sigma", type=float, default=0.3, help="Dispersión log-normal de la latencia")
+    parser.add_argument("--slow-rate", type=float, default=0.03, help="Fracción de respuestas rezagadas")
+    parser.add_argument("--slow-ms", type=float, default=2000.0, help="Latencia extra de las rezagadas")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Tasa de errores 5xx")
+    parser.add_argument("--rpm", type=int, default=0, help="Límite de requests por minuto")
+    parser.add_argument("--output", default="-", help="Archivo JSON de salida ('-' para stdout)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    port = _free_port()
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "fake_services.py"), "openai",
+        "--port", str(port),
+        "--latency-ms", str(args.latency_ms),
+        "--sigma", str(args.sigma),
+        "--per-input-ms", "0",
+        "--slow-rate", str(args.slow_rate),
+        "--slow-ms", str(args.slow_ms),
+        "--error-rate", str(args.error_rate),
+        "--rpm", str(args.rpm),
+    ], cwd=BENCH_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    results: List[Dict[str, Any]] = []
+    try:
+        if not _wait_http(f"http://127.0.0.1:{port}/stats"):
+            print("❌ Error: el servidor falso de OpenAI no inició")
+            sys.exit(1)
+        base_url = f"http://127.0.0.1:{port}/v1"
+
+        for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+            print(f"⏱️  {mode}: {args.calls} llamadas, concurrencia {args.concurrency}")
+            results.append(run_mode(base_url, mode, args))
+    finally:
+        fake.terminate()
+        fake.wait(timeout=10)
+
+    print(f"\n{'modo':<8} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'intentos/llamada':>17} {'hedges':>7} {'ganados':>8} {'deadline':>9}")
+    for entry in results:
+        lat = entry["latency_ms"]
+        print(f"{entry['params']['mode']:<8} {lat['p50']:>7.1f}ms {lat['p95']:>7.1f}ms {lat['p99']:>7.1f}ms "
+              f"{lat['max']:>7.1f}ms {entry['attempts_per_call']:>17.2f} {entry['hedges']:>7} "
+              f"{entry['hedge_wins']:>8} {entry['deadline_exceeded']:>9}")
+
+    write_results(args.output, {"meta": run_metadata(), "results": results})
+
+
+if __name__ == "__main__":
+    main()
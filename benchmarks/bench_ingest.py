@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Benchmark de ingesta de documentos: uno por uno vs. por lotes (ingestion.py)
+
+Levanta el servidor falso de OpenAI (fake_services.py) y escribe en un ChromaDB en
+memoria los mismos documentos con dos modos:
+    - single: un request de embeddings y un `add` por documento (como el panel Gradio)
+    - bulk:   ingestion.upsert_documents (lotes grandes, en paralelo, upsert en chunks)
+
+Reporta docs/s, tiempo total y requests hechos a OpenAI de cada modo.
+
+Uso:
+    python benchmarks/bench_ingest.py [--docs 2000] [--single-docs 200]
+                                      [--latency-ms 120] [--per-input-ms 0.05]
+                                      [--concurrency 4] [--output resultados.json]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List
+
+from synthetic import create_chroma_client, generate_documents, run_metadata, write_results
+from loadtest import BENCH_DIR, _free_port, _wait_http
+
+import chromadb_client  # noqa: E402  (src/api está en sys.path vía synthetic)
+import ingestion
+from embedding_client import EmbeddingClient
+
+
+def run_single(client, embedder: EmbeddingClient, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Un request a OpenAI y una escritura en ChromaDB por documento"""
+    collection = client.get_or_create_collection(name="bench_ingest_single")
+    started = time.perf_counter()
+    for doc in documents:
+        vector = embedder.embed_documents([doc["document"]], hedge=False)[0]
+        collection.add(ids=[doc["id"]], documents=[doc["document"]], metadatas=[doc["metadata"]], embeddings=[vector])
+    elapsed = time.perf_counter() - started
+    return {"elapsed_s": elapsed, "upserted": len(documents), "batches": len(documents)}
+
+
+def run_bulk(documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Ingesta por lotes con ingestion.upsert_documents"""
+    payload = [{"id": doc["id"], "document": doc["document"], "metadata": doc["metadata"]} for doc in documents]
+    result = ingestion.upsert_documents("bench_ingest_bulk", payload)
+    return {"elapsed_s": result["elapsed_s"], "upserted": result["upserted"], "batches": result["batches"]}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Ingesta uno por uno vs. por lotes")
+    parser.add_argument("--docs", type=int, default=2000, help="Documentos del modo bulk")
+    parser.add_argument("--single-docs", type=int, default=200, help="Documentos del modo single (es lento)")
+    parser.add_argument("--model", default="text-embedding-3-small")
+    parser.add_argument("--batch-inputs", type=int, default=ingestion.EMBEDDING_BATCH_MAX_INPUTS,
+                        help="Documentos por request de embeddings en modo bulk")
+    parser.add_argument("--concurrency", type=int, default=ingestion.EMBEDDING_BATCH_CONCURRENCY,
+                        help="Lotes en paralelo en modo bulk")
+    # OpenAI falso
+    parser.add_argument("--latency-ms", type=float, default=120.0, help="Latencia mediana por request del OpenAI falso")
+    parser.add_argument("--per-input-ms", type=float, default=0.05, help="Latencia extra por input")
+    parser.add_argument("--output", default="-", help="Archivo JSON de salida ('-' para stdout)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    port = _free_port()
+    fake = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, "fake_services.py"), "openai",
+        "--port", str(port),
+        "--latency-ms", str(args.latency_ms),
+        "--per-input-ms", str(args.per_input_ms),
+    ], cwd=BENCH_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    results: List[Dict[str, Any]] = []
+    try:
+        if not _wait_http(f"http://127.0.0.1:{port}/stats"):
+            print("❌ Error: el servidor falso de OpenAI no inició")
+            sys.exit(1)
+        embedder = EmbeddingClient("sk-fake", args.model, base_url=f"http://127.0.0.1:{port}/v1")
+        client = create_chroma_client()
+        chromadb_client.get_connection().use_client(client)
+        chromadb_client.embedding_function = None
+        chromadb_client._embedding_function_ready = True
+        chromadb_client._query_embeddings_instance = embedder
+        ingestion.EMBEDDING_BATCH_MAX_INPUTS = args.batch_inputs
+        ingestion.EMBEDDING_BATCH_CONCURRENCY = args.concurrency
+
+        for mode, size in (("single", args.single_docs), ("bulk", args.docs)):
+            if size <= 0:
+                continue
+            documents = generate_documents(size)
+            print(f"⏱️  {mode}: {size} documentos")
+            before = embedder.stats()["attempts"]
+            outcome = run_single(client, embedder, documents) if mode == "single" else run_bulk(documents)
+            results.append({
+                "benchmark": "ingest",
+                "params": {
+                    "mode": mode,
+                    "docs": size,
+                    "batch_inputs": args.batch_inputs if mode == "bulk" else 1,
+                    "concurrency": args.concurrency if mode == "bulk" else 1,
+                    "latency_ms": args.latency_ms,
+                },
+                "elapsed_s": round(outcome["elapsed_s"], 3),
+                "upserted": outcome["upserted"],
+                "docs_per_second": round(outcome["upserted"] / outcome["elapsed_s"], 1),
+                "openai_requests": embedder.stats()["attempts"] - before,
+            })
+    finally:
+        fake.terminate()
+        fake.wait(timeout=10)
+
+    print(f"\n{'modo':<8} {'docs':>7} {'tiempo':>9} {'docs/s':>9} {'requests OpenAI':>16}")
+    for entry in results:
+        print(f"{entry['params']['mode']:<8} {entry['params']['docs']:>7} {entry['elapsed_s']:>8.2f}s "
+              f"{entry['docs_per_second']:>9.1f} {entry['openai_requests']:>16}")
+
+    write_results(args.output, {"meta": run_metadata(), "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark de las funciones de recuperación de chromadb_client
+
+Genera colecciones sintéticas (tamaño y dimensión configurables) en una instancia
+local de ChromaDB, usa embeddings deterministas en lugar de OpenAI y mide latencia
+y memoria de:
+    - mmr_search (barrido de k, fetch_k y lambda_mult)
+    - get_all_vectors (con y sin embeddings)
+    - get_vectors_by_ids
+
+Uso:
+    python benchmarks/bench_retrieval.py [--sizes 1000,10000] [--dims 384,1536,3072]
+                                         [--k 4,8] [--fetch-k 20,50] [--lambda 0.5]
+                                         [--repeat 20] [--output resultados.json]
+
+Ejemplo (comparar dos commits):
+    python benchmarks/bench_retrieval.py --output bench/antes.json
+    git checkout otra-rama
+    python benchmarks/bench_retrieval.py --output bench/despues.json
+    python benchmarks/compare.py bench/antes.json bench/despues.json
+"""
+import argparse
+import os
+import sys
+import time
+from typing import List
+
+# Evitar que chromadb_client intente conectarse a un ChromaDB real al importarse
+os.environ.setdefault("CHROMA_HOST", "127.0.0.1")
+os.environ.setdefault("CHROMA_PORT", "1")
+
+# Medir el camino completo: sin cachés salvo que se pida --with-cache
+if "--with-cache" not in sys.argv:
+    os.environ["RESULT_CACHE_TTL"] = "0"
+    os.environ["QUERY_EMBEDDING_CACHE_TTL"] = "0"
+    os.environ["RESULT_STALE_TTL"] = "0"
+
+from synthetic import (  # noqa: E402
+    HashEmbeddings,
+    create_chroma_client,
+    generate_documents,
+    generate_queries,
+    install_fake_backend,
+    measure,
+    populate_collection,
+    run_metadata,
+    write_results,
+)
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _float_list(value: str) -> List[float]:
+    return [float(v) for v in value.split(",") if v.strip()]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Micro-benchmark de recuperación sobre ChromaDB")
+    parser.add_argument("--sizes", type=_int_list, default=[1000, 10000], help="Tamaños de colección")
+    parser.add_argument("--dims", type=_int_list, default=[384, 1536, 3072], help="Dimensiones de embedding (384 a 3072)")
+    parser.add_argument("--k", type=_int_list, default=[4, 8], help="Valores de k para mmr_search")
+    parser.add_argument("--fetch-k", type=_int_list, default=[20, 50], help="Valores de fetch_k para mmr_search")
+    parser.add_argument("--lambda", dest="lambdas", type=_float_list, default=[0.5], help="Valores de lambda_mult")
+    parser.add_argument("--ids", type=_int_list, default=[10, 100], help="Cantidad de IDs para get_vectors_by_ids")
+    parser.add_argument("--repeat", type=int, default=20, help="Repeticiones por medición")
+    parser.add_argument("--warmup", type=int, default=2, help="Ejecuciones de calentamiento")
+    parser.add_argument("--with-cache", action="store_true", help="Mantener activas las cachés de embeddings/resultados")
+    parser.add_argument("--skip-all-vectors", action="store_true", help="No medir get_all_vectors")
+    parser.add_argument("--persist-dir", default=None, help="Usar PersistentClient en este directorio")
+    parser.add_argument("--chroma-host", default=None, help="Usar una instancia local de ChromaDB por HTTP")
+    parser.add_argument("--chroma-port", type=int, default=8008, help="Puerto de la instancia HTTP")
+    parser.add_argument("--output", default="-", help="Archivo JSON de salida ('-' para stdout)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    for dim in args.dims:
+        if dim < 384 or dim > 3072:
+            print(f"❌ Error: dimensión {dim} fuera de rango (384 a 3072)")
+            sys.exit(1)
+
+    client = create_chroma_client(args.persist_dir, args.chroma_host, args.chroma_port)
+    queries = generate_queries(max(args.repeat, 1) + args.warmup)
+    results = []
+
+    for size in args.sizes:
+        documents = generate_documents(size)
+        for dim in args.dims:
+            embedder = HashEmbeddings(dimension=dim)
+            chromadb_client = install_fake_backend(client, embedder)
+            collection_name = f"bench_{size}_{dim}"
+
+            print(f"📦 Generando colección {collection_name} ({size} documentos, dim={dim})...")
+            start = time.perf_counter()
+            populate_collection(client, collection_name, documents, embedder)
+            print(f"   Cargada en {time.perf_counter() - start:.1f}s")
+
+            base_params = {"size": size, "dim": dim}
+
+            for k in args.k:
+                for fetch_k in args.fetch_k:
+                    if fetch_k < k:
+                        continue
+                    for lambda_mult in args.lambdas:
+                        print(f"⏱️  mmr_search k={k} fetch_k={fetch_k} lambda={lambda_mult}")
+                        stats = measure(
+                            lambda i: chromadb_client.mmr_search(
+                                collection_name=collection_name,
+                                query=queries[i % len(queries)],
+                                k=k,
+                                fetch_k=fetch_k,
+                                lambda_mult=lambda_mult,
+                                min_score=0.0,
+                            ),
+                            repeat=args.repeat,
+                            warmup=args.warmup,
+                        )
+                        results.append({
+                            "benchmark": "mmr_search",
+                            "params": dict(base_params, k=k, fetch_k=fetch_k, lambda_mult=lambda_mult),
+                            **stats,
+                        })
+
+            if not args.skip_all_vectors:
+                for include_embeddings in (False, True):
+                    print(f"⏱️  get_all_vectors include_embeddings={include_embeddings}")
+                    stats = measure(
+                        lambda i: chromadb_client.get_all_vectors(collection_name, include_embeddings=include_embeddings),
+                        repeat=max(1, args.repeat // 4),
+                        warmup=1,
+                    )
+                    results.append({
+                        "benchmark": "get_all_vectors",
+                        "params": dict(base_params, include_embeddings=include_embeddings),
+                        **stats,
+                    })
+
+            for n_ids in args.ids:
+                n_ids = min(n_ids, size)
+                step = max(1, size // n_ids)
+                ids = [documents[j]["id"] for j in range(0, size, step)][:n_ids]
+                for include_embeddings in (False, True):
+                    print(f"⏱️  get_vectors_by_ids n_ids={n_ids} include_embeddings={include_embeddings}")
+                    stats = measure(
+                        lambda i: chromadb_client.get_vectors_by_ids(collection_name, ids, include_embeddings=include_embeddings),
+                        repeat=args.repeat,
+                        warmup=args.warmup,
+                    )
+                    results.append({
+                        "benchmark": "get_vectors_by_ids",
+                        "params": dict(base_params, n_ids=n_ids, include_embeddings=include_embeddings),
+                        **stats,
+                    })
+
+            try:
+                client.delete_collection(name=collection_name)
+            except Exception:
+                pass
+
+    write_results(args.output, {"meta": run_metadata(), "results": results})
+
+
+if __name__ == "__main__":
+    main()
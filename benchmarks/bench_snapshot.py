@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark de snapshot en caliente y restauración (src/api/snapshot_collection.py)
+
+Carga una colección sintética con embeddings deterministas en un ChromaDB local,
+la exporta a un snapshot, verifica sus checksums y la restaura en otra colección.
+Reporta vectores/s y MB/s de cada etapa y el tamaño del archivo.
+
+Uso:
+    python benchmarks/bench_snapshot.py [--docs 100000] [--dim 1536] [--persist-dir DIR]
+                                        [--page-size 2000] [--concurrency 4]
+                                        [--no-compress] [--output resultados.json]
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from typing import Any, Dict, List
+
+from synthetic import HashEmbeddings, create_chroma_client, generate_documents, install_fake_backend, \
+    populate_collection, run_metadata, write_results
+
+import snapshot_collection  # noqa: E402  (src/api está en sys.path vía synthetic)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Snapshot y restauración de una colección")
+    parser.add_argument("--docs", type=int, default=100000, help="Documentos de la colección")
+    parser.add_argument("--dim", type=int, default=1536, help="Dimensión de los embeddings")
+    parser.add_argument("--persist-dir", help="ChromaDB persistente (default: directorio temporal)")
+    parser.add_argument("--page-size", type=int, default=snapshot_collection.SNAPSHOT_PAGE_SIZE)
+    parser.add_argument("--concurrency", type=int, default=snapshot_collection.SNAPSHOT_CONCURRENCY)
+    parser.add_argument("--batch-size", type=int, default=snapshot_collection.SNAPSHOT_RESTORE_BATCH_SIZE)
+    parser.add_argument("--no-compress", action="store_true", help="Chunks sin comprimir")
+    parser.add_argument("--output", default="-", help="Archivo JSON de salida ('-' para stdout)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="bench_snapshot_")
+    results: List[Dict[str, Any]] = []
+    try:
+        client = create_chroma_client(persist_dir=args.persist_dir or os.path.join(workdir, "chroma"))
+        embedder = HashEmbeddings(dimension=args.dim)
+        install_fake_backend(client, embedder)
+
+        print(f"⏱️  Cargando {args.docs} documentos de {args.dim} dimensiones...")
+        populate_collection(client, "bench_snapshot", generate_documents(args.docs), embedder)
+        path = os.path.join(workdir, "bench_snapshot.zip")
+        params = {"docs": args.docs, "dim": args.dim, "page_size": args.page_size,
+                  "concurrency": args.concurrency, "compress": not args.no_compress}
+
+        exported = snapshot_collection.export_collection(
+            "bench_snapshot", path, args.page_size, args.concurrency, compress=not args.no_compress
+        )
+        results.append({"benchmark": "snapshot", "stage": "export", "params": params, **exported})
+
+        started = time.perf_counter()
+        snapshot_collection.verify_snapshot(path)
+        elapsed = time.perf_counter() - started
+        results.append({"benchmark": "snapshot", "stage": "verify", "params": params, "count": exported["count"],
+                        "bytes": exported["bytes"], **snapshot_collection._throughput(exported["count"], exported["bytes"], elapsed)})
+
+        restored = snapshot_collection.restore_collection(
+            path, "bench_snapshot_restore", batch_size=args.batch_size, concurrency=args.concurrency
+        )
+        results.append({"benchmark": "snapshot", "stage": "restore", "params": params, **restored})
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'etapa':<8} {'vectores':>9} {'MB':>8} {'tiempo':>9} {'vectores/s':>11} {'MB/s':>7}")
+    for entry in results:
+        print(f"{entry['stage']:<8} {entry['count']:>9} {entry['bytes'] / 1e6:>8.1f} {entry['elapsed_s']:>8.2f}s "
+              f"{entry['vectors_per_second']:>11.0f} {entry['mb_per_second']:>7.1f}")
+
+    write_results(args.output, {"meta": run_metadata(), "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Benchmark de arranque en frío del microservicio API
+
+Mide, en procesos nuevos de Python (sin cachés de import en memoria):
+    - import: tiempo de `import <módulo>` (main y chromadb_client por defecto)
+    - first_health: tiempo desde lanzar `python main.py` hasta el primer 200 en /health
+
+Por defecto ChromaDB apunta a un puerto cerrado, que es el caso que más penaliza un
+arranque que se conecta al importar. Con --with-chroma se levanta `chroma run` local.
+
+Uso:
+    python benchmarks/bench_startup.py [--repeat 5] [--modules main,chromadb_client]
+                                       [--with-chroma] [--top 15] [--output resultados.json]
+
+Los resultados usan el mismo formato que bench_retrieval.py, así que se pueden
+comparar entre commits con compare.py.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from synthetic import API_DIR, run_metadata, summarize_latencies, write_results
+from loadtest import _free_port, _wait_http
+
+
+def _api_env(chroma_port: int) -> Dict[str, str]:
+    env = dict(os.environ)
+    env.update({
+        "CHROMA_HOST": "127.0.0.1",
+        "CHROMA_PORT": str(chroma_port),
+        "OPENAI_API_KEY": env.get("OPENAI_API_KEY", "sk-fake"),
+        "DEBUG": "false",
+        "ENV": "bench",
+    })
+    return env
+
+
+def measure_import(module: str, env: Dict[str, str]) -> float:
+    """Milisegundos que tarda `import module` en un intérprete nuevo"""
+    code = (
+        "import time; start = time.perf_counter(); "
+        f"import {module}; "
+        "print((time.perf_counter() - start) * 1000)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], cwd=API_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def top_imports(module: str, env: Dict[str, str], top: int) -> List[Dict[str, float]]:
+    """Paquetes de primer nivel que más tardan en importarse (python -X importtime)"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=API_DIR, env=env,
+        capture_output=True, text=True, check=True
+    ).stderr
+    rows: List[Dict[str, float]] = []
+    children: List[Dict[str, float]] = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # -X importtime imprime los hijos antes que el padre: nivel 1 = 3 espacios
+        if name.startswith("   ") and not name.startswith("    "):
+            children.append({"module": name.strip(), "cumulative_ms": int(cumulative) / 1000})
+        elif not name.startswith("  "):
+            if name.strip() == module:
+                rows = children
+            children = []
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:top]
+
+
+def measure_first_health(env: Dict[str, str], timeout: float) -> Optional[float]:
+    """Milisegundos desde lanzar el API hasta el primer 200 en /health (None si no arrancó)"""
+    port = _free_port()
+    env = dict(env, API_HOST="127.0.0.1", API_PORT=str(port))
+    url = f"http://127.0.0.1:{port}/health"
+
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "main.py"], cwd=API_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if process.poll() is not None:
+                return None
+            try:
+                if httpx.get(url, timeout=0.5).status_code == 200:
+                    return (time.perf_counter() - start) * 1000
+            except httpx.HTTPError:
+                pass
+            time.sleep(0.02)
+        return None
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque en frío del API")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeticiones por medición")
+    parser.add_argument("--modules", default="main,chromadb_client", help="Módulos cuyo import se mide")
+    parser.add_argument("--with-chroma", action="store_true", help="Levantar `chroma run` local (si no, puerto cerrado)")
+    parser.add_argument("--health-timeout", type=float, default=60.0, help="Segundos máximos de espera por /health")
+    parser.add_argument("--skip-health", action="store_true", help="Medir solo tiempos de import")
+    parser.add_argument("--top", type=int, default=10, help="Mostrar los N imports más lentos de main (0 = no)")
+    parser.add_argument("--output", default="-", help="Archivo JSON de salida ('-' para stdout)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    modules = [m.strip() for m in args.modules.split(",") if m.strip()]
+
+    chroma_process = None
+    tmpdir = None
+    chroma_port = 1
+    if args.with_chroma:
+        tmpdir = tempfile.mkdtemp(prefix="bench_startup_")
+        chroma_port = _free_port()
+        chroma_process = subprocess.Popen(
+            ["chroma", "run", "--path", os.path.join(tmpdir, "chroma"), "--port", str(chroma_port)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        if not _wait_http(f"http://127.0.0.1:{chroma_port}/api/v2/heartbeat"):
+            print("❌ Error: ChromaDB no inició")
+            sys.exit(1)
+        print(f"✅ ChromaDB en :{chroma_port}")
+
+    env = _api_env(chroma_port)
+    params = {"with_chroma": args.with_chroma}
+    results = []
+    try:
+        for module in modules:
+            print(f"⏱️  import {module}")
+            latencies = [measure_import(module, env) for _ in range(args.repeat)]
+            results.append({
+                "benchmark": "import",
+                "params": dict(params, module=module),
+                "latency_ms": summarize_latencies(latencies),
+            })
+
+        if not args.skip_health:
+            print("⏱️  primer /health")
+            latencies = []
+            failures = 0
+            for _ in range(args.repeat):
+                elapsed = measure_first_health(env, args.health_timeout)
+                if elapsed is None:
+                    failures += 1
+                else:
+                    latencies.append(elapsed)
+            results.append({
+                "benchmark": "first_health",
+                "params": params,
+                "latency_ms": summarize_latencies(latencies),
+                "failures": failures,
+            })
+
+        slowest = top_imports("main", env, args.top) if args.top else []
+    finally:
+        if chroma_process:
+            chroma_process.terminate()
+            chroma_process.wait(timeout=10)
+            shutil.rmtree(tmpdir, ignore_errors=True)
+
+    for entry in results:
+        lat = entry["latency_ms"]
+        label = entry["params"].get("module", "")
+        print(f"   {entry['benchmark']:<13} {label:<16} p50={lat['p50']:>8.1f}ms  max={lat['max']:>8.1f}ms")
+    if slowest:
+        print("🐢 Imports más lentos de main:")
+        for row in slowest:
+            print(f"   {row['cumulative_ms']:>8.1f}ms  {row['module']}")
+
+    write_results(args.output, {"meta": run_metadata(), "results": results, "slowest_imports": slowest})
+
+
+if __name__ == "__main__":
+    main()
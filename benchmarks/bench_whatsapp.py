@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Benchmark del procesamiento de chats de WhatsApp (src/process_whatsapp.py)
+
+Genera exportaciones sintéticas y mide el throughput en MB/s de:
+    - funcion:      identificar_tipo_linea + re.match del patrón por línea (como antes)
+    - clasificador: ClasificadorLineas.parsear (patrones compilados, un solo match por línea)
+    - pipeline:     procesar_archivo_whatsapp completo (lectura, clasificación y escritura)
+    - paralelo:     procesar_archivo_whatsapp con --procesos N (rangos del archivo en paralelo)
+    - dos_pasos:    process_whatsapp + convert_to_json (con _procesado.txt intermedio)
+    - pares:        whatsapp_pairs.convertir_whatsapp (exportación → pares en una pasada)
+    - android:      pipeline sobre una exportación del mismo tamaño en formato Android
+                    (formato detectado, continuaciones unidas al mensaje anterior)
+
+Antes de medir se verifica que funcion y clasificador den el mismo rol en todas las líneas,
+y que --incremental dé los mismos pares que una ejecución completa cuando el corte de la
+exportación cae entre la pregunta del cliente y la respuesta de la empresa.
+
+Uso:
+    python benchmarks/bench_whatsapp.py [--sizes-mb 10,50] [--repeat 3] [--procesos 4] [--output resultados.json]
+"""
+import argparse
+import contextlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import Any, Callable, Dict, List
+
+from synthetic import WHATSAPP_EMPRESA, WHATSAPP_TELEFONO, generate_whatsapp_export, run_metadata, write_results
+
+import convert_to_json  # noqa: E402  (src/ está en sys.path vía synthetic)
+import process_whatsapp  # noqa: E402
+import whatsapp_pairs  # noqa: E402
+
+# Patrón sin compilar que usaba el loop principal para extraer el mensaje
+PATRON_ANTERIOR = r'\[\d{1,2}/\d{1,2}/\d{2,4},?\s+\d{1,2}:\d{2}(?::\d{2})?\s*[AP]?M?\]\s*-\s*[^:]+:\s*(.+)'
+
+
+def leer(path: str) -> List[str]:
+    with open(path, "r", encoding="utf-8", errors="ignore") as f:
+        return [linea.strip() for linea in f if linea.strip()]
+
+
+def con_funcion(lineas: List[str]):
+    for linea in lineas:
+        process_whatsapp.identificar_tipo_linea(linea, WHATSAPP_EMPRESA, WHATSAPP_TELEFONO)
+        re.match(PATRON_ANTERIOR, linea)
+
+
+def con_clasificador(lineas: List[str]):
+    clasificador = process_whatsapp.ClasificadorLineas(WHATSAPP_EMPRESA, WHATSAPP_TELEFONO)
+    for linea in lineas:
+        clasificador.parsear(linea)
+
+
+def mensaje(indice: int, empresa: bool, texto: str) -> str:
+    remitente = f"{WHATSAPP_EMPRESA} Ventas" if empresa else WHATSAPP_TELEFONO
+    return f"[2/1/24, 10:{indice:02d}] - {remitente}: {texto}"
+
+
+def verificar_incremental(workdir: str):
+    """
+    Exportación 1 termina con una pregunta (o un mensaje) del cliente; la 2 agrega la
+    respuesta de la empresa. Los pares de --incremental deben ser los de la ejecución
+    completa (sin el último par, que queda pendiente), en una pasada y en dos pasos.
+    Una tercera ejecución con --final sobre la misma exportación debe completar
+    exactamente los pares de la ejecución completa.
+    """
+    inicio = [mensaje(0, True, "Bienvenido"), mensaje(1, False, "Hola"), mensaje(2, True, "Hola, en qué ayudamos")]
+    casos = {
+        "pregunta": [mensaje(3, False, "Cuánto cuesta?"), mensaje(4, True, "Cuesta 100"), mensaje(5, False, "Gracias")],
+        "dos_mensajes": [mensaje(3, False, "Hola otra vez"), mensaje(4, False, "Necesito limpieza"),
+                         mensaje(5, True, "Claro"), mensaje(6, False, "ok")],
+    }
+    for nombre, siguientes in casos.items():
+        chat = os.path.join(workdir, f"incremental_{nombre}.txt")
+        procesado = os.path.join(workdir, f"incremental_{nombre}_procesado.txt")
+        pares = os.path.join(workdir, f"incremental_{nombre}_pares.json")
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            for lineas in (inicio + siguientes[:1], inicio + siguientes):
+                with open(chat, "w", encoding="utf-8") as f:
+                    f.write("\n".join(lineas) + "\n")
+                process_whatsapp.procesar_archivo_whatsapp(chat, WHATSAPP_EMPRESA, WHATSAPP_TELEFONO, procesado,
+                                                           incremental=True)
+                convert_to_json.procesar_archivo(procesado, incremental=True)
+                whatsapp_pairs.convertir_whatsapp(chat, WHATSAPP_EMPRESA, WHATSAPP_TELEFONO, pares, incremental=True)
+            completo = list(whatsapp_pairs.pares_whatsapp(chat, WHATSAPP_EMPRESA, WHATSAPP_TELEFONO))
+        with open(pares, encoding="utf-8") as f:
+            una_pasada = json.load(f)
+        with open(os.path.splitext(procesado)[0] + ".json", encoding="utf-8") as f:
+            dos_pasos = json.load(f)
+        if una_pasada != completo[:-1] or dos_pasos != completo[:len(dos_pasos)]:
+            raise SystemExit(f"❌ --incremental separa el par del corte ({nombre}): {una_pasada} != {completo[:-1]}")
+
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            process_whatsapp.procesar_archivo_whatsapp(chat, WHATSAPP_EMPRESA, WHATSAPP_TELEFONO, procesado,
+                                                       incremental=True, final=True)
+            convert_to_json.procesar_archivo(procesado, incremental=True, final=True)
+            whatsapp_pairs.convertir_whatsapp(chat, WHATSAPP_EMPRESA, WHATSAPP_TELEFONO, pares, incremental=True,
+                                              final=True)
+        with open(pares, encoding="utf-8") as f:
+            una_pasada = json.load(f)
+        with open(os.path.splitext(procesado)[0] + ".json", encoding="utf-8") as f:
+            dos_pasos = json.load(f)
+        if una_pasada != completo or dos_pasos != completo:
+            raise SystemExit(f"❌ --final no completa los pares ({nombre}): {una_pasada} / {dos_pasos} != {completo}")
+
+
+def mejor_tiempo(fn: Callable[[], Any], repeat: int) -> float:
+    tiempos = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        tiempos.append(time.perf_counter() - started)
+    return min(tiempos)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Throughput del clasificador de líneas de WhatsApp")
+    parser.add_argument("--sizes-mb", default="10,50", help="Tamaños de exportación (MB), separados por coma")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones por medición (se toma la mejor)")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1, help="Procesos del modo paralelo")
+    parser.add_argument("--tamano-rango-mb", type=float, default=process_whatsapp.TAMANO_RANGO / (1024 * 1024))
+    parser.add_argument("--output", default="-", help="Archivo JSON de salida ('-' para stdout)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="bench_whatsapp_")
+    results: List[Dict[str, Any]] = []
+    try:
+        verificar_incremental(workdir)
+        for size_mb in [float(size) for size in args.sizes_mb.split(",")]:
+            path = os.path.join(workdir, f"chat_{size_mb:g}mb.txt")
+            size = generate_whatsapp_export(path, size_mb)
+            lineas = leer(path)
+
+            clasificador = process_whatsapp.ClasificadorLineas(WHATSAPP_EMPRESA, WHATSAPP_TELEFONO)
+            distintas = sum(
+                1 for linea in lineas
+                if clasificador.identificar(linea)
+                != process_whatsapp.identificar_tipo_linea(linea, WHATSAPP_EMPRESA, WHATSAPP_TELEFONO)
+            )
+            if distintas:
+                raise SystemExit(f"❌ El clasificador difiere de identificar_tipo_linea en {distintas} líneas")
+
+            def pipeline(procesos: int = 1) -> str:
+                salida = os.path.join(workdir, f"salida_{procesos}.txt")
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    process_whatsapp.procesar_archivo_whatsapp(
+                        path, WHATSAPP_EMPRESA, WHATSAPP_TELEFONO, salida, procesos=procesos,
+                        tamano_rango=int(args.tamano_rango_mb * 1024 * 1024)
+                    )
+                return salida
+
+            with open(pipeline(), "rb") as secuencial, open(pipeline(args.procesos), "rb") as paralelo:
+                if secuencial.read() != paralelo.read():
+                    raise SystemExit("❌ La salida en paralelo difiere de la secuencial")
+
+            def dos_pasos():
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    procesado = process_whatsapp.procesar_archivo_whatsapp(
+                        path, WHATSAPP_EMPRESA, WHATSAPP_TELEFONO, os.path.join(workdir, "dos_pasos_procesado.txt")
+                    )
+                    convert_to_json.procesar_archivo(procesado)
+
+            path_android = os.path.join(workdir, f"chat_{size_mb:g}mb_android.txt")
+            generate_whatsapp_export(path_android, size_mb, formato="android")
+
+            def android():
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    process_whatsapp.procesar_archivo_whatsapp(
+                        path_android, WHATSAPP_EMPRESA, WHATSAPP_TELEFONO, os.path.join(workdir, "android.txt")
+                    )
+
+            def pares():
+                with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                    whatsapp_pairs.convertir_whatsapp(
+                        path, WHATSAPP_EMPRESA, WHATSAPP_TELEFONO, os.path.join(workdir, "pares.json")
+                    )
+
+            dos_pasos()
+            pares()
+            with open(os.path.join(workdir, "dos_pasos_procesado.json"), "rb") as esperado, \
+                    open(os.path.join(workdir, "pares.json"), "rb") as obtenido:
+                if esperado.read() != obtenido.read():
+                    raise SystemExit("❌ Los pares en una pasada difieren de process_whatsapp + convert_to_json")
+
+            print(f"⏱️  {size / 1e6:.1f} MB, {len(lineas)} líneas")
+            for mode, fn in (
+                ("funcion", lambda: con_funcion(lineas)),
+                ("clasificador", lambda: con_clasificador(lineas)),
+                ("pipeline", pipeline),
+                ("paralelo", lambda: pipeline(args.procesos)),
+                ("dos_pasos", dos_pasos),
+                ("pares", pares),
+                ("android", android),
+            ):
+                elapsed = mejor_tiempo(fn, args.repeat)
+                results.append({
+                    "benchmark": "whatsapp",
+                    "params": {"mode": mode, "size_mb": size_mb, "lines": len(lineas),
+                               "procesos": args.procesos if mode == "paralelo" else 1},
+                    "elapsed_s": round(elapsed, 3),
+                    "mb_per_second": round(size / 1e6 / elapsed, 1),
+                })
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"\n{'modo':<13} {'MB':>6} {'tiempo':>9} {'MB/s':>8}")
+    for entry in results:
+        print(f"{entry['params']['mode']:<13} {entry['params']['size_mb']:>6g} {entry['elapsed_s']:>8.2f}s "
+              f"{entry['mb_per_second']:>8.1f}")
+
+    write_results(args.output, {"meta": run_metadata(), "results": results})
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Comparar dos archivos de resultados de benchmarks (JSON)
+
+Empareja las mediciones por nombre de benchmark + parámetros y muestra la variación
+de latencia (p50/p95) y memoria pico. Termina con código 1 si alguna medición
+empeora más que el umbral indicado (útil en CI).
+
+Uso:
+    python benchmarks/compare.py base.json nuevo.json [--metric p50] [--threshold 0.15]
+"""
+import argparse
+import json
+import sys
+from typing import Any, Dict, Tuple
+
+
+def _key(entry: Dict[str, Any]) -> Tuple[str, str]:
+    return entry["benchmark"], json.dumps(entry.get("params", {}), sort_keys=True)
+
+
+def _load(path: str) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {_key(entry): entry for entry in data.get("results", [])}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comparar resultados de benchmarks")
+    parser.add_argument("base", help="Resultados de referencia (JSON)")
+    parser.add_argument("nuevo", help="Resultados nuevos (JSON)")
+    parser.add_argument("--metric", default="p50", help="Métrica de latencia a comparar (p50, p95, p99, mean)")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Regresión máxima tolerada (0.15 = 15%%)")
+    args = parser.parse_args()
+
+    base = _load(args.base)
+    nuevo = _load(args.nuevo)
+
+    regresiones = 0
+    print(f"{'benchmark':<22} {'params':<60} {'base':>10} {'nuevo':>10} {'Δ':>8} {'mem Δ':>8}")
+    for key in sorted(base.keys() & nuevo.keys()):
+        antes = base[key]["latency_ms"].get(args.metric, 0.0)
+        despues = nuevo[key]["latency_ms"].get(args.metric, 0.0)
+        delta = (despues - antes) / antes if antes else 0.0
+
+        mem_antes = base[key].get("peak_memory_kb") or 0.0
+        mem_despues = nuevo[key].get("peak_memory_kb") or 0.0
+        mem_delta = (mem_despues - mem_antes) / mem_antes if mem_antes else 0.0
+
+        marca = ""
+        if delta > args.threshold:
+            regresiones += 1
+            marca = " ⚠️"
+        print(f"{key[0]:<22} {key[1][:60]:<60} {antes:>10.2f} {despues:>10.2f} {delta:>+7.1%} {mem_delta:>+7.1%}{marca}")
+
+    solo_base = len(base.keys() - nuevo.keys())
+    solo_nuevo = len(nuevo.keys() - base.keys())
+    if solo_base or solo_nuevo:
+        print(f"\nℹ️  Mediciones sin pareja: {solo_base} solo en base, {solo_nuevo} solo en nuevo")
+
+    if regresiones:
+        print(f"\n❌ {regresiones} regresiones de {args.metric} mayores a {args.threshold:.0%}")
+        sys.exit(1)
+    print(f"\n✅ Sin regresiones de {args.metric} mayores a {args.threshold:.0%}")
+
+
+if __name__ == "__main__":
+    main()
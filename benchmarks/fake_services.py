@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Servicios locales que reemplazan a OpenAI y n8n durante load tests
+
+- openai: implementa POST /v1/embeddings con embeddings deterministas (HashEmbeddings),
+  latencia log-normal configurable, límite de requests por minuto (responde 429 con
+  Retry-After, como la API real) y una tasa de errores 5xx aleatoria.
+- n8n: implementa POST /webhook/{path} y /webhook-test/{path}, acepta cualquier JSON
+  y responde después de una latencia configurable.
+
+Uso:
+    python benchmarks/fake_services.py openai --port 8099 --latency-ms 120 --sigma 0.5 --rpm 3000
+    python benchmarks/fake_services.py openai --slow-rate 0.02 --slow-ms 3000   # 2% de rezagados
+    python benchmarks/fake_services.py n8n --port 5680 --latency-ms 300
+
+Para apuntar el API al servidor falso:
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=sk-fake python src/api/main.py
+"""
+import argparse
+import asyncio
+import base64
+import math
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from synthetic import HashEmbeddings
+
+MODEL_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+
+
+class LatencyModel:
+    """
+    Latencia log-normal (mediana + dispersión) con un costo adicional por input
+
+    Con slow_rate > 0 una fracción de las respuestas tarda además slow_ms
+    (rezagados, como los picos ocasionales de la API real).
+    """
+
+    def __init__(self, median_ms: float, sigma: float = 0.5, per_input_ms: float = 0.0, seed: Optional[int] = None,
+                 slow_rate: float = 0.0, slow_ms: float = 0.0):
+        self.median_ms = median_ms
+        self.sigma = sigma
+        self.per_input_ms = per_input_ms
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self._rng = random.Random(seed)
+
+    def sample(self, n_inputs: int = 1) -> float:
+        base = self.median_ms * math.exp(self.sigma * self._rng.gauss(0.0, 1.0)) if self.median_ms > 0 else 0.0
+        if self.slow_rate and self._rng.random() < self.slow_rate:
+            base += self.slow_ms
+        return (base + self.per_input_ms * n_inputs) / 1000.0
+
+
+class RateLimiter:
+    """Token bucket de requests por minuto (0 = sin límite)"""
+
+    def __init__(self, rpm: int):
+        self.rpm = rpm
+        self._tokens = float(rpm)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> Optional[float]:
+        """Retorna None si se permite el request, o los segundos a esperar si no"""
+        if self.rpm <= 0:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.rpm, self._tokens + (now - self._last) * self.rpm / 60.0)
+            self._last = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return None
+            return (1 - self._tokens) * 60.0 / self.rpm
+
+
+def _input_to_texts(raw_input: Any) -> List[str]:
+    """Normalizar el campo `input` de OpenAI (str, lista de str o listas de tokens)"""
+    if isinstance(raw_input, str):
+        return [raw_input]
+    if isinstance(raw_input, list) and raw_input and isinstance(raw_input[0], int):
+        return [" ".join(str(t) for t in raw_input)]
+    texts = []
+    for item in raw_input or []:
+        if isinstance(item, list):
+            texts.append(" ".join(str(t) for t in item))
+        else:
+            texts.append(str(item))
+    return texts
+
+
+def create_openai_app(latency: LatencyModel, rpm: int = 0, error_rate: float = 0.0, seed: Optional[int] = None) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    limiter = RateLimiter(rpm)
+    rng = random.Random(seed)
+    embedders: Dict[int, HashEmbeddings] = {}
+    stats = {"requests": 0, "inputs": 0, "rate_limited": 0, "errors": 0}
+
+    def _embedder(dimension: int) -> HashEmbeddings:
+        if dimension not in embedders:
+            embedders[dimension] = HashEmbeddings(dimension=dimension)
+        return embedders[dimension]
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+
+        wait = limiter.acquire()
+        if wait is not None:
+            stats["rate_limited"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"Retry-After": f"{wait:.3f}", "retry-after-ms": str(int(wait * 1000))},
+                content={"error": {"message": "Rate limit reached (fake)", "type": "requests", "code": "rate_limit_exceeded"}},
+            )
+
+        if error_rate and rng.random() < error_rate:
+            stats["errors"] += 1
+            await asyncio.sleep(latency.sample())
+            return JSONResponse(
+                status_code=rng.choice([500, 502, 503]),
+                content={"error": {"message": "The server had an error (fake)", "type": "server_error"}},
+            )
+
+        texts = _input_to_texts(body.get("input"))
+        stats["inputs"] += len(texts)
+        model = body.get("model", "text-embedding-3-large")
+        dimension = int(body.get("dimensions") or MODEL_DIMENSIONS.get(model, 1536))
+        embedder = _embedder(dimension)
+
+        await asyncio.sleep(latency.sample(len(texts)))
+
+        as_base64 = body.get("encoding_format") == "base64"
+        data = []
+        for index, text in enumerate(texts):
+            vector = embedder.embed_array(text).astype(np.float32)
+            embedding = base64.b64encode(vector.tobytes()).decode("ascii") if as_base64 else vector.tolist()
+            data.append({"object": "embedding", "index": index, "embedding": embedding})
+
+        tokens = sum(max(1, len(text) // 4) for text in texts)
+        return {
+            "object": "list",
+            "data": data,
+            "model": model,
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    return app
+
+
+def create_n8n_app(latency: LatencyModel, error_rate: float = 0.0, seed: Optional[int] = None) -> FastAPI:
+    app = FastAPI(title="Fake n8n")
+    rng = random.Random(seed)
+
+    async def _webhook(path: str, request: Request):
+        body = await request.body()
+        await asyncio.sleep(latency.sample())
+        if error_rate and rng.random() < error_rate:
+            return JSONResponse(status_code=500, content={"message": "Workflow execution failed (fake)"})
+        return {"status": "ok", "webhook": path, "received_bytes": len(body)}
+
+    app.add_api_route("/webhook/{path:path}", _webhook, methods=["POST"])
+    app.add_api_route("/webhook-test/{path:path}", _webhook, methods=["POST"])
+
+    @app.get("/healthz")
+    async def healthz():
+        return {"status": "ok"}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicios falsos (OpenAI / n8n) para load tests")
+    parser.add_argument("service", choices=["openai", "n8n"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=None, help="Puerto (default: openai 8099, n8n 5680)")
+    parser.add_argument("--latency-ms", type=float, default=None, help="Latencia mediana (default: openai 120, n8n 300)")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Dispersión log-normal de la latencia")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fracción de respuestas rezagadas")
+    parser.add_argument("--slow-ms", type=float, default=2000.0, help="Latencia extra de las respuestas rezagadas")
+    parser.add_argument("--per-input-ms", type=float, default=0.5, help="Latencia extra por input (solo openai)")
+    parser.add_argument("--rpm", type=int, default=0, help="Límite de requests por minuto (solo openai, 0 = sin límite)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probabilidad de responder 5xx")
+    parser.add_argument("--seed", type=int, default=None, help="Semilla para latencias/errores reproducibles")
+    args = parser.parse_args()
+
+    if args.service == "openai":
+        latency = LatencyModel(120 if args.latency_ms is None else args.latency_ms, args.sigma, args.per_input_ms, args.seed,
+                               slow_rate=args.slow_rate, slow_ms=args.slow_ms)
+        app = create_openai_app(latency, rpm=args.rpm, error_rate=args.error_rate, seed=args.seed)
+        port = args.port or 8099
+    else:
+        latency = LatencyModel(300 if args.latency_ms is None else args.latency_ms, args.sigma, 0.0, args.seed)
+        app = create_n8n_app(latency, error_rate=args.error_rate, seed=args.seed)
+        port = args.port or 5680
+
+    uvicorn.run(app, host=args.host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+"""
+Load test HTTP end-to-end del microservicio API
+
+Genera carga con concurrencia y mezcla de requests configurables contra el API
+(uvicorn) y reporta throughput, latencias p50/p95/p99 y tasa de errores por endpoint.
+
+Con --spawn levanta todo localmente, sin servicios externos:
+    - ChromaDB (`chroma run`) en un directorio temporal
+    - Servidor falso de OpenAI (fake_services.py) con latencia y rate limits
+    - El API (src/api/main.py) apuntando a ambos
+
+Uso:
+    # Todo local, 30 segundos con 32 clientes concurrentes
+    python benchmarks/loadtest.py --spawn --concurrency 32 --duration 30
+
+    # Contra un API ya levantado (con la colección ya cargada)
+    python benchmarks/loadtest.py --base-url http://localhost:8009 --collection pozos \\
+        --mix mmr=8,vectors=1,info=1 --concurrency 16 --requests 2000
+
+Endpoints disponibles para --mix:
+    mmr      POST /retrievers/collections/{name}/mmr
+    vectors  GET  /chroma/collections/{name}?ids=...
+    all      GET  /chroma/collections/{name}          (colección completa, pesado)
+    info     GET  /chroma/collections/{name}/info
+    list     GET  /chroma/collections
+    health   GET  /health
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+
+from synthetic import (
+    API_DIR,
+    HashEmbeddings,
+    create_chroma_client,
+    generate_documents,
+    generate_queries,
+    populate_collection,
+    run_metadata,
+    summarize_latencies,
+    write_results,
+)
+from fake_services import MODEL_DIMENSIONS
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_http(url: str, timeout: float = 60.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url, timeout=2.0).status_code < 500:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.3)
+    return False
+
+
+def parse_mix(value: str) -> List[Tuple[str, float]]:
+    mix = []
+    for part in value.split(","):
+        if not part.strip():
+            continue
+        name, _, weight = part.partition("=")
+        mix.append((name.strip(), float(weight or 1)))
+    return mix
+
+
+class LocalStack:
+    """Procesos locales (ChromaDB, OpenAI falso, API) levantados por --spawn"""
+
+    def __init__(self, args):
+        self.args = args
+        self.processes: List[subprocess.Popen] = []
+        self.tmpdir = tempfile.mkdtemp(prefix="loadtest_")
+        self.chroma_port = _free_port()
+        self.openai_port = _free_port()
+        self.api_port = _free_port()
+
+    def _spawn(self, cmd: List[str], env: Optional[Dict[str, str]] = None, cwd: Optional[str] = None):
+        log = open(os.path.join(self.tmpdir, f"{len(self.processes)}_{os.path.basename(cmd[1] if cmd[0] == sys.executable else cmd[0])}.log"), "w")
+        process = subprocess.Popen(cmd, env=env, cwd=cwd, stdout=log, stderr=subprocess.STDOUT)
+        self.processes.append(process)
+        return process
+
+    def start(self) -> str:
+        args = self.args
+        print(f"🚀 Levantando stack local (logs en {self.tmpdir})")
+
+        self._spawn(["chroma", "run", "--path", os.path.join(self.tmpdir, "chroma"), "--port", str(self.chroma_port)])
+        if not _wait_http(f"http://127.0.0.1:{self.chroma_port}/api/v2/heartbeat"):
+            raise RuntimeError("ChromaDB no inició")
+        print(f"   ✅ ChromaDB en :{self.chroma_port}")
+
+        self._spawn([
+            sys.executable, os.path.join(BENCH_DIR, "fake_services.py"), "openai",
+            "--port", str(self.openai_port),
+            "--latency-ms", str(args.openai_latency_ms),
+            "--sigma", str(args.openai_sigma),
+            "--rpm", str(args.openai_rpm),
+            "--error-rate", str(args.openai_error_rate),
+            "--slow-rate", str(args.openai_slow_rate),
+            "--slow-ms", str(args.openai_slow_ms),
+        ], cwd=BENCH_DIR)
+        if not _wait_http(f"http://127.0.0.1:{self.openai_port}/stats"):
+            raise RuntimeError("El servidor falso de OpenAI no inició")
+        print(f"   ✅ OpenAI falso en :{self.openai_port}")
+
+        env = dict(os.environ)
+        env.update({
+            "API_HOST": "127.0.0.1",
+            "API_PORT": str(self.api_port),
+            "CHROMA_HOST": "127.0.0.1",
+            "CHROMA_PORT": str(self.chroma_port),
+            "OPENAI_API_KEY": "sk-fake",
+            "OPENAI_BASE_URL": f"http://127.0.0.1:{self.openai_port}/v1",
+            "EMBEDDING_MODEL": args.model,
+            "DEBUG": "false",
+            "ENV": "loadtest",
+        })
+        env.update(dict(kv.split("=", 1) for kv in args.api_env))
+        self._spawn([sys.executable, "main.py"], env=env, cwd=API_DIR)
+        base_url = f"http://127.0.0.1:{self.api_port}"
+        if not _wait_http(f"{base_url}/health"):
+            raise RuntimeError("El API no inició")
+        print(f"   ✅ API en :{self.api_port}")
+
+        args.chroma_host = "127.0.0.1"
+        args.chroma_port = self.chroma_port
+        return base_url
+
+    def stop(self):
+        for process in reversed(self.processes):
+            process.terminate()
+        for process in self.processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if not self.args.keep_logs:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+class LoadTest:
+    def __init__(self, args, base_url: str, ids: List[str]):
+        self.args = args
+        self.base_url = base_url.rstrip("/")
+        self.ids = ids
+        self.queries = generate_queries(1000, seed=args.seed)
+        self.mix = parse_mix(args.mix)
+        self.rng = random.Random(args.seed)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.statuses: Dict[str, Counter] = defaultdict(Counter)
+        self.degradation: Counter = Counter()
+        self.sent = 0
+
+    def _next_request(self) -> Tuple[str, str, str, Optional[dict], Optional[dict]]:
+        names = [name for name, _ in self.mix]
+        weights = [weight for _, weight in self.mix]
+        kind = self.rng.choices(names, weights=weights)[0]
+        collection = self.args.collection
+
+        if kind == "mmr":
+            body = {
+                "query": self.rng.choice(self.queries),
+                "k": self.args.k,
+                "fetch_k": self.args.fetch_k,
+                "lambda_mult": self.args.lambda_mult,
+                "min_score": 0.0,
+            }
+            return kind, "POST", f"/retrievers/collections/{collection}/mmr", body, None
+        if kind == "vectors":
+            sample = self.rng.sample(self.ids, min(len(self.ids), self.args.ids_per_request)) if self.ids else []
+            return kind, "GET", f"/chroma/collections/{collection}", None, {"ids": sample, "include_embeddings": "true"}
+        if kind == "all":
+            return kind, "GET", f"/chroma/collections/{collection}", None, None
+        if kind == "info":
+            return kind, "GET", f"/chroma/collections/{collection}/info", None, None
+        if kind == "list":
+            return kind, "GET", "/chroma/collections", None, None
+        return "health", "GET", "/health", None, None
+
+    async def _worker(self, client: httpx.AsyncClient, stop_at: float):
+        while time.monotonic() < stop_at:
+            if self.args.requests and self.sent >= self.args.requests:
+                return
+            self.sent += 1
+            kind, method, path, body, params = self._next_request()
+            headers = {"X-Request-Timeout-Ms": str(self.args.deadline_ms)} if kind == "mmr" and self.args.deadline_ms else None
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body, params=params, headers=headers)
+                status = str(response.status_code)
+                if kind == "mmr" and response.status_code == 200:
+                    level = (response.json().get("degradation") or {}).get("level", "none")
+                    self.degradation[level] += 1
+            except httpx.TimeoutException:
+                status = "timeout"
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            self.latencies[kind].append((time.perf_counter() - start) * 1000)
+            self.statuses[kind][status] += 1
+
+    async def run(self) -> Dict:
+        limits = httpx.Limits(max_connections=self.args.concurrency, max_keepalive_connections=self.args.concurrency)
+        timeout = httpx.Timeout(self.args.timeout)
+        async with httpx.AsyncClient(base_url=self.base_url, limits=limits, timeout=timeout) as client:
+            if self.args.warmup:
+                await asyncio.gather(*[self._worker(client, time.monotonic() + self.args.warmup) for _ in range(self.args.concurrency)])
+                self.latencies.clear()
+                self.statuses.clear()
+                self.degradation.clear()
+                self.sent = 0
+
+            duration = self.args.duration if not self.args.requests else 24 * 3600
+            start = time.monotonic()
+            await asyncio.gather(*[self._worker(client, start + duration) for _ in range(self.args.concurrency)])
+            elapsed = time.monotonic() - start
+
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> Dict:
+        endpoints = {}
+        all_latencies = []
+        total_errors = 0
+        for kind, latencies in sorted(self.latencies.items()):
+            statuses = self.statuses[kind]
+            errors = sum(count for status, count in statuses.items() if not status.startswith("2"))
+            total_errors += errors
+            all_latencies.extend(latencies)
+            endpoints[kind] = {
+                "requests": len(latencies),
+                "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+                "error_rate": errors / len(latencies) if latencies else 0.0,
+                "statuses": dict(statuses),
+                "latency_ms": summarize_latencies(latencies),
+            }
+        if "mmr" in endpoints:
+            endpoints["mmr"]["degradation"] = dict(self.degradation)
+        total = len(all_latencies)
+        return {
+            "elapsed_s": elapsed,
+            "total": {
+                "requests": total,
+                "throughput_rps": total / elapsed if elapsed else 0.0,
+                "error_rate": total_errors / total if total else 0.0,
+                "latency_ms": summarize_latencies(all_latencies),
+            },
+            "endpoints": endpoints,
+        }
+
+
+def print_report(report: Dict):
+    total = report["total"]
+    print(f"\n📊 {total['requests']} requests en {report['elapsed_s']:.1f}s "
+          f"→ {total['throughput_rps']:.1f} req/s, errores {total['error_rate']:.2%}")
+    print(f"{'endpoint':<10} {'req':>7} {'req/s':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'err':>7}  statuses")
+    rows = list(report["endpoints"].items()) + [("TOTAL", total)]
+    for name, data in rows:
+        lat = data["latency_ms"]
+        statuses = data.get("statuses", "")
+        print(f"{name:<10} {data['requests']:>7} {data['throughput_rps']:>8.1f} {lat['p50']:>8.1f}ms "
+              f"{lat['p95']:>8.1f}ms {lat['p99']:>8.1f}ms {data['error_rate']:>6.1%}  {statuses}")
+    degradation = report["endpoints"].get("mmr", {}).get("degradation")
+    if degradation:
+        print(f"degradación mmr: {degradation}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Load test HTTP del microservicio API")
+    parser.add_argument("--base-url", default="http://localhost:8009", help="URL del API (ignorado con --spawn)")
+    parser.add_argument("--spawn", action="store_true", help="Levantar ChromaDB, OpenAI falso y el API localmente")
+    parser.add_argument("--collection", default="loadtest", help="Colección objetivo")
+    parser.add_argument("--mix", default="mmr=8,vectors=1,info=1", help="Mezcla de requests con pesos (ver docstring)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Clientes concurrentes")
+    parser.add_argument("--duration", type=float, default=30.0, help="Duración en segundos")
+    parser.add_argument("--requests", type=int, default=0, help="Total de requests (reemplaza --duration)")
+    parser.add_argument("--warmup", type=float, default=3.0, help="Segundos de calentamiento (no se reportan)")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout por request (s)")
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--fetch-k", type=int, default=20)
+    parser.add_argument("--lambda-mult", type=float, default=0.5)
+    parser.add_argument("--deadline-ms", type=float, default=0, help="Enviar X-Request-Timeout-Ms en los requests mmr (0 = no)")
+    parser.add_argument("--ids-per-request", type=int, default=10, help="IDs por request en el endpoint 'vectors'")
+    parser.add_argument("--seed", type=int, default=1234)
+    # Datos
+    parser.add_argument("--seed-docs", type=int, default=None, help="Cargar N documentos sintéticos antes de empezar (default con --spawn: 5000)")
+    parser.add_argument("--chroma-host", default=None, help="ChromaDB donde cargar los documentos sintéticos")
+    parser.add_argument("--chroma-port", type=int, default=8008)
+    parser.add_argument("--model", default="text-embedding-3-large", help="Modelo (define la dimensión de los embeddings)")
+    # OpenAI falso (solo con --spawn)
+    parser.add_argument("--openai-latency-ms", type=float, default=120.0, help="Latencia mediana del OpenAI falso")
+    parser.add_argument("--openai-sigma", type=float, default=0.5, help="Dispersión log-normal de la latencia")
+    parser.add_argument("--openai-rpm", type=int, default=0, help="Límite de requests/min del OpenAI falso")
+    parser.add_argument("--openai-error-rate", type=float, default=0.0, help="Tasa de errores 5xx del OpenAI falso")
+    parser.add_argument("--openai-slow-rate", type=float, default=0.0, help="Fracción de respuestas rezagadas del OpenAI falso")
+    parser.add_argument("--openai-slow-ms", type=float, default=2000.0, help="Latencia extra de las respuestas rezagadas")
+    parser.add_argument("--api-env", action="append", default=[], help="Variable extra para el API (ej: API_WORKERS=4)")
+    parser.add_argument("--keep-logs", action="store_true", help="No borrar el directorio temporal con logs")
+    parser.add_argument("--output", default=None, help="Archivo JSON de resultados ('-' para stdout)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    stack = LocalStack(args) if args.spawn else None
+
+    try:
+        base_url = stack.start() if stack else args.base_url
+        seed_docs = args.seed_docs if args.seed_docs is not None else (5000 if stack else 0)
+
+        ids: List[str] = []
+        if seed_docs:
+            if not args.chroma_host:
+                print("❌ Error: --seed-docs requiere --chroma-host (o --spawn)")
+                sys.exit(1)
+            dimension = MODEL_DIMENSIONS.get(args.model, 1536)
+            print(f"📦 Cargando {seed_docs} documentos sintéticos en '{args.collection}' (dim={dimension})...")
+            documents = generate_documents(seed_docs)
+            client = create_chroma_client(host=args.chroma_host, port=args.chroma_port)
+            populate_collection(client, args.collection, documents, HashEmbeddings(dimension))
+            ids = [doc["id"] for doc in documents]
+        elif "vectors" in args.mix:
+            response = httpx.get(f"{base_url}/chroma/collections/{args.collection}", timeout=args.timeout)
+            ids = response.json().get("ids", []) if response.status_code == 200 else []
+
+        print(f"🔥 Carga: {args.concurrency} clientes, mezcla '{args.mix}', "
+              f"{f'{args.requests} requests' if args.requests else f'{args.duration:.0f}s'}")
+        report = asyncio.run(LoadTest(args, base_url, ids).run())
+        print_report(report)
+
+        if args.output:
+            params = {k: v for k, v in vars(args).items() if k not in ("output",)}
+            write_results(args.output, {"meta": run_metadata(), "params": params, "report": report})
+    finally:
+        if stack:
+            stack.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Utilidades compartidas por los benchmarks
+
+- HashEmbeddings: embeddings deterministas y locales (reemplazo de OpenAI)
+- Generación de colecciones sintéticas en una instancia local de ChromaDB
+- Helpers para medir latencia/memoria y escribir resultados en JSON
+"""
+import hashlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+# Permitir importar los módulos del API (src/api) igual que lo hace main.py
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(REPO_ROOT, "src", "api")
+if API_DIR not in sys.path:
+    sys.path.insert(0, API_DIR)
+# Scripts de procesamiento de chats de WhatsApp (src/process_whatsapp.py)
+SRC_DIR = os.path.join(REPO_ROOT, "src")
+if SRC_DIR not in sys.path:
+    sys.path.append(SRC_DIR)
+
+# Vocabulario del dominio para generar documentos y queries "realistas"
+VOCABULARIO = [
+    "limpieza", "pozo", "pozos", "séptico", "cámara", "precio", "servicio", "cisterna",
+    "succión", "metros", "cúbicos", "warnes", "santa", "cruz", "montero", "cotización",
+    "horario", "urgente", "mañana", "tarde", "domingo", "factura", "qr", "efectivo",
+    "camión", "manguera", "distancia", "zona", "norte", "sur", "barrio", "condominio",
+    "mantenimiento", "destape", "cañería", "baño", "cocina", "grasa", "trampa", "olor",
+    "rebalse", "lluvia", "terreno", "casa", "empresa", "restaurante", "hotel", "colegio",
+]
+
+CATEGORIAS = ["precio", "horario", "zona", "servicio", "pago"]
+
+
+class HashEmbeddings:
+    """
+    Embeddings deterministas calculados localmente a partir de un hash de cada token
+
+    Cada token se proyecta a un vector gaussiano con semilla derivada de su hash;
+    el embedding de un texto es la suma normalizada (L2) de los vectores de sus tokens.
+    Textos con tokens en común quedan cerca en el espacio, lo que hace que MMR y
+    min_score se comporten de forma parecida a un modelo real.
+
+    Implementa la interfaz de LangChain (`embed_query`/`embed_documents`).
+    """
+
+    def __init__(self, dimension: int = 1536):
+        self.dimension = dimension
+        self._token_cache: Dict[str, np.ndarray] = {}
+
+    def _token_vector(self, token: str) -> np.ndarray:
+        vector = self._token_cache.get(token)
+        if vector is None:
+            seed = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+            self._token_cache[token] = vector
+        return vector
+
+    def embed_array(self, text: str) -> np.ndarray:
+        tokens = text.lower().split() or [""]
+        vector = np.sum([self._token_vector(token) for token in tokens], axis=0)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array(text).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.embed_query(text) for text in texts]
+
+
+def generate_documents(size: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Generar documentos sintéticos deterministas
+
+    Returns:
+        Lista de dicts con id, document y metadata
+    """
+    rng = random.Random(seed)
+    documents = []
+    for i in range(size):
+        n_tokens = rng.randint(8, 40)
+        text = " ".join(rng.choice(VOCABULARIO) for _ in range(n_tokens))
+        documents.append({
+            "id": f"doc-{i:07d}",
+            "document": text,
+            "metadata": {
+                "categoria": rng.choice(CATEGORIAS),
+                "source": "benchmark",
+            },
+        })
+    return documents
+
+
+def generate_queries(count: int, seed: int = 7) -> List[str]:
+    """Generar queries cortas deterministas a partir del vocabulario"""
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(VOCABULARIO) for _ in range(rng.randint(2, 6))) for _ in range(count)]
+
+
+WHATSAPP_EMPRESA = "Limpieza de pozos:"
+WHATSAPP_TELEFONO = "+591 69023378"
+
+
+def generate_whatsapp_export(path: str, size_mb: float, seed: int = 42, formato: str = "corchetes") -> int:
+    """
+    Escribir una exportación de chat de WhatsApp sintética de ~size_mb MB
+
+    Mezcla mensajes de la empresa y del cliente con el formato estándar, líneas de
+    continuación, líneas vacías, URLs y mensajes de sistema. Con formato="android" las
+    líneas son "d/m/aa h:mm - Nombre: mensaje" (sin corchetes).
+
+    Returns:
+        Tamaño del archivo en bytes
+    """
+    rng = random.Random(seed)
+    objetivo = int(size_mb * 1024 * 1024)
+    remitentes = [f"{WHATSAPP_EMPRESA} Ventas", WHATSAPP_TELEFONO]
+    escritos = 0
+    with open(path, "w", encoding="utf-8") as f:
+        marca = "{}" if formato == "android" else "[{}]"
+        f.write(f"{marca.format('1/1/23, 9:00')} - {WHATSAPP_EMPRESA} Ventas: Bienvenido\n")
+        while escritos < objetivo:
+            fecha = marca.format(f"{rng.randint(1, 28)}/{rng.randint(1, 12)}/23, {rng.randint(0, 23)}:{rng.randint(0, 59):02d}")
+            texto = " ".join(rng.choice(VOCABULARIO) for _ in range(rng.randint(3, 25)))
+            tipo = rng.random()
+            if tipo < 0.8:
+                linea = f"{fecha} - {rng.choice(remitentes)}: {texto}"
+            elif tipo < 0.9:
+                linea = texto
+            elif tipo < 0.95:
+                linea = ""
+            elif tipo < 0.97:
+                linea = f"{fecha} - {WHATSAPP_TELEFONO}: https://maps.google.com/?q=-17.78,-63.18"
+            else:
+                linea = f"{fecha} - Cambió tu código de seguridad con {WHATSAPP_TELEFONO}"
+            f.write(linea + "\n")
+            escritos += len(linea.encode("utf-8")) + 1
+    return os.path.getsize(path)
+
+
+def create_chroma_client(persist_dir: Optional[str] = None, host: Optional[str] = None, port: Optional[int] = None):
+    """
+    Crear un cliente de ChromaDB para benchmarks
+
+    - Sin argumentos: cliente en memoria (EphemeralClient), dentro del proceso
+    - persist_dir: cliente persistente local (PersistentClient)
+    - host/port: instancia local de ChromaDB por HTTP (ej: la de `make dev-services`)
+    """
+    import chromadb
+    from chromadb.config import Settings
+
+    settings = Settings(anonymized_telemetry=False)
+    if host:
+        return chromadb.HttpClient(host=host, port=port or 8008, settings=settings)
+    if persist_dir:
+        return chromadb.PersistentClient(path=persist_dir, settings=settings)
+    return chromadb.EphemeralClient(settings=settings)
+
+
+def populate_collection(client, collection_name: str, documents: List[Dict[str, Any]], embedder: HashEmbeddings):
+    """
+    (Re)crear una colección y cargar los documentos con embeddings precalculados
+    """
+    try:
+        client.delete_collection(name=collection_name)
+    except Exception:
+        pass
+    collection = client.get_or_create_collection(name=collection_name)
+
+    batch_size = min(client.get_max_batch_size(), 2000)
+    for start in range(0, len(documents), batch_size):
+        batch = documents[start:start + batch_size]
+        texts = [doc["document"] for doc in batch]
+        collection.add(
+            ids=[doc["id"] for doc in batch],
+            documents=texts,
+            metadatas=[doc["metadata"] for doc in batch],
+            embeddings=np.stack([embedder.embed_array(text) for text in texts]),
+        )
+    return collection
+
+
+def install_fake_backend(client, embedder: HashEmbeddings):
+    """
+    Conectar chromadb_client al cliente local y a los embeddings deterministas
+
+    Reemplaza el cliente HTTP y el cliente de OpenAI del módulo sin tocar la red.
+    """
+    import chromadb_client
+
+    chromadb_client.get_connection().use_client(client)
+    chromadb_client.embedding_function = None
+    chromadb_client._embedding_function_ready = True
+    chromadb_client._query_embeddings_instance = embedder
+    return chromadb_client
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    return float(np.percentile(np.asarray(values, dtype=np.float64), pct))
+
+
+def summarize_latencies(latencies_ms: List[float]) -> Dict[str, float]:
+    """Resumen estadístico de una lista de latencias en milisegundos"""
+    return {
+        "n": len(latencies_ms),
+        "mean": float(np.mean(latencies_ms)) if latencies_ms else 0.0,
+        "min": float(np.min(latencies_ms)) if latencies_ms else 0.0,
+        "p50": percentile(latencies_ms, 50),
+        "p95": percentile(latencies_ms, 95),
+        "p99": percentile(latencies_ms, 99),
+        "max": float(np.max(latencies_ms)) if latencies_ms else 0.0,
+    }
+
+
+def measure(fn: Callable[[int], Any], repeat: int, warmup: int = 1) -> Dict[str, Any]:
+    """
+    Medir latencia y memoria pico de `fn(i)`
+
+    La latencia se mide sin tracemalloc (para no distorsionarla); la memoria
+    pico se mide en una ejecución adicional con tracemalloc activo. Solo cuenta
+    memoria asignada desde Python/NumPy (no la del proceso de ChromaDB).
+    """
+    for i in range(warmup):
+        fn(i)
+
+    latencies_ms = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        latencies_ms.append((time.perf_counter() - start) * 1000)
+
+    tracemalloc.start()
+    try:
+        fn(0)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "latency_ms": summarize_latencies(latencies_ms),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def run_metadata() -> Dict[str, Any]:
+    """Metadatos del entorno para poder comparar resultados entre commits"""
+    commit = None
+    try:
+        commit = subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        pass
+
+    versions = {"numpy": np.__version__}
+    try:
+        import chromadb
+        versions["chromadb"] = chromadb.__version__
+    except Exception:
+        pass
+
+    return {
+        "commit": commit,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def write_results(path: Optional[str], payload: Dict[str, Any]):
+    """Escribir resultados en JSON (o por stdout si path es None o '-')"""
+    data = json.dumps(payload, ensure_ascii=False, indent=2)
+    if not path or path == "-":
+        print(data)
+        return
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(data)
+    print(f"💾 Resultados guardados en: {path}")
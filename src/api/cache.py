@@ -0,0 +1,354 @@
+"""
+Caché del microservicio API (embeddings de queries y resultados de búsqueda)
+
+Backends disponibles (variable CACHE_BACKEND):
+- memory: diccionario LRU dentro del proceso. Solo sirve con un único worker.
+- sqlite: archivo SQLite compartido por todos los workers de uvicorn (modo WAL).
+          Sobrevive al reciclado de workers mientras exista el archivo.
+- redis:  servidor Redis o compatible (REDIS_URL). Requiere el paquete `redis`.
+- auto (default): memory con API_WORKERS=1, sqlite con más de un worker.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "auto").lower()
+CACHE_PATH = os.getenv("CACHE_PATH", os.path.join(tempfile.gettempdir(), "n8npozos_api_cache.sqlite3"))
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "20000"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# TTL en segundos (0 desactiva la caché correspondiente)
+QUERY_EMBEDDING_CACHE_TTL = int(os.getenv("QUERY_EMBEDDING_CACHE_TTL", "86400"))
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", "30"))
+# Tiempo que se conservan los resultados vencidos para servirlos si el deadline no alcanza.
+# Corto: una escritura directa a ChromaDB que no invalida la caché (ver
+# chromadb_client.invalidate_results) se ve a más tardar en este tiempo
+RESULT_STALE_TTL = int(os.getenv("RESULT_STALE_TTL", "300"))
+# Caché semántica (por worker): similitud mínima entre queries y entradas por búsqueda
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "256"))
+
+
+class MemoryBackend:
+    """Caché LRU en memoria del proceso"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at and expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: int):
+        with self._lock:
+            self._data[key] = (value, time.time() + ttl if ttl else 0)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value = int(self._data.get(key, (b"0", 0))[0]) + 1
+            self._data[key] = (str(value).encode(), 0)
+            return value
+
+    def size(self) -> int:
+        return len(self._data)
+
+
+class SQLiteBackend:
+    """Caché en un archivo SQLite compartido entre procesos"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        conn = self._conn()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._conn().execute(
+            "SELECT value FROM cache WHERE key = ? AND (expires_at = 0 OR expires_at > ?)", (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: int):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, time.time() + ttl if ttl else 0),
+        )
+        self._writes += 1
+        if self._writes % 500 == 0:
+            self._prune(conn)
+
+    def _prune(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM cache WHERE expires_at != 0 AND expires_at < ?", (time.time(),))
+        excess = self.size() - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM cache WHERE key IN "
+                "(SELECT key FROM cache WHERE expires_at != 0 ORDER BY expires_at LIMIT ?)",
+                (excess,),
+            )
+
+    def incr(self, key: str) -> int:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT value FROM cache WHERE key = ?", (key,)).fetchone()
+            value = int(row[0]) + 1 if row else 1
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, 0)", (key, str(value).encode())
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def size(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+
+class RedisBackend:
+    """Caché en Redis (o un servidor compatible: KeyDB, Dragonfly, Valkey)"""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        import redis
+
+        self._redis = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self._redis.ping()
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._redis.get(key)
+
+    def set(self, key: str, value: bytes, ttl: int):
+        if ttl:
+            self._redis.setex(key, ttl, value)
+        else:
+            self._redis.set(key, value)
+
+    def incr(self, key: str) -> int:
+        return int(self._redis.incr(key))
+
+    def size(self) -> int:
+        return int(self._redis.dbsize())
+
+
+class Cache:
+    """
+    Fachada sobre el backend con helpers de serialización y contadores de aciertos
+
+    Los errores del backend nunca se propagan: una caché caída se comporta como
+    una caché vacía para no romper las búsquedas.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def _count(self, namespace: str, field: str):
+        with self._lock:
+            ns = self._stats.setdefault(namespace, {"hits": 0, "misses": 0, "errors": 0})
+            ns[field] += 1
+
+    def _get(self, namespace: str, key: str) -> Optional[bytes]:
+        try:
+            value = self.backend.get(f"{namespace}:{key}")
+        except Exception as e:
+            self._count(namespace, "errors")
+            print(f"⚠️  Error al leer caché ({self.backend.name}): {e}")
+            return None
+        self._count(namespace, "hits" if value is not None else "misses")
+        return value
+
+    def _set(self, namespace: str, key: str, value: bytes, ttl: int):
+        try:
+            self.backend.set(f"{namespace}:{key}", value, ttl)
+        except Exception as e:
+            self._count(namespace, "errors")
+            print(f"⚠️  Error al escribir caché ({self.backend.name}): {e}")
+
+    def get_json(self, namespace: str, key: str) -> Any:
+        value = self._get(namespace, key)
+        return json.loads(value) if value is not None else None
+
+    def set_json(self, namespace: str, key: str, value: Any, ttl: int):
+        self._set(namespace, key, json.dumps(value, ensure_ascii=False).encode("utf-8"), ttl)
+
+    def get_vector(self, namespace: str, key: str) -> Optional[List[float]]:
+        value = self._get(namespace, key)
+        return np.frombuffer(value, dtype=np.float32).tolist() if value is not None else None
+
+    def set_vector(self, namespace: str, key: str, vector: List[float], ttl: int):
+        self._set(namespace, key, np.asarray(vector, dtype=np.float32).tobytes(), ttl)
+
+    def generation(self, name: str) -> int:
+        """Contador de versión (ej: por colección) usado para invalidar resultados"""
+        try:
+            value = self.backend.get(f"gen:{name}")
+            return int(value) if value is not None else 0
+        except Exception:
+            return 0
+
+    def bump_generation(self, name: str) -> int:
+        try:
+            return self.backend.incr(f"gen:{name}")
+        except Exception as e:
+            print(f"⚠️  Error al invalidar caché ({self.backend.name}): {e}")
+            return 0
+
+    def stats(self) -> Dict[str, Any]:
+        try:
+            size = self.backend.size()
+        except Exception:
+            size = None
+        with self._lock:
+            namespaces = {name: dict(values) for name, values in self._stats.items()}
+        return {"backend": self.backend.name, "entries": size, "namespaces": namespaces}
+
+
+class SemanticCache:
+    """
+    Resultados recientes indexados por el embedding de la query (en memoria del worker)
+
+    Permite responder con el resultado de una query casi idéntica ("precio pozo" vs
+    "precio del pozo") cuando no queda tiempo para buscar. Las entradas se agrupan por
+    el resto de los parámetros de la búsqueda (colección, generación, k, filtros...).
+    """
+
+    def __init__(self, max_entries: int, threshold: float, ttl: int, max_groups: int = 512):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_groups = max_groups
+        self._groups: "OrderedDict[str, OrderedDict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, group: str, query: str, embedding: List[float], value: Any):
+        if self.max_entries <= 0:
+            return
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return
+        with self._lock:
+            entries = self._groups.setdefault(group, OrderedDict())
+            self._groups.move_to_end(group)
+            entries[query] = (vector / norm, value, time.time())
+            entries.move_to_end(query)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+            while len(self._groups) > self.max_groups:
+                self._groups.popitem(last=False)
+
+    def lookup(self, group: str, embedding: List[float]) -> Optional[tuple]:
+        """Retorna (valor, similitud) de la entrada más parecida sobre el umbral, o None"""
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        with self._lock:
+            entries = list(self._groups.get(group, {}).values())
+        oldest = time.time() - self.ttl
+        entries = [entry for entry in entries if entry[2] >= oldest]
+        if not entries or norm == 0:
+            return None
+        similarities = np.stack([entry[0] for entry in entries]) @ (vector / norm)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return entries[best][1], float(similarities[best])
+
+
+def cache_key(*parts: Any) -> str:
+    """Clave estable (hash) a partir de valores serializables a JSON"""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _create_backend():
+    backend = CACHE_BACKEND
+    if backend == "auto":
+        backend = "sqlite" if API_WORKERS > 1 else "memory"
+
+    if backend == "redis":
+        try:
+            return RedisBackend(REDIS_URL)
+        except Exception as e:
+            print(f"⚠️  No se pudo usar Redis en {REDIS_URL}: {e}")
+            print("   Usando caché SQLite compartida como alternativa")
+            backend = "sqlite"
+
+    if backend == "sqlite":
+        try:
+            return SQLiteBackend(CACHE_PATH, CACHE_MAX_ENTRIES)
+        except Exception as e:
+            print(f"⚠️  No se pudo abrir la caché SQLite en {CACHE_PATH}: {e}")
+            print("   Usando caché en memoria (no compartida entre workers)")
+
+    return MemoryBackend(CACHE_MAX_ENTRIES)
+
+
+_cache_instance: Optional[Cache] = None
+_cache_lock = threading.Lock()
+_semantic_cache_instance: Optional[SemanticCache] = None
+
+
+def get_cache() -> Cache:
+    """Obtener la caché del proceso (se crea en el primer uso, en cada worker)"""
+    global _cache_instance
+    if _cache_instance is None:
+        with _cache_lock:
+            if _cache_instance is None:
+                _cache_instance = Cache(_create_backend())
+    return _cache_instance
+
+
+def get_semantic_cache() -> SemanticCache:
+    """Obtener la caché semántica del proceso (no se comparte entre workers)"""
+    global _semantic_cache_instance
+    if _semantic_cache_instance is None:
+        with _cache_lock:
+            if _semantic_cache_instance is None:
+                _semantic_cache_instance = SemanticCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, RESULT_STALE_TTL)
+    return _semantic_cache_instance
@@ -0,0 +1,255 @@
+"""
+Conexión a ChromaDB con sondeo de salud en segundo plano y circuit breaker
+
+Estados del breaker:
+- closed:    ChromaDB responde; las requests usan el cliente normalmente.
+- open:      ChromaDB está caído; las requests fallan al instante con
+             ChromaUnavailableError (el API responde 503) sin esperar timeouts.
+- half_open: el sondeo volvió a responder (o pasó el cooldown); se deja pasar
+             tráfico de prueba y el primer éxito cierra el breaker.
+
+Un hilo daemon consulta `/api/v2/heartbeat` cada CHROMA_PROBE_INTERVAL segundos,
+de modo que una caída se detecta aunque no haya tráfico y la reconexión ocurre
+sin que ninguna request tenga que pagarla.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import httpx
+
+CHROMA_PROBE_INTERVAL = float(os.getenv("CHROMA_PROBE_INTERVAL", "5"))
+CHROMA_PROBE_TIMEOUT = float(os.getenv("CHROMA_PROBE_TIMEOUT", "2"))
+# Errores de conexión consecutivos (de requests o del sondeo) que abren el breaker
+CHROMA_FAILURE_THRESHOLD = int(os.getenv("CHROMA_FAILURE_THRESHOLD", "3"))
+# Segundos en open antes de dejar pasar una request de prueba (si el sondeo no lo hizo antes)
+CHROMA_BREAKER_COOLDOWN = float(os.getenv("CHROMA_BREAKER_COOLDOWN", "15"))
+# Timeout de las operaciones del cliente de ChromaDB (el cliente HTTP no trae ninguno)
+CHROMA_REQUEST_TIMEOUT = float(os.getenv("CHROMA_REQUEST_TIMEOUT", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class ChromaUnavailableError(Exception):
+    """ChromaDB no responde o el breaker está abierto"""
+
+    def __init__(self, message: str, retry_after: float = CHROMA_PROBE_INTERVAL):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_connection_error(error: Exception) -> bool:
+    """True si el error indica que ChromaDB no es alcanzable (y no un error de la operación)"""
+    if isinstance(error, (httpx.TransportError, ConnectionError, TimeoutError)):
+        return True
+    return "could not connect to a chroma server" in str(error).lower()
+
+
+class ChromaConnectionManager:
+    """Cliente de ChromaDB compartido por el proceso, con breaker y sondeo de salud"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._client = None
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._consecutive_failures = 0
+        self._last_error: Optional[str] = None
+        self._last_error_log = 0.0
+        self._probe: Dict[str, Any] = {"ok": None, "latency_ms": None, "at": None, "error": None}
+        self._stats = {"rejected": 0, "failures": 0, "opened": 0, "reconnects": 0}
+        self._probe_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._static = False
+
+    # ------------------------------------------------------------------ estado
+
+    def _set_state(self, state: str):
+        if state == self._state:
+            return
+        previous, self._state = self._state, state
+        if state == OPEN:
+            self._opened_at = time.time()
+            self._stats["opened"] += 1
+            print(f"🔴 ChromaDB no disponible en {self.host}:{self.port} ({self._last_error}); breaker abierto")
+        elif state == CLOSED and previous != CLOSED:
+            print(f"🟢 ChromaDB disponible de nuevo en {self.host}:{self.port}; breaker cerrado")
+
+    def record_success(self):
+        """Registrar una operación exitosa contra ChromaDB"""
+        with self._lock:
+            self._consecutive_failures = 0
+            self._set_state(CLOSED)
+
+    def record_failure(self, error: Exception):
+        """Registrar un error de conexión de una request"""
+        with self._lock:
+            self._consecutive_failures += 1
+            self._stats["failures"] += 1
+            self._last_error = str(error)
+            if self._state == HALF_OPEN or self._consecutive_failures >= CHROMA_FAILURE_THRESHOLD:
+                self._set_state(OPEN)
+
+    def _retry_after(self) -> float:
+        if self._probe_thread is not None:
+            return CHROMA_PROBE_INTERVAL
+        return max(1.0, CHROMA_BREAKER_COOLDOWN - (time.time() - self._opened_at))
+
+    def _unavailable(self) -> ChromaUnavailableError:
+        return ChromaUnavailableError(
+            f"ChromaDB no está disponible. "
+            f"Asegúrate de que ChromaDB esté corriendo en {self.host}:{self.port}. "
+            f"En desarrollo local, ejecuta: make dev-services",
+            retry_after=self._retry_after()
+        )
+
+    # ----------------------------------------------------------------- cliente
+
+    def get_client(self):
+        """
+        Obtener el cliente de ChromaDB
+
+        Raises:
+            ChromaUnavailableError: Si el breaker está abierto o no se pudo conectar
+        """
+        with self._lock:
+            if self._state == OPEN:
+                if time.time() - self._opened_at < CHROMA_BREAKER_COOLDOWN:
+                    self._stats["rejected"] += 1
+                    raise self._unavailable()
+                self._set_state(HALF_OPEN)
+            client = self._client
+        if client is not None:
+            return client
+        return self._connect()
+
+    def _connect(self):
+        # Un solo hilo crea el cliente; el resto espera y reutiliza el resultado
+        with self._connect_lock:
+            if self._client is not None:
+                return self._client
+            try:
+                import chromadb
+                client = chromadb.HttpClient(host=self.host, port=self.port)
+                self._apply_timeout(client)
+            except Exception as e:
+                with self._lock:
+                    self._last_error = str(e)
+                    self._stats["failures"] += 1
+                    self._set_state(OPEN)
+                    self._log_connect_error(e)
+                raise self._unavailable() from e
+            self._client = client
+            with self._lock:
+                self._stats["reconnects"] += 1
+                self._consecutive_failures = 0
+                self._set_state(CLOSED)
+            print(f"✅ Conectado a ChromaDB en {self.host}:{self.port}")
+            return client
+
+    @staticmethod
+    def _apply_timeout(client):
+        # El cliente HTTP de chromadb usa httpx sin timeout: una instancia colgada
+        # bloquearía threads del pool indefinidamente
+        session = getattr(getattr(client, "_server", None), "_session", None)
+        if isinstance(session, httpx.Client) and CHROMA_REQUEST_TIMEOUT > 0:
+            session.timeout = httpx.Timeout(CHROMA_REQUEST_TIMEOUT, connect=CHROMA_PROBE_TIMEOUT)
+
+    def _log_connect_error(self, error: Exception):
+        # Solo en el primer fallo y luego como máximo cada 30 segundos
+        now = time.time()
+        if now - self._last_error_log > 30:
+            self._last_error_log = now
+            print(f"⚠️  No se pudo crear cliente de ChromaDB en {self.host}:{self.port}")
+            print(f"   Error: {error}")
+            print(f"   Asegúrate de que ChromaDB esté corriendo")
+            print(f"   En desarrollo local, ejecuta: make dev-services")
+
+    def use_client(self, client):
+        """Fijar un cliente ya creado (ej: EphemeralClient en benchmarks); desactiva el sondeo"""
+        with self._lock:
+            self._client = client
+            self._static = True
+            self._consecutive_failures = 0
+            self._set_state(CLOSED)
+
+    # ------------------------------------------------------------------ sondeo
+
+    def probe(self) -> bool:
+        """Consultar el heartbeat de ChromaDB y actualizar el estado del breaker"""
+        started = time.perf_counter()
+        try:
+            response = httpx.get(
+                f"http://{self.host}:{self.port}/api/v2/heartbeat", timeout=CHROMA_PROBE_TIMEOUT
+            )
+            response.raise_for_status()
+            ok, error = True, None
+        except Exception as e:
+            ok, error = False, str(e) or type(e).__name__
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        with self._lock:
+            self._probe = {"ok": ok, "latency_ms": round(latency_ms, 1), "at": time.time(), "error": error}
+            if ok:
+                if self._state == OPEN:
+                    self._set_state(HALF_OPEN)
+                elif self._client is not None:
+                    self._consecutive_failures = 0
+                    self._set_state(CLOSED)
+            else:
+                # Un heartbeat lento bajo carga no abre el breaker: mismo umbral que las requests
+                self._consecutive_failures += 1
+                self._last_error = error
+                if self._state == HALF_OPEN or self._consecutive_failures >= CHROMA_FAILURE_THRESHOLD:
+                    self._set_state(OPEN)
+            needs_client = ok and self._client is None
+
+        # Reconectar en segundo plano para que ninguna request pague la conexión
+        if needs_client:
+            try:
+                self._connect()
+            except ChromaUnavailableError:
+                pass
+        return ok
+
+    def _probe_loop(self):
+        while not self._stop.is_set():
+            if not self._static:
+                self.probe()
+            self._stop.wait(CHROMA_PROBE_INTERVAL)
+
+    def start(self):
+        """Iniciar el hilo de sondeo (idempotente)"""
+        with self._lock:
+            if self._probe_thread is not None or CHROMA_PROBE_INTERVAL <= 0:
+                return
+            self._stop.clear()
+            self._probe_thread = threading.Thread(target=self._probe_loop, name="chroma-probe", daemon=True)
+            self._probe_thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            self._probe_thread = None
+
+    def health(self) -> Dict[str, Any]:
+        with self._lock:
+            probe = dict(self._probe)
+            return {
+                "state": self._state,
+                "host": f"{self.host}:{self.port}",
+                "connected": self._client is not None,
+                "consecutive_failures": self._consecutive_failures,
+                "last_error": self._last_error,
+                "opened_at": self._opened_at or None,
+                "probe": probe,
+                "probe_age_s": round(time.time() - probe["at"], 1) if probe["at"] else None,
+                "probing": self._probe_thread is not None,
+                **self._stats,
+            }
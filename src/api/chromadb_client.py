@@ -1,15 +1,25 @@
 """
-Cliente para interactuar con ChromaDB usando LangChain
-Proporciona funciones para obtener vectores y documentos de colecciones
+Cliente para interactuar con ChromaDB
+Proporciona funciones para obtener vectores y documentos de colecciones y búsqueda MMR
+
+chromadb se importa en el primer uso (ver `warmup()`), para que el módulo cargue
+rápido y el API arranque aunque ChromaDB todavía no esté disponible.
 """
+import importlib
 import os
-import chromadb
-from chromadb.utils import embedding_functions
+import threading
+import time
 from typing import List, Dict, Optional, Any
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
-from langchain_chroma import Chroma as LangChainChroma
-from langchain_openai import OpenAIEmbeddings
+from embedding_client import EmbeddingClient, EmbeddingDeadlineExceeded
+from chroma_connection import ChromaConnectionManager, ChromaUnavailableError, is_connection_error
+from collection_aliases import AliasRegistry, CHROMA_ALIAS_COLLECTION, EMBEDDING_MODEL_KEY
+import degradation
+from degradation import SearchDeadlineExceeded
+from cache import (
+    get_cache, get_semantic_cache, cache_key,
+    QUERY_EMBEDDING_CACHE_TTL, RESULT_CACHE_TTL, RESULT_STALE_TTL
+)
 
 # Configuración desde variables de entorno
 # Detectar si estamos en Docker o desarrollo local
@@ -54,121 +64,389 @@ else:
     CHROMA_PORT = 8000 if CHROMA_HOST == "chroma" else 8008
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
+# URL base alternativa para la API de OpenAI (proxy o servidor falso de load tests)
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
 
-# Inicializar función de embedding de OpenAI si está disponible
+# Función de embedding de OpenAI para ChromaDB (se crea en el primer uso)
 embedding_function = None
-if OPENAI_API_KEY:
-    try:
-        embedding_function = embedding_functions.OpenAIEmbeddingFunction(
-            api_key=OPENAI_API_KEY,
-            model_name=EMBEDDING_MODEL
-        )
-    except Exception as e:
-        print(f"⚠️  No se pudo inicializar OpenAI embedding function: {e}")
+_embedding_function_ready = False
+_embedding_function_lock = threading.Lock()
+
+
+def _get_embedding_function():
+    """
+    Obtener la función de embedding de OpenAI usada por las colecciones
+
+    Retorna None si no hay OPENAI_API_KEY o si no se pudo inicializar. Los benchmarks
+    pueden fijar `embedding_function` y `_embedding_function_ready = True`.
+    """
+    global embedding_function, _embedding_function_ready
+    if _embedding_function_ready:
+        return embedding_function
+
+    with _embedding_function_lock:
+        if not _embedding_function_ready:
+            if OPENAI_API_KEY:
+                try:
+                    from chromadb.utils import embedding_functions
+                    embedding_function = embedding_functions.OpenAIEmbeddingFunction(
+                        api_key=OPENAI_API_KEY,
+                        model_name=EMBEDDING_MODEL,
+                        api_base=OPENAI_BASE_URL
+                    )
+                except Exception as e:
+                    print(f"⚠️  No se pudo inicializar OpenAI embedding function: {e}")
+            _embedding_function_ready = True
+    return embedding_function
+
+
+def embedding_function_for(model: str):
+    """
+    Función de embedding de OpenAI para crear una colección con otro modelo
+
+    Queda guardada en la configuración de la colección, así los clientes que no pasan
+    función de embedding (ej: el panel Gradio) embeben con el modelo correcto.
+    Retorna None sin OPENAI_API_KEY.
+    """
+    if model == EMBEDDING_MODEL:
+        return _get_embedding_function()
+    if not OPENAI_API_KEY:
+        return None
+    from chromadb.utils import embedding_functions
+    return embedding_functions.OpenAIEmbeddingFunction(
+        api_key=OPENAI_API_KEY,
+        model_name=model,
+        api_base=OPENAI_BASE_URL
+    )
+
+
+# Conexión a ChromaDB (breaker + sondeo de salud, ver chroma_connection.py)
+_connection: Optional[ChromaConnectionManager] = None
+_connection_lock = threading.Lock()
+
+
+def get_connection() -> ChromaConnectionManager:
+    """Obtener el administrador de conexión a ChromaDB del proceso"""
+    global _connection
+    if _connection is None:
+        with _connection_lock:
+            if _connection is None:
+                _connection = ChromaConnectionManager(CHROMA_HOST, CHROMA_PORT)
+    return _connection
 
-# Inicializar cliente de ChromaDB (lazy initialization con reintentos)
-_client_instance = None
-_last_init_attempt = None
 
 def _get_client():
     """
-    Obtener o inicializar el cliente de ChromaDB (lazy initialization con reintentos)
-    Reintenta la conexión si falló anteriormente (útil si ChromaDB se inicia después)
+    Obtener el cliente de ChromaDB
+
+    Falla al instante con ChromaUnavailableError mientras ChromaDB esté caído (breaker
+    abierto) y se reconecta solo cuando el sondeo detecta que volvió.
     """
-    global _client_instance, _last_init_attempt
-    import time
-    
-    # Si ya tenemos un cliente válido, retornarlo
-    if _client_instance is not None:
-        return _client_instance
-    
-    # Si intentamos hace menos de 5 segundos, no reintentar (evitar spam)
-    current_time = time.time()
-    if _last_init_attempt is not None and (current_time - _last_init_attempt) < 5:
+    return get_connection().get_client()
+
+
+def _check_connection_error(error: Exception):
+    """
+    Propagar los errores de disponibilidad de ChromaDB como ChromaUnavailableError
+
+    Los errores de conexión se informan al breaker; el resto (colección inexistente,
+    filtros inválidos, etc.) se deja pasar para que el llamador los maneje.
+    """
+    if isinstance(error, ChromaUnavailableError):
+        raise error
+    if is_connection_error(error):
+        connection = get_connection()
+        connection.record_failure(error)
+        raise ChromaUnavailableError(
+            f"ChromaDB no está disponible en {CHROMA_HOST}:{CHROMA_PORT}: {error}"
+        ) from error
+
+
+def warmup():
+    """
+    Importar las dependencias pesadas e inicializar los clientes de embeddings
+
+    Se llama en segundo plano al arrancar el API para que la primera búsqueda no
+    pague el costo de importar chromadb.
+    """
+    importlib.import_module("chromadb")
+
+    _get_embedding_function()
+    if OPENAI_API_KEY:
+        _get_query_embeddings()
+
+# Cliente de embeddings para queries, se crea una sola vez y se reutiliza
+_query_embeddings_instance = None
+_query_embeddings_lock = threading.Lock()
+# Clientes de embeddings de colecciones con otro modelo (ej: durante una migración)
+_query_embeddings_by_model: Dict[str, "CachedEmbeddings"] = {}
+
+
+class CachedEmbeddings:
+    """
+    Envoltorio de embeddings con caché de queries compartida entre workers
+
+    `embed_query` consulta la caché (ver cache.py) antes de llamar a OpenAI, de modo
+    que una misma query solo se embebe una vez aunque la atienda otro worker.
+    `embed_documents` no se cachea.
+    """
+
+    def __init__(self, embeddings, model: str):
+        self.embeddings = embeddings
+        self.model = model
+
+    def _embed(self, text: str, deadline: Optional[float]) -> List[float]:
+        # Solo EmbeddingClient acepta deadline; los embeddings de benchmarks no
+        if deadline is None:
+            return self.embeddings.embed_query(text)
+        return self.embeddings.embed_query(text, deadline=deadline)
+
+    def embed_query(self, text: str, deadline: Optional[float] = None) -> List[float]:
+        if not QUERY_EMBEDDING_CACHE_TTL:
+            return self._embed(text, deadline)
+
+        cache = get_cache()
+        key = cache_key(self.model, text)
+        vector = cache.get_vector("emb", key)
+        if vector is None:
+            vector = self._embed(text, deadline)
+            cache.set_vector("emb", key, vector, QUERY_EMBEDDING_CACHE_TTL)
+        return vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+
+def _get_query_embeddings(model: Optional[str] = None):
+    """
+    Obtener el cliente de embeddings usado para las queries de búsqueda
+
+    Se reutiliza la misma instancia entre requests y se envuelve con la caché de
+    queries. Los benchmarks pueden reemplazar `_query_embeddings_instance` por una
+    implementación local (cualquier objeto con `embed_query` y `embed_documents`).
+
+    Args:
+        model: Modelo de embedding de la colección (default: EMBEDDING_MODEL)
+    """
+    global _query_embeddings_instance
+
+    if model and model != EMBEDDING_MODEL:
+        return _get_model_embeddings(model)
+
+    if _query_embeddings_instance is not None:
+        if isinstance(_query_embeddings_instance, CachedEmbeddings):
+            return _query_embeddings_instance
+        return CachedEmbeddings(_query_embeddings_instance, EMBEDDING_MODEL)
+
+    if not OPENAI_API_KEY:
+        raise Exception("OPENAI_API_KEY no está configurada. Se requiere para embeddings.")
+
+    with _query_embeddings_lock:
+        if _query_embeddings_instance is None:
+            # Cliente propio con deadline, hedging y reintentos (ver embedding_client.py)
+            client = EmbeddingClient(OPENAI_API_KEY, EMBEDDING_MODEL, base_url=OPENAI_BASE_URL)
+            _query_embeddings_instance = CachedEmbeddings(client, EMBEDDING_MODEL)
+    return _query_embeddings_instance
+
+
+def _get_model_embeddings(model: str) -> "CachedEmbeddings":
+    """Cliente de embeddings para una colección creada con un modelo distinto de EMBEDDING_MODEL"""
+    instance = _query_embeddings_by_model.get(model)
+    if instance is not None:
+        return instance
+    if not OPENAI_API_KEY:
+        raise Exception("OPENAI_API_KEY no está configurada. Se requiere para embeddings.")
+    with _query_embeddings_lock:
+        if model not in _query_embeddings_by_model:
+            client = EmbeddingClient(OPENAI_API_KEY, model, base_url=OPENAI_BASE_URL)
+            _query_embeddings_by_model[model] = CachedEmbeddings(client, model)
+    return _query_embeddings_by_model[model]
+
+
+def embedding_stats() -> Optional[Dict[str, Any]]:
+    """Métricas del cliente de embeddings de queries (None si todavía no se creó)"""
+    instance = _query_embeddings_instance
+    embeddings = instance.embeddings if isinstance(instance, CachedEmbeddings) else instance
+    if isinstance(embeddings, EmbeddingClient):
+        return embeddings.stats()
+    return None
+
+
+def _embeddings_to_lists(emb_data) -> Optional[List[List[float]]]:
+    """
+    Convertir los embeddings devueltos por ChromaDB a listas de floats de Python
+
+    ChromaDB devuelve normalmente una matriz NumPy (n x dim): se convierte en una
+    sola operación vectorizada. Si los datos no forman una matriz regular se usa
+    la conversión elemento a elemento.
+    """
+    # Verificar que emb_data existe y no es None antes de usar en contexto booleano
+    if emb_data is None:
         return None
     
-    _last_init_attempt = current_time
+    if isinstance(emb_data, np.ndarray) and emb_data.ndim == 2:
+        return emb_data.tolist()
     
     try:
-        _client_instance = chromadb.HttpClient(host=CHROMA_HOST, port=CHROMA_PORT)
-        # Verificar conexión haciendo una operación simple
-        # Nota: heartbeat() puede fallar con API v1 deprecada, usar list_collections() en su lugar
-        try:
-            _client_instance.list_collections()
-            print(f"✅ Conectado a ChromaDB en {CHROMA_HOST}:{CHROMA_PORT}")
-        except Exception as list_error:
-            # Si list_collections falla, intentar heartbeat como último recurso
+        matrix = np.asarray(emb_data, dtype=np.float64)
+        if matrix.ndim == 2 or len(emb_data) == 0:
+            return matrix.tolist()
+    except (TypeError, ValueError):
+        pass
+    
+    embeddings = []
+    for emb in emb_data:
+        # Convertir numpy arrays o cualquier tipo a lista de Python
+        if isinstance(emb, np.ndarray):
+            embeddings.append(emb.tolist())
+        elif isinstance(emb, (list, tuple)):
+            # Asegurar que todos los elementos sean tipos básicos de Python
             try:
-                _client_instance.heartbeat()
-                print(f"✅ Conectado a ChromaDB en {CHROMA_HOST}:{CHROMA_PORT}")
-            except Exception:
-                # Si ambos fallan, aún así mantener el cliente (puede funcionar para operaciones básicas)
-                print(f"⚠️  Advertencia: No se pudo verificar conexión a ChromaDB, pero el cliente se creó")
-                print(f"   Se intentará usar el cliente de todas formas")
-        return _client_instance
-    except Exception as e:
-        # No imprimir error en cada intento para evitar spam
-        # Solo imprimir si es el primer intento o si pasó suficiente tiempo
-        if _last_init_attempt == current_time or (current_time - _last_init_attempt) > 30:
-            print(f"⚠️  No se pudo crear cliente de ChromaDB en {CHROMA_HOST}:{CHROMA_PORT}")
-            print(f"   Error: {str(e)}")
-            print(f"   Asegúrate de que ChromaDB esté corriendo")
-            print(f"   En desarrollo local, ejecuta: make dev-services")
-        _client_instance = None
-        return None
+                embeddings.append([float(x) for x in emb])
+            except (TypeError, ValueError):
+                # Si hay arrays anidados, convertir recursivamente
+                embeddings.append([float(x.item()) if isinstance(x, np.ndarray) else float(x) for x in emb])
+        else:
+            try:
+                embeddings.append([float(x) for x in list(emb)])
+            except (TypeError, ValueError):
+                embeddings.append(list(emb))
+    return embeddings
 
-# Inicializar cliente al importar el módulo
-client = _get_client()
 
+def _cosine_similarity(query_embedding: np.ndarray, doc_matrix: np.ndarray) -> np.ndarray:
+    """
+    Similitud coseno entre un vector de query y cada fila de doc_matrix
 
-def get_collection(collection_name: str):
+    Los vectores con norma cero dan similitud 0 (mismo criterio que scikit-learn).
     """
-    Obtener o crear una colección en ChromaDB
-    
-    Args:
-        collection_name: Nombre de la colección
-        
-    Returns:
-        Collection object de ChromaDB
-        
+    query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    matrix = np.asarray(doc_matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(query)
+    dots = matrix @ query
+    return np.divide(dots, norms, out=np.zeros_like(dots), where=norms != 0)
+
+
+# Alias de colecciones (ver collection_aliases.py)
+_aliases: Optional[AliasRegistry] = None
+_aliases_lock = threading.Lock()
+# Modelo de embedding de cada colección física (no cambia mientras exista)
+_collection_models: Dict[str, str] = {}
+# Colecciones con conflicto de embedding function ya advertido
+_conflict_warned = set()
+
+
+def get_aliases() -> AliasRegistry:
+    """Obtener el registro de alias de colecciones del proceso"""
+    global _aliases
+    if _aliases is None:
+        with _aliases_lock:
+            if _aliases is None:
+                _aliases = AliasRegistry(_get_client)
+    return _aliases
+
+
+def resolve_collection_name(collection_name: str) -> str:
+    """
+    Nombre de la colección física a la que apunta un alias
+
+    Si el nombre no es un alias se retorna sin cambios.
+
     Raises:
-        Exception: Si no se puede conectar a ChromaDB
+        ChromaUnavailableError: Si ChromaDB no está disponible
+    """
+    try:
+        return get_aliases().resolve(collection_name)
+    except Exception as e:
+        _check_connection_error(e)
+        raise
+
+
+def invalidate_results(collection_name: str) -> Dict[str, Any]:
     """
+    Invalidar los resultados de /mmr cacheados de una colección
+
+    Se llama desde cada escritura (ingesta por lotes, panel Gradio, cola de trabajos,
+    migraciones). La clave de /mmr usa la generación de la colección física, así que se
+    incrementa la del nombre resuelto: una escritura hecha por el alias o por el nombre
+    físico invalida las búsquedas hechas por cualquiera de los dos, tanto los
+    resultados vigentes como los vencidos del nivel "cached" y la caché semántica.
+
+    Returns:
+        Dict con la generación nueva de la colección física
+    """
+    physical_name = collection_name
+    try:
+        physical_name = resolve_collection_name(collection_name)
+    except Exception:
+        # Sin ChromaDB no se puede resolver el alias; se invalida el nombre pedido
+        pass
+    return {"collection": collection_name, "generations": {physical_name: get_cache().bump_generation(physical_name)}}
+
+
+def collection_embedding_model(collection) -> str:
+    """
+    Modelo de embedding con el que se indexó una colección
+
+    Las colecciones creadas antes de guardar el modelo en su metadata usan EMBEDDING_MODEL.
+    """
+    model = (collection.metadata or {}).get(EMBEDDING_MODEL_KEY) or EMBEDDING_MODEL
+    _collection_models[collection.name] = model
+    return model
+
+
+def _open_collection(physical_name: str):
+    """Obtener o crear una colección física (sin resolver alias)"""
     client_instance = _get_client()
-    if client_instance is None:
-        raise Exception(
-            f"ChromaDB no está disponible. "
-            f"Asegúrate de que ChromaDB esté corriendo en {CHROMA_HOST}:{CHROMA_PORT}. "
-            f"En desarrollo local, ejecuta: make dev-services"
-        )
     
+    embedding_function = _get_embedding_function()
     try:
         if embedding_function:
             collection = client_instance.get_or_create_collection(
-                name=collection_name,
-                embedding_function=embedding_function
+                name=physical_name,
+                embedding_function=embedding_function,
+                metadata={EMBEDDING_MODEL_KEY: EMBEDDING_MODEL}
             )
         else:
-            collection = client_instance.get_or_create_collection(name=collection_name)
+            collection = client_instance.get_or_create_collection(
+                name=physical_name,
+                metadata={EMBEDDING_MODEL_KEY: EMBEDDING_MODEL}
+            )
+        get_connection().record_success()
         return collection
     except ValueError as ve:
-        # Si hay conflicto de embedding function, eliminar y crear nueva
+        _check_connection_error(ve)
+        # Conflicto de embedding function: la colección se creó con otra configuración.
+        # El API siempre envía los embeddings calculados con el modelo de la colección
+        # (ver collection_embedding_model), así que se abre tal cual, sin borrarla.
         if "embedding function conflict" in str(ve).lower():
-            try:
-                client_instance.delete_collection(name=collection_name)
-                if embedding_function:
-                    collection = client_instance.get_or_create_collection(
-                        name=collection_name,
-                        embedding_function=embedding_function
-                    )
-                else:
-                    collection = client_instance.get_or_create_collection(name=collection_name)
-                return collection
-            except Exception as e:
-                raise Exception(f"Error al recrear colección: {e}")
+            if physical_name not in _conflict_warned:
+                _conflict_warned.add(physical_name)
+                print(f"⚠️  Colección '{physical_name}' creada con otra embedding function; se usa sin cambios "
+                      "(para cambiar de modelo ver migrate_collection.py)")
+            return client_instance.get_collection(name=physical_name)
         raise
 
 
+def get_collection(collection_name: str):
+    """
+    Obtener o crear una colección en ChromaDB
+    
+    Si `collection_name` es un alias se usa la colección a la que apunta. Las
+    colecciones nuevas guardan en su metadata el modelo de embedding (EMBEDDING_MODEL).
+    
+    Args:
+        collection_name: Nombre de la colección o alias
+        
+    Returns:
+        Collection object de ChromaDB
+        
+    Raises:
+        ChromaUnavailableError: Si ChromaDB no está disponible
+    """
+    return _open_collection(resolve_collection_name(collection_name))
+
+
 def get_all_vectors(collection_name: str, include_embeddings: bool = False) -> Dict[str, Any]:
     """
     Obtener todos los vectores (embeddings) de una colección específica
@@ -191,13 +469,7 @@ def get_all_vectors(collection_name: str, include_embeddings: bool = False) -> D
     Raises:
         Exception: Si hay error al obtener los datos
     """
-    client_instance = _get_client()
-    if client_instance is None:
-        raise Exception(
-            f"ChromaDB no está disponible. "
-            f"Asegúrate de que ChromaDB esté corriendo en {CHROMA_HOST}:{CHROMA_PORT}. "
-            f"En desarrollo local, ejecuta: make dev-services"
-        )
+    _get_client()  # Falla rápido si ChromaDB está caído
     
     try:
         collection = get_collection(collection_name)
@@ -211,26 +483,7 @@ def get_all_vectors(collection_name: str, include_embeddings: bool = False) -> D
         # Convertir embeddings a listas de Python si existen
         embeddings = None
         if include_embeddings:
-            emb_data = result.get("embeddings")
-            # Verificar que emb_data existe y no es None antes de usar en contexto booleano
-            if emb_data is not None:
-                embeddings = []
-                for emb in emb_data:
-                    # Convertir numpy arrays o cualquier tipo a lista de Python
-                    if isinstance(emb, np.ndarray):
-                        embeddings.append(emb.tolist())
-                    elif isinstance(emb, (list, tuple)):
-                        # Asegurar que todos los elementos sean tipos básicos de Python
-                        try:
-                            embeddings.append([float(x) for x in emb])
-                        except (TypeError, ValueError):
-                            # Si hay arrays anidados, convertir recursivamente
-                            embeddings.append([float(x.item()) if isinstance(x, np.ndarray) else float(x) for x in emb])
-                    else:
-                        try:
-                            embeddings.append([float(x) for x in list(emb)])
-                        except (TypeError, ValueError):
-                            embeddings.append(list(emb))
+            embeddings = _embeddings_to_lists(result.get("embeddings"))
         
         return {
             "collection": collection_name,
@@ -241,9 +494,8 @@ def get_all_vectors(collection_name: str, include_embeddings: bool = False) -> D
             "embeddings": embeddings
         }
     except Exception as e:
+        _check_connection_error(e)
         error_msg = str(e)
-        if "ChromaDB no está disponible" in error_msg:
-            raise Exception(error_msg)
         raise Exception(f"Error al obtener vectores de la colección '{collection_name}': {error_msg}")
 
 
@@ -259,13 +511,7 @@ def get_vectors_by_ids(collection_name: str, ids: List[str], include_embeddings:
     Returns:
         Dict con los vectores solicitados
     """
-    client_instance = _get_client()
-    if client_instance is None:
-        raise Exception(
-            f"ChromaDB no está disponible. "
-            f"Asegúrate de que ChromaDB esté corriendo en {CHROMA_HOST}:{CHROMA_PORT}. "
-            f"En desarrollo local, ejecuta: make dev-services"
-        )
+    _get_client()  # Falla rápido si ChromaDB está caído
     
     try:
         collection = get_collection(collection_name)
@@ -278,26 +524,7 @@ def get_vectors_by_ids(collection_name: str, ids: List[str], include_embeddings:
         # Convertir embeddings a listas de Python si existen
         embeddings = None
         if include_embeddings:
-            emb_data = result.get("embeddings")
-            # Verificar que emb_data existe y no es None antes de usar en contexto booleano
-            if emb_data is not None:
-                embeddings = []
-                for emb in emb_data:
-                    # Convertir numpy arrays o cualquier tipo a lista de Python
-                    if isinstance(emb, np.ndarray):
-                        embeddings.append(emb.tolist())
-                    elif isinstance(emb, (list, tuple)):
-                        # Asegurar que todos los elementos sean tipos básicos de Python
-                        try:
-                            embeddings.append([float(x) for x in emb])
-                        except (TypeError, ValueError):
-                            # Si hay arrays anidados, convertir recursivamente
-                            embeddings.append([float(x.item()) if isinstance(x, np.ndarray) else float(x) for x in emb])
-                    else:
-                        try:
-                            embeddings.append([float(x) for x in list(emb)])
-                        except (TypeError, ValueError):
-                            embeddings.append(list(emb))
+            embeddings = _embeddings_to_lists(result.get("embeddings"))
         
         return {
             "collection": collection_name,
@@ -308,9 +535,8 @@ def get_vectors_by_ids(collection_name: str, ids: List[str], include_embeddings:
             "embeddings": embeddings
         }
     except Exception as e:
+        _check_connection_error(e)
         error_msg = str(e)
-        if "ChromaDB no está disponible" in error_msg:
-            raise Exception(error_msg)
         raise Exception(f"Error al obtener vectores por IDs: {error_msg}")
 
 
@@ -322,17 +548,13 @@ def list_collections() -> List[str]:
         Lista de nombres de colecciones
     """
     client_instance = _get_client()
-    if client_instance is None:
-        raise Exception(
-            f"ChromaDB no está disponible. "
-            f"Asegúrate de que ChromaDB esté corriendo en {CHROMA_HOST}:{CHROMA_PORT}. "
-            f"En desarrollo local, ejecuta: make dev-services"
-        )
     
     try:
         collections = client_instance.list_collections()
-        return [col.name for col in collections]
+        get_connection().record_success()
+        return [col.name for col in collections if col.name != CHROMA_ALIAS_COLLECTION]
     except Exception as e:
+        _check_connection_error(e)
         raise Exception(f"Error al listar colecciones: {str(e)}")
 
 
@@ -346,13 +568,7 @@ def get_collection_info(collection_name: str) -> Dict[str, Any]:
     Returns:
         Dict con información de la colección
     """
-    client_instance = _get_client()
-    if client_instance is None:
-        raise Exception(
-            f"ChromaDB no está disponible. "
-            f"Asegúrate de que ChromaDB esté corriendo en {CHROMA_HOST}:{CHROMA_PORT}. "
-            f"En desarrollo local, ejecuta: make dev-services"
-        )
+    _get_client()  # Falla rápido si ChromaDB está caído
     
     try:
         collection = get_collection(collection_name)
@@ -360,16 +576,140 @@ def get_collection_info(collection_name: str) -> Dict[str, Any]:
         
         return {
             "collection": collection_name,
+            "physical_collection": collection.name,
+            "embedding_model": collection_embedding_model(collection),
             "count": count,
             "metadata": collection.metadata or {}
         }
     except Exception as e:
+        _check_connection_error(e)
         error_msg = str(e)
-        if "ChromaDB no está disponible" in error_msg:
-            raise Exception(error_msg)
         raise Exception(f"Error al obtener información de la colección: {error_msg}")
 
 
+def _maximal_marginal_relevance(
+    query_embedding: np.ndarray,
+    candidates: np.ndarray,
+    k: int,
+    lambda_mult: float
+) -> List[int]:
+    """
+    Selección MMR: misma fórmula y desempates que langchain_chroma
+
+    Cada paso elige el candidato que maximiza
+    lambda_mult * sim(query, d) - (1 - lambda_mult) * max(sim(d, seleccionados)),
+    manteniendo el máximo de redundancia de forma incremental (una multiplicación
+    matriz-vector por documento elegido en lugar de recalcular toda la matriz).
+
+    Returns:
+        Índices de los candidatos elegidos, en orden de selección
+    """
+    n = len(candidates)
+    if min(k, n) <= 0:
+        return []
+    similarity_to_query = _cosine_similarity(query_embedding, candidates)
+    norms = np.linalg.norm(candidates, axis=1, keepdims=True)
+    normalized = np.divide(candidates, norms, out=np.zeros_like(candidates), where=norms != 0)
+
+    selected = [int(np.argmax(similarity_to_query))]
+    redundancy = normalized @ normalized[selected[0]]
+    while len(selected) < min(k, n):
+        scores = lambda_mult * similarity_to_query - (1 - lambda_mult) * redundancy
+        scores[selected] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        redundancy = np.maximum(redundancy, normalized @ normalized[best])
+    return selected
+
+
+def _clean_filters(filters: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Quitar campos vacíos o generados por Swagger (additionalProp*) de los filtros"""
+    if not filters:
+        return None
+    cleaned_filters = {}
+    for key, value in filters.items():
+        # Ignorar campos adicionales generados automáticamente
+        if key.startswith("additionalProp"):
+            continue
+        # Solo incluir valores válidos (no None, no vacíos)
+        if value is not None and value != "":
+            if isinstance(value, dict):
+                # Si es un dict, solo incluir si no está vacío
+                if value:
+                    cleaned_filters[key] = value
+            elif isinstance(value, list):
+                # Si es una lista, incluir si no está vacía
+                if value:
+                    cleaned_filters[key] = value
+            else:
+                # Para strings, números, booleans, etc., incluir directamente
+                cleaned_filters[key] = value
+    
+    # Si después de limpiar no quedan filtros válidos, tratar como None
+    return cleaned_filters or None
+
+
+def _search_candidates(
+    collection,
+    query_embedding: List[float],
+    n_results: int,
+    k: int,
+    lambda_mult: float,
+    chroma_filters: Optional[Dict[str, Any]],
+    diversify: bool
+) -> List[Dict[str, Any]]:
+    """
+    Buscar candidatos en ChromaDB y (opcionalmente) aplicar MMR
+
+    Una sola consulta trae documentos, metadatos y embeddings de los candidatos: los
+    embeddings se usan para MMR y para el score de similitud, sin otra llamada.
+
+    Returns:
+        Lista de dicts con id, document, metadata y similarity_score, en el orden de
+        distancia de ChromaDB (igual que LangChain)
+    """
+    results = collection.query(
+        query_embeddings=[query_embedding],
+        n_results=n_results,
+        where=chroma_filters,
+        include=["metadatas", "documents", "distances", "embeddings"]
+    )
+    
+    ids = results["ids"][0] if results.get("ids") else []
+    if not ids:
+        return []
+    documents = results["documents"][0]
+    metadatas = results["metadatas"][0]
+    candidate_matrix = np.asarray(results["embeddings"][0], dtype=np.float32)
+    query_np = np.asarray(query_embedding, dtype=np.float32)
+    
+    if diversify:
+        selected = set(_maximal_marginal_relevance(query_np, candidate_matrix, k, lambda_mult))
+    else:
+        selected = set(range(min(k, len(ids))))
+    similarities = _cosine_similarity(query_np, candidate_matrix)
+    
+    candidates = []
+    for i, doc_id in enumerate(ids):
+        if i not in selected or documents[i] is None:
+            continue
+        candidates.append({
+            "id": doc_id,
+            "document": documents[i],
+            "metadata": metadatas[i] or {},
+            "similarity_score": float(similarities[i])
+        })
+    return candidates
+
+
+def _with_degradation(result: Dict[str, Any], level: str, **details) -> Dict[str, Any]:
+    result = dict(result)
+    result["degradation"] = dict(result.get("degradation") or {}, level=level, **details)
+    # El tiempo es el del request que responde, no el del que guardó el resultado
+    result["degradation"].pop("elapsed_ms", None)
+    return result
+
+
 def mmr_search(
     collection_name: str,
     query: str,
@@ -378,13 +718,18 @@ def mmr_search(
     lambda_mult: float = 0.5,
     filters: Optional[Dict[str, Any]] = None,
     min_score: float = 0.4,
+    deadline: Optional[float] = None,
 ) -> Dict[str, Any]:
     """
-    Maximum Marginal Relevance (MMR) search usando LangChain con ChromaDB
+    Maximum Marginal Relevance (MMR) search sobre ChromaDB
     
     MMR busca maximizar la relevancia mientras minimiza la redundancia entre documentos.
     Selecciona documentos que son relevantes al query pero diversos entre sí.
     
+    Con deadline, si el tiempo restante no alcanza para la búsqueda completa se degrada
+    por niveles (ver degradation.py): menos candidatos, top-k sin diversidad, resultado
+    cacheado o de una query casi idéntica. El nivel aplicado se informa en `degradation`.
+    
     Args:
         collection_name: Nombre de la colección
         query: Texto de búsqueda
@@ -396,208 +741,179 @@ def mmr_search(
                  Ejemplo: {"categoria": "precio"} filtrará solo documentos con categoria="precio"
                  Puede usar múltiples filtros: {"categoria": "precio", "tipo": "servicio"}
         min_score: Score mínimo de similitud para incluir un documento (default: 0.4)
+        deadline: Instante límite (time.monotonic()) del request. Si es None no se degrada
+                  y el embedding usa EMBEDDING_TIMEOUT (ver embedding_client.py)
         
     Returns:
         Dict con los resultados de la búsqueda MMR filtrados por min_score
+
+    Raises:
+        EmbeddingDeadlineExceeded: Si el embedding de la query no llegó a tiempo y no hay caché
+        SearchDeadlineExceeded: Si no queda tiempo para buscar y no hay resultado cacheado
     """
-    client_instance = _get_client()
-    if client_instance is None:
-        raise Exception(
-            f"ChromaDB no está disponible. "
-            f"Asegúrate de que ChromaDB esté corriendo en {CHROMA_HOST}:{CHROMA_PORT}. "
-            f"En desarrollo local, ejecuta: make dev-services"
+    started = time.monotonic()
+    _get_client()  # Falla rápido si ChromaDB está caído
+    
+    # Colección física detrás del alias y modelo con el que se indexó: la query se
+    # embebe con ese modelo, así una migración en curso no afecta a las búsquedas
+    physical_name = resolve_collection_name(collection_name)
+    collection = None
+    model = _collection_models.get(physical_name)
+    if model is None:
+        try:
+            collection = _open_collection(physical_name)
+        except Exception as e:
+            _check_connection_error(e)
+            raise Exception(f"Error en búsqueda MMR: {str(e)}")
+        model = collection_embedding_model(collection)
+    
+    def remaining_ms() -> Optional[float]:
+        return (deadline - time.monotonic()) * 1000 if deadline is not None else None
+    
+    def with_elapsed(result: Dict[str, Any]) -> Dict[str, Any]:
+        # Copia: el mismo dict puede estar guardado en la caché semántica
+        if deadline is None:
+            return result
+        result = dict(result)
+        result["degradation"] = dict(
+            result.get("degradation") or {}, elapsed_ms=round((time.monotonic() - started) * 1000, 1)
         )
+        return result
     
-    if not OPENAI_API_KEY:
-        raise Exception("OPENAI_API_KEY no está configurada. Se requiere para embeddings.")
+    # Caché de resultados compartida entre workers. La clave incluye la "generación"
+    # de la colección física para que las escrituras (ver invalidate_results) la invaliden.
+    # Los resultados se conservan RESULT_STALE_TTL para servirlos si el deadline no alcanza.
+    result_key = None
+    semantic_group = None
+    stale_result = None
+    if RESULT_CACHE_TTL or RESULT_STALE_TTL:
+        cache = get_cache()
+        generation = cache.generation(physical_name)
+        search_params = (physical_name, generation, model, k, fetch_k, lambda_mult, filters, min_score)
+        result_key = cache_key(*search_params[:4], query, *search_params[4:])
+        semantic_group = cache_key(*search_params)
+        entry = cache.get_json("mmr", result_key)
+        if isinstance(entry, dict) and "at" in entry:
+            if time.time() - entry["at"] <= RESULT_CACHE_TTL:
+                return entry["result"]
+            stale_result = entry["result"]
+    
+    def cached_fallback(query_embedding: Optional[List[float]] = None) -> Optional[Dict[str, Any]]:
+        if stale_result is not None:
+            return with_elapsed(_with_degradation(stale_result, degradation.CACHED))
+        if query_embedding is not None and semantic_group:
+            hit = get_semantic_cache().lookup(semantic_group, query_embedding)
+            if hit is not None:
+                return with_elapsed(
+                    _with_degradation(hit[0], degradation.SEMANTIC_CACHE, similarity=round(hit[1], 4))
+                )
+        return None
     
     try:
-        # Inicializar embeddings de OpenAI
-        embeddings = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL)
-        
-        # Crear vector store de LangChain conectado a ChromaDB existente
-        vector_store = LangChainChroma(
-            client=client_instance,
-            collection_name=collection_name,
-            embedding_function=embeddings
-        )
+        # El request pudo haber esperado en el pool más que su presupuesto
+        if deadline is not None and remaining_ms() <= 0:
+            fallback = cached_fallback()
+            if fallback is not None:
+                return fallback
+            raise SearchDeadlineExceeded("El deadline venció antes de empezar la búsqueda")
         
-        # Limpiar y preparar filtros de metadatos si se proporcionan
-        cleaned_filters = None
-        if filters:
-            cleaned_filters = {}
-            for key, value in filters.items():
-                # Ignorar campos adicionales generados automáticamente
-                if key.startswith("additionalProp"):
-                    continue
-                # Solo incluir valores válidos (no None, no vacíos)
-                if value is not None and value != "":
-                    if isinstance(value, dict):
-                        # Si es un dict, solo incluir si no está vacío
-                        if value:
-                            cleaned_filters[key] = value
-                    elif isinstance(value, list):
-                        # Si es una lista, incluir si no está vacía
-                        if value:
-                            cleaned_filters[key] = value
-                    else:
-                        # Para strings, números, booleans, etc., incluir directamente
-                        cleaned_filters[key] = value
-            
-            # Si después de limpiar no quedan filtros válidos, tratar como None
-            if not cleaned_filters:
-                cleaned_filters = None
+        # Obtener embedding de la query (instancia reutilizada entre requests)
+        embeddings = _get_query_embeddings(model)
+        try:
+            query_embedding = embeddings.embed_query(query, deadline=deadline)
+        except EmbeddingDeadlineExceeded:
+            fallback = cached_fallback()
+            if fallback is not None:
+                return fallback
+            raise
         
-        # Preparar parámetros para MMR search
-        kwargs_mmr = {
-            "k": k,
-            "fetch_k": fetch_k,
-            "lambda_mult": lambda_mult
-        }
+        level, n_results = degradation.plan_search(remaining_ms(), k, fetch_k)
+        if level == degradation.CACHE_ONLY:
+            fallback = cached_fallback(query_embedding)
+            if fallback is not None:
+                return fallback
+            if remaining_ms() <= 0:
+                raise SearchDeadlineExceeded("Sin tiempo para buscar y sin resultado cacheado")
+            # Queda algo de tiempo: intentar la búsqueda más barata
+            level, n_results = degradation.TOP_K, k
         
         # Aplicar filtros de metadatos si existen
-        # ChromaDB/LangChain espera filtros en formato: {"metadata_field": "value"}
+        # ChromaDB espera filtros en formato: {"metadata_field": "value"}
         # o {"metadata_field": {"$eq": "value"}} para operadores avanzados
-        chroma_filters = None
-        if cleaned_filters:
-            # Convertir filtros simples al formato que ChromaDB espera
-            chroma_filters = {}
-            for key, value in cleaned_filters.items():
-                # Si el valor es un string simple, usar formato directo
-                # ChromaDB acepta: {"categoria": "precio"}
-                chroma_filters[key] = value
-            
-            kwargs_mmr["filter"] = chroma_filters
+        chroma_filters = _clean_filters(filters)
+        if chroma_filters:
             print(f"🔍 Aplicando filtros de metadatos: {chroma_filters}")
         
-        # Obtener documentos MMR seleccionados
-        docs = vector_store.max_marginal_relevance_search(query, **kwargs_mmr)
+        search_started = time.perf_counter()
+        if collection is None:
+            collection = _open_collection(physical_name)
+        docs = _search_candidates(
+            collection,
+            query_embedding,
+            n_results=n_results,
+            k=k,
+            lambda_mult=lambda_mult,
+            chroma_filters=chroma_filters,
+            diversify=level != degradation.TOP_K
+        )
+        degradation.stage_latencies.record(level, (time.perf_counter() - search_started) * 1000, n_results)
+        get_connection().record_success()
         
         # Verificar que los documentos obtenidos cumplan con los filtros (doble verificación)
-        # Esto asegura que incluso si LangChain no aplica los filtros correctamente, los filtramos manualmente
         if chroma_filters and docs:
             original_count = len(docs)
-            filtered_docs = []
-            for doc in docs:
-                doc_metadata = {}
-                if hasattr(doc, 'metadata') and doc.metadata:
-                    doc_metadata = doc.metadata if isinstance(doc.metadata, dict) else {}
-                
-                # Verificar que el documento cumpla con todos los filtros
-                matches_all_filters = True
-                for filter_key, filter_value in chroma_filters.items():
-                    doc_value = doc_metadata.get(filter_key)
-                    if doc_value != filter_value:
-                        matches_all_filters = False
-                        break
-                
-                if matches_all_filters:
-                    filtered_docs.append(doc)
-            
-            docs = filtered_docs
-            if len(filtered_docs) < original_count:
-                print(f"⚠️  Filtrado post-MMR: {original_count} documentos antes, {len(filtered_docs)} después de aplicar filtros")
-        
-        # Calcular scores de similitud para evaluar relevancia
-        # Obtener embedding del query
-        query_embedding = embeddings.embed_query(query)
-        query_embedding_np = np.array(query_embedding).reshape(1, -1)
-        
-        # Extraer IDs de los documentos MMR
-        doc_ids_from_mmr = []
-        for doc in docs:
-            doc_id = ""
-            if hasattr(doc, 'metadata') and doc.metadata:
-                metadata = doc.metadata if isinstance(doc.metadata, dict) else {}
-                doc_id = metadata.get('id') or metadata.get('_id') or metadata.get('doc_id') or ""
-            if not doc_id and hasattr(doc, 'id'):
-                doc_id = str(doc.id)
-            if doc_id:
-                doc_ids_from_mmr.append(doc_id)
-        
-        # Obtener embeddings desde ChromaDB y calcular similitud coseno
-        doc_scores_map = {}
-        if doc_ids_from_mmr:
-            try:
-                collection = get_collection(collection_name)
-                embeddings_result = collection.get(
-                    ids=doc_ids_from_mmr,
-                    include=["embeddings"]
-                )
-                
-                if embeddings_result and embeddings_result.get("ids"):
-                    for i, doc_id in enumerate(embeddings_result["ids"]):
-                        if i < len(embeddings_result.get("embeddings", [])):
-                            doc_emb = np.array(embeddings_result["embeddings"][i])
-                            doc_emb_np = doc_emb.reshape(1, -1)
-                            
-                            # Calcular similitud coseno
-                            similarity = cosine_similarity(query_embedding_np, doc_emb_np)[0][0]
-                            doc_scores_map[doc_id] = float(similarity)
-            except Exception as e:
-                print(f"⚠️  Error al calcular scores: {e}")
+            docs = [
+                doc for doc in docs
+                if all(doc["metadata"].get(key) == value for key, value in chroma_filters.items())
+            ]
+            if len(docs) < original_count:
+                print(f"⚠️  Filtrado post-MMR: {original_count} documentos antes, {len(docs)} después de aplicar filtros")
         
         # Procesar resultados
         processed_results = []
         for i, doc in enumerate(docs):
-            # Extraer metadata
-            metadata = {}
-            if hasattr(doc, 'metadata') and doc.metadata:
-                metadata = doc.metadata if isinstance(doc.metadata, dict) else {}
-            
-            # Obtener ID del documento - puede estar en diferentes lugares
-            doc_id = ""
-            if isinstance(metadata, dict):
-                # Intentar diferentes campos comunes para ID
-                doc_id = metadata.get('id') or metadata.get('_id') or metadata.get('doc_id') or ""
-            
-            # Si no hay ID en metadata, intentar obtenerlo del documento directamente
-            if not doc_id and hasattr(doc, 'id'):
-                doc_id = str(doc.id)
+            metadata = doc["metadata"] if isinstance(doc["metadata"], dict) else {}
             
-            # Obtener el contenido del documento
-            document_content = ""
-            if hasattr(doc, 'page_content'):
-                document_content = doc.page_content
-            elif hasattr(doc, 'content'):
-                document_content = doc.content
-            else:
-                document_content = str(doc)
-            
-            # Obtener score de similitud para evaluar relevancia
-            similarity_score = doc_scores_map.get(doc_id, None) if doc_id else None
+            # ID del documento: primero campos comunes de metadata, luego el ID de ChromaDB
+            doc_id = metadata.get('id') or metadata.get('_id') or metadata.get('doc_id') or doc["id"]
             
-            # Limpiar metadata para remover campos internos de LangChain si es necesario
-            clean_metadata = {}
-            if isinstance(metadata, dict):
-                for key, value in metadata.items():
-                    # Excluir campos internos que no queremos exponer
-                    if not key.startswith('_') and key not in ['score', 'relevance_score', 'distance']:
-                        clean_metadata[key] = value
+            # Limpiar metadata para remover campos internos si es necesario
+            clean_metadata = {
+                key: value for key, value in metadata.items()
+                if not key.startswith('_') and key not in ['score', 'relevance_score', 'distance']
+            }
             
+            similarity_score = doc["similarity_score"]
             result = {
                 "id": str(doc_id) if doc_id else f"doc_{i}",
-                "document": document_content,
-                "metadata": clean_metadata
+                "document": doc["document"],
+                "metadata": clean_metadata,
+                "similarity_score": similarity_score
             }
             
-            # Agregar score de similitud si está disponible
-            if similarity_score is not None:
-                result["similarity_score"] = similarity_score
-            
             # Filtrar por min_score: solo incluir documentos con score >= min_score
-            if similarity_score is not None and similarity_score >= min_score:
-                processed_results.append(result)
-            elif similarity_score is None:
-                # Si no hay score disponible, incluir el documento (por compatibilidad)
+            if similarity_score >= min_score:
                 processed_results.append(result)
         
-        return {
+        result = {
             "results": processed_results,
             "count": len(processed_results),
+            # Se mantiene el nombre histórico: los workflows de n8n lo consultan
             "search_type": "mmr_langchain",
-            "min_score": min_score
+            "min_score": min_score,
+            "degradation": {"level": level, "fetch_k": n_results if level != degradation.TOP_K else k}
         }
+        if level == degradation.NONE:
+            if result_key:
+                get_cache().set_json(
+                    "mmr", result_key, {"at": time.time(), "result": result},
+                    max(RESULT_CACHE_TTL, RESULT_STALE_TTL)
+                )
+            if semantic_group:
+                get_semantic_cache().add(semantic_group, query, query_embedding, result)
+        return with_elapsed(result)
+    except (EmbeddingDeadlineExceeded, SearchDeadlineExceeded):
+        raise
     except Exception as e:
+        _check_connection_error(e)
         raise Exception(f"Error en búsqueda MMR: {str(e)}")
-
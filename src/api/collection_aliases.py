@@ -0,0 +1,91 @@
+"""
+Alias de colecciones de ChromaDB
+
+Un alias es un nombre estable (el que usan n8n y el panel Gradio, ej: "pozos") que
+apunta a una colección física (ej: "pozos-text-embedding-3-small"). Permite migrar
+a otro modelo de embedding sin cortar el servicio: la migración llena una colección
+nueva mientras se sigue leyendo la anterior, y al final se cambia el alias.
+
+ChromaDB no tiene alias propios: se guardan como registros de la colección
+CHROMA_ALIAS_COLLECTION (ID = alias, metadata "target"). Cambiar un alias es un
+único upsert, así que el cambio es atómico. Cada worker cachea la resolución
+CHROMA_ALIAS_CACHE_TTL segundos.
+"""
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+CHROMA_ALIAS_COLLECTION = os.getenv("CHROMA_ALIAS_COLLECTION", "collection_aliases")
+CHROMA_ALIAS_CACHE_TTL = float(os.getenv("CHROMA_ALIAS_CACHE_TTL", "5"))
+
+# Metadata de colección con el modelo usado para sus embeddings
+EMBEDDING_MODEL_KEY = "embedding_model"
+
+# Los registros de alias no se buscan por similitud: embedding fijo de una dimensión
+_PLACEHOLDER_EMBEDDING = [0.0]
+
+
+class AliasRegistry:
+    """Lectura y cambio de alias guardados en ChromaDB"""
+
+    def __init__(self, get_client: Callable[[], Any]):
+        self._get_client = get_client
+        self._cache: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _collection(self):
+        return self._get_client().get_or_create_collection(name=CHROMA_ALIAS_COLLECTION)
+
+    def resolve(self, name: str) -> str:
+        """
+        Nombre de la colección física a la que apunta `name`
+
+        Si `name` no es un alias se retorna sin cambios.
+        """
+        if name == CHROMA_ALIAS_COLLECTION:
+            return name
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(name)
+        if cached is not None and now - cached[1] < CHROMA_ALIAS_CACHE_TTL:
+            return cached[0]
+
+        result = self._collection().get(ids=[name], include=["metadatas"])
+        target = name
+        if result["ids"]:
+            target = (result["metadatas"][0] or {}).get("target") or name
+        with self._lock:
+            self._cache[name] = (target, now)
+        return target
+
+    def set(self, alias: str, target: str) -> Optional[str]:
+        """
+        Apuntar el alias a otra colección (alias == target elimina el alias)
+
+        Returns:
+            Colección a la que apuntaba antes (para poder volver atrás)
+
+        Raises:
+            Exception: Si la colección destino no existe
+        """
+        client = self._get_client()
+        client.get_collection(name=target)  # Falla si no existe
+        previous = self.list().get(alias, {}).get("target", alias)
+        registry = self._collection()
+        if alias == target:
+            registry.delete(ids=[alias])
+        else:
+            registry.upsert(
+                ids=[alias],
+                embeddings=[_PLACEHOLDER_EMBEDDING],
+                metadatas=[{"target": target, "previous": previous, "updated_at": time.time()}]
+            )
+        with self._lock:
+            self._cache.pop(alias, None)
+        return previous
+
+    def list(self) -> Dict[str, Dict[str, Any]]:
+        """Alias definidos: {alias: {"target", "previous", "updated_at"}}"""
+        result = self._collection().get(include=["metadatas"])
+        return {alias: dict(metadata or {}) for alias, metadata in zip(result["ids"], result["metadatas"])}
@@ -0,0 +1,116 @@
+"""
+Presupuesto de tiempo y degradación escalonada del retriever MMR
+
+Cuando el request trae deadline (header X-Request-Timeout-Ms o campo timeout_ms),
+mmr_search estima cuánto tardará cada etapa con las latencias observadas en este
+worker y elige el mejor nivel que entra en el tiempo restante:
+
+- none:            MMR completo con el fetch_k pedido
+- reduced_fetch_k: MMR sobre menos candidatos
+- top_k:           sin la pasada de diversidad (los k más similares)
+- cached:          resultado guardado para la misma búsqueda, aunque su TTL haya vencido
+- semantic_cache:  resultado de una query casi idéntica (ver SemanticCache en cache.py)
+
+Una respuesta tardía no le sirve al webhook de n8n: si no entra ningún nivel se
+responde 504 en lugar de esperar.
+"""
+import os
+import threading
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+# Margen reservado para serializar y enviar la respuesta (ms)
+RETRIEVER_DEADLINE_MARGIN_MS = float(os.getenv("RETRIEVER_DEADLINE_MARGIN_MS", "25"))
+
+NONE = "none"
+REDUCED_FETCH_K = "reduced_fetch_k"
+TOP_K = "top_k"
+CACHED = "cached"
+SEMANTIC_CACHE = "semantic_cache"
+# Nivel intermedio de plan_search: no entra ninguna búsqueda, probar las cachés
+CACHE_ONLY = "cache_only"
+
+# Muestras mínimas antes de confiar en una estimación
+_MIN_SAMPLES = 5
+
+
+class SearchDeadlineExceeded(Exception):
+    """No hay tiempo para ningún nivel de búsqueda ni resultado cacheado"""
+
+
+class StageLatencies:
+    """
+    Latencias recientes de la búsqueda en ChromaDB + MMR (por worker)
+
+    Las búsquedas MMR se registran por candidato (ms / fetch_k) para poder estimar
+    el costo de otro fetch_k; las top-k se registran en ms totales.
+    """
+
+    def __init__(self, window: int = 256):
+        self._samples: Dict[str, deque] = {"mmr": deque(maxlen=window), "top_k": deque(maxlen=window)}
+        self._lock = threading.Lock()
+
+    def record(self, level: str, elapsed_ms: float, n_results: int):
+        with self._lock:
+            if level == TOP_K:
+                self._samples["top_k"].append(elapsed_ms)
+            elif level in (NONE, REDUCED_FETCH_K):
+                self._samples["mmr"].append(elapsed_ms / max(1, n_results))
+
+    def _p90(self, stage: str) -> Optional[float]:
+        with self._lock:
+            samples = list(self._samples[stage])
+        if len(samples) < _MIN_SAMPLES:
+            return None
+        return float(np.percentile(samples, 90))
+
+    def estimate_mmr(self, fetch_k: int) -> Optional[float]:
+        per_candidate = self._p90("mmr")
+        return per_candidate * fetch_k if per_candidate is not None else None
+
+    def estimate_top_k(self, k: int) -> Optional[float]:
+        top_k = self._p90("top_k")
+        if top_k is not None:
+            return top_k
+        return self.estimate_mmr(k)
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        with self._lock:
+            samples = {f"{stage}_samples": len(values) for stage, values in self._samples.items()}
+        return {"mmr_ms_per_candidate_p90": self._p90("mmr"), "top_k_ms_p90": self._p90("top_k"), **samples}
+
+
+stage_latencies = StageLatencies()
+
+
+def plan_search(remaining_ms: Optional[float], k: int, fetch_k: int) -> Tuple[str, int]:
+    """
+    Elegir el nivel de búsqueda según el presupuesto restante
+
+    Args:
+        remaining_ms: Milisegundos hasta el deadline (None = sin deadline)
+        k: Documentos a retornar
+        fetch_k: Candidatos pedidos para MMR
+
+    Returns:
+        (nivel, candidatos a pedir a ChromaDB). CACHE_ONLY si no entra ninguna búsqueda.
+    """
+    if remaining_ms is None:
+        return NONE, fetch_k
+
+    available = remaining_ms - RETRIEVER_DEADLINE_MARGIN_MS
+    estimate = stage_latencies.estimate_mmr(fetch_k)
+    # Sin muestras todavía no hay base para degradar: se intenta la búsqueda completa
+    if estimate is None or available >= estimate:
+        return (NONE, fetch_k) if available > 0 else (CACHE_ONLY, 0)
+
+    reduced = int(fetch_k * available / estimate)
+    if reduced > k:
+        return REDUCED_FETCH_K, reduced
+
+    top_k_estimate = stage_latencies.estimate_top_k(k)
+    if top_k_estimate is None or available >= top_k_estimate:
+        return TOP_K, k
+    return CACHE_ONLY, 0
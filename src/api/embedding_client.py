@@ -0,0 +1,251 @@
+"""
+Cliente HTTP de embeddings de OpenAI para las queries de búsqueda
+
+Reemplaza a OpenAIEmbeddings (LangChain) en el camino de /mmr para controlar la
+latencia de cola:
+- Deadline por request: cada llamada recibe un instante límite (time.monotonic())
+  propagado desde el request HTTP; ningún intento ni reintento lo excede.
+- Hedging: si la respuesta tarda más que el percentil EMBEDDING_HEDGE_PERCENTILE de
+  las latencias recientes, se lanza un segundo request idéntico y gana el primero
+  que responda. EMBEDDING_HEDGE_MAX_RATIO acota la carga extra sobre OpenAI.
+- Reintentos con backoff exponencial y jitter ante 429, 5xx y errores de red,
+  respetando Retry-After y el presupuesto restante.
+"""
+import base64
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional
+
+import httpx
+import numpy as np
+
+# Presupuesto por defecto de una llamada cuando el request no trae deadline (segundos)
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "30"))
+EMBEDDING_HEDGE = os.getenv("EMBEDDING_HEDGE", "true").lower() == "true"
+# Percentil de latencia a partir del cual se lanza el request duplicado
+EMBEDDING_HEDGE_PERCENTILE = float(os.getenv("EMBEDDING_HEDGE_PERCENTILE", "95"))
+# Demora de hedging mientras no hay suficientes muestras, y piso de la demora (ms)
+EMBEDDING_HEDGE_INITIAL_DELAY_MS = float(os.getenv("EMBEDDING_HEDGE_INITIAL_DELAY_MS", "1000"))
+EMBEDDING_HEDGE_MIN_DELAY_MS = float(os.getenv("EMBEDDING_HEDGE_MIN_DELAY_MS", "50"))
+# Fracción máxima de llamadas que pueden duplicarse
+EMBEDDING_HEDGE_MAX_RATIO = float(os.getenv("EMBEDDING_HEDGE_MAX_RATIO", "0.1"))
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "3"))
+EMBEDDING_RETRY_BASE_MS = float(os.getenv("EMBEDDING_RETRY_BASE_MS", "200"))
+EMBEDDING_RETRY_MAX_MS = float(os.getenv("EMBEDDING_RETRY_MAX_MS", "4000"))
+
+OPENAI_DEFAULT_BASE_URL = "https://api.openai.com/v1"
+
+# Muestras mínimas antes de calcular la demora de hedging a partir de percentiles
+_MIN_SAMPLES = 20
+
+
+class EmbeddingDeadlineExceeded(Exception):
+    """No se obtuvo el embedding antes del deadline del request"""
+
+
+class EmbeddingRequestError(Exception):
+    """OpenAI rechazó el request o se agotaron los reintentos"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class _RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+
+def _parse_retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+    value = response.headers.get("retry-after")
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return None
+
+
+class EmbeddingClient:
+    """
+    Cliente de /embeddings con deadline, hedging y reintentos
+
+    Expone `embed_query` y `embed_documents` como los embeddings de LangChain, con un
+    parámetro opcional `deadline` (instante de time.monotonic()). Los lotes de ingesta
+    usan `hedge=False`: no se duplican ni cuentan en las latencias de las queries.
+    """
+
+    def __init__(self, api_key: str, model: str, base_url: Optional[str] = None, max_concurrency: int = 64):
+        self.model = model
+        self._http = httpx.Client(
+            base_url=(base_url or OPENAI_DEFAULT_BASE_URL).rstrip("/"),
+            headers={"Authorization": f"Bearer {api_key}"},
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="embeddings")
+        self._latencies: deque = deque(maxlen=512)
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0,
+            "batch_calls": 0,
+            "attempts": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "retries": 0,
+            "deadline_exceeded": 0,
+            "errors": 0,
+        }
+
+    # ------------------------------------------------------------------ API
+
+    def embed_query(self, text: str, deadline: Optional[float] = None) -> List[float]:
+        return self.embed_documents([text], deadline=deadline)[0]
+
+    def embed_documents(
+        self, texts: List[str], deadline: Optional[float] = None, hedge: bool = True
+    ) -> List[List[float]]:
+        if not texts:
+            return []
+        if deadline is None:
+            deadline = time.monotonic() + EMBEDDING_TIMEOUT
+        self._count("calls" if hedge else "batch_calls")
+
+        retries = 0
+        while True:
+            if deadline - time.monotonic() <= 0:
+                self._count("deadline_exceeded")
+                raise EmbeddingDeadlineExceeded("Deadline agotado antes de obtener el embedding de la query")
+            try:
+                if not hedge:
+                    return self._post(texts, deadline, track_latency=False)
+                return self._hedged_call(texts, deadline)
+            except _RetryableError as e:
+                retries += 1
+                if retries > EMBEDDING_MAX_RETRIES:
+                    self._count("errors")
+                    raise EmbeddingRequestError(f"Error de OpenAI tras {EMBEDDING_MAX_RETRIES} reintentos: {e}", e.status_code)
+                # Backoff exponencial con jitter completo; Retry-After manda si es mayor
+                backoff = random.uniform(0, min(EMBEDDING_RETRY_MAX_MS, EMBEDDING_RETRY_BASE_MS * 2 ** (retries - 1))) / 1000
+                if e.retry_after is not None:
+                    backoff = max(backoff, e.retry_after)
+                if time.monotonic() + backoff >= deadline:
+                    self._count("deadline_exceeded")
+                    raise EmbeddingDeadlineExceeded(f"Sin presupuesto para reintentar el embedding: {e}")
+                self._count("retries")
+                time.sleep(backoff)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = list(self._latencies)
+        if latencies:
+            p50, p95, p99 = np.percentile(latencies, [50, 95, 99]).tolist()
+        else:
+            p50 = p95 = p99 = None
+        return {
+            **stats,
+            "model": self.model,
+            "hedging": EMBEDDING_HEDGE,
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1) if EMBEDDING_HEDGE else None,
+            "latency_ms": {"p50": p50, "p95": p95, "p99": p99, "samples": len(latencies)},
+        }
+
+    # ------------------------------------------------------------- internos
+
+    def _count(self, field: str):
+        with self._lock:
+            self._stats[field] += 1
+
+    def hedge_delay(self) -> float:
+        """Segundos de espera antes de duplicar el request"""
+        with self._lock:
+            latencies = list(self._latencies)
+        if len(latencies) < _MIN_SAMPLES:
+            delay_ms = EMBEDDING_HEDGE_INITIAL_DELAY_MS
+        else:
+            delay_ms = float(np.percentile(latencies, EMBEDDING_HEDGE_PERCENTILE))
+        return max(delay_ms, EMBEDDING_HEDGE_MIN_DELAY_MS) / 1000
+
+    def _can_hedge(self) -> bool:
+        with self._lock:
+            if self._stats["hedges"] + 1 > max(1.0, self._stats["calls"] * EMBEDDING_HEDGE_MAX_RATIO):
+                return False
+            self._stats["hedges"] += 1
+            return True
+
+    def _hedged_call(self, texts: List[str], deadline: float) -> List[List[float]]:
+        primary = self._executor.submit(self._post, texts, deadline)
+        futures = [primary]
+
+        if EMBEDDING_HEDGE:
+            remaining = deadline - time.monotonic()
+            done, _ = wait(futures, timeout=max(0.0, min(self.hedge_delay(), remaining)))
+            if not done and deadline - time.monotonic() > 0 and self._can_hedge():
+                futures.append(self._executor.submit(self._post, texts, deadline))
+
+        first_error: Optional[Exception] = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                error = future.exception()
+                if error is None:
+                    if future is not primary:
+                        self._count("hedge_wins")
+                    return future.result()
+                first_error = first_error or error
+
+        if first_error is not None and not pending:
+            raise first_error
+        self._count("deadline_exceeded")
+        raise EmbeddingDeadlineExceeded("Deadline agotado esperando la respuesta de OpenAI")
+
+    def _post(self, texts: List[str], deadline: float, track_latency: bool = True) -> List[List[float]]:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise _RetryableError("deadline agotado antes de enviar el request")
+        self._count("attempts")
+        started = time.perf_counter()
+        try:
+            response = self._http.post(
+                "/embeddings",
+                json={"model": self.model, "input": texts, "encoding_format": "base64"},
+                timeout=timeout,
+            )
+        except httpx.TransportError as e:
+            raise _RetryableError(f"{type(e).__name__}: {e}")
+
+        if response.status_code == 429 or response.status_code >= 500:
+            raise _RetryableError(f"HTTP {response.status_code}", _parse_retry_after(response), response.status_code)
+        if response.status_code >= 400:
+            self._count("errors")
+            raise EmbeddingRequestError(
+                f"OpenAI respondió HTTP {response.status_code}: {response.text[:200]}", response.status_code
+            )
+
+        if track_latency:
+            with self._lock:
+                self._latencies.append((time.perf_counter() - started) * 1000)
+
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        vectors = []
+        for item in data:
+            embedding = item["embedding"]
+            if isinstance(embedding, str):
+                embedding = np.frombuffer(base64.b64decode(embedding), dtype=np.float32).tolist()
+            vectors.append(embedding)
+        return vectors
@@ -0,0 +1,398 @@
+"""
+Ingesta masiva de documentos en ChromaDB con embeddings por lotes
+
+En lugar de un request a OpenAI por documento (como `crear_embedding` del panel
+Gradio), los documentos se agrupan en lotes que respetan los límites de la API de
+embeddings (cantidad de inputs y tokens por request), varios lotes se embeben en
+paralelo y cada lote se escribe en ChromaDB con `upsert` en chunks apenas llegan
+sus embeddings. Los embeddings se pasan explícitos, así que ChromaDB no vuelve a
+llamar a OpenAI.
+
+Los errores se informan por documento: un documento inválido o un lote rechazado
+no cancela el resto de la ingesta.
+
+Con deduplicación (`dedupe`), los textos que ya están en la colección se detectan
+por el hash de su contenido normalizado y no se vuelven a embeber.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+import unicodedata
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+from embedding_client import EmbeddingClient, EmbeddingDeadlineExceeded, EmbeddingRequestError
+import chromadb_client
+
+# Límites de un request a /embeddings de OpenAI (inputs y tokens totales por request)
+EMBEDDING_BATCH_MAX_INPUTS = int(os.getenv("EMBEDDING_BATCH_MAX_INPUTS", "2048"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "250000"))
+# Tokens máximos de un documento para los modelos text-embedding-3-*
+EMBEDDING_MAX_INPUT_TOKENS = int(os.getenv("EMBEDDING_MAX_INPUT_TOKENS", "8191"))
+# Lotes embebidos en paralelo (compartido por todas las ingestas del worker)
+EMBEDDING_BATCH_CONCURRENCY = int(os.getenv("EMBEDDING_BATCH_CONCURRENCY", "4"))
+# Presupuesto de cada lote, reintentos incluidos (segundos)
+EMBEDDING_BATCH_TIMEOUT = float(os.getenv("EMBEDDING_BATCH_TIMEOUT", "120"))
+# Documentos por llamada a upsert (se acota además al máximo que acepta ChromaDB)
+CHROMA_UPSERT_BATCH_SIZE = int(os.getenv("CHROMA_UPSERT_BATCH_SIZE", "1000"))
+# Documentos máximos por request de ingesta
+API_BULK_MAX_DOCUMENTS = int(os.getenv("API_BULK_MAX_DOCUMENTS", "10000"))
+
+_METADATA_TYPES = (str, int, float, bool)
+
+# Metadata con el hash del texto normalizado (ver content_hash)
+CONTENT_HASH_FIELD = "content_hash"
+DEDUPE_MODES = ("off", "skip", "merge")
+
+_stats = {
+    "documents_embedded": 0,
+    "tokens_embedded": 0,
+    "embeddings_avoided": 0,
+    "tokens_avoided": 0,
+    "dedupe_lookups": 0,
+}
+_stats_lock = threading.Lock()
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+class BulkLimitError(Exception):
+    """El request supera API_BULK_MAX_DOCUMENTS"""
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, EMBEDDING_BATCH_CONCURRENCY), thread_name_prefix="ingest"
+                )
+    return _executor
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimación conservadora de tokens sin tokenizer (~3 bytes UTF-8 por token)
+
+    Los textos en español rondan 4 caracteres por token: sobreestimar deja lotes algo
+    más chicos pero nunca por encima del límite de OpenAI.
+    """
+    return math.ceil(len(text.encode("utf-8")) / 3)
+
+
+def _validate_item(item: Dict[str, Any]) -> Optional[str]:
+    """Retorna el motivo por el que el documento no puede ingerirse, o None si es válido"""
+    document = item.get("document")
+    if not isinstance(document, str) or not document.strip():
+        return "El documento está vacío"
+    # Un documento que seguro excede el límite (aún a 4 caracteres por token) se rechaza
+    # antes de enviarlo: si no, OpenAI rechazaría el lote completo
+    if len(document) > EMBEDDING_MAX_INPUT_TOKENS * 4:
+        return f"El documento excede {EMBEDDING_MAX_INPUT_TOKENS} tokens"
+    metadata = item.get("metadata") or {}
+    if not isinstance(metadata, dict):
+        return "metadata debe ser un objeto"
+    for key, value in metadata.items():
+        if not isinstance(key, str) or not key:
+            return "Las claves de metadata deben ser strings no vacíos"
+        if value is not None and not isinstance(value, _METADATA_TYPES):
+            return f"El valor de metadata '{key}' debe ser str, int, float o bool"
+    return None
+
+
+def plan_batches(texts: List[str], indexes: List[int]) -> List[List[int]]:
+    """
+    Agrupar documentos en lotes dentro de los límites de inputs y tokens por request
+
+    Args:
+        texts: Textos de todos los documentos del request
+        indexes: Posiciones (en texts) de los documentos válidos, en orden
+
+    Returns:
+        Lista de lotes, cada uno con las posiciones de sus documentos
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for index in indexes:
+        tokens = estimate_tokens(texts[index])
+        if current and (
+            len(current) >= EMBEDDING_BATCH_MAX_INPUTS or current_tokens + tokens > EMBEDDING_BATCH_MAX_TOKENS
+        ):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _get_document_embedder(model: Optional[str] = None):
+    # Mismo cliente que las queries: comparte conexiones HTTP con OpenAI. Los benchmarks
+    # lo reemplazan por embeddings locales (ver chromadb_client._get_query_embeddings)
+    return chromadb_client._get_query_embeddings(model).embeddings
+
+
+def _embed_batch(embedder, texts: List[str]) -> List[List[float]]:
+    if isinstance(embedder, EmbeddingClient):
+        deadline = time.monotonic() + EMBEDDING_BATCH_TIMEOUT
+        return embedder.embed_documents(texts, deadline=deadline, hedge=False)
+    return embedder.embed_documents(texts)
+
+
+def _embed_isolating_errors(embedder, texts: List[str], positions: List[int], errors: Dict[int, str]):
+    """
+    Embeber un lote; si OpenAI lo rechaza por un input inválido (HTTP 400), partirlo
+    en mitades para aislar los documentos culpables en lugar de perder el lote entero
+
+    Returns:
+        Lista de (posición, embedding) de los documentos que se pudieron embeber
+    """
+    try:
+        vectors = _embed_batch(embedder, texts)
+        return list(zip(positions, vectors))
+    except EmbeddingRequestError as e:
+        if e.status_code != 400:
+            raise
+        if len(texts) == 1:
+            errors[positions[0]] = f"OpenAI rechazó el documento: {e}"
+            return []
+    middle = len(texts) // 2
+    return (
+        _embed_isolating_errors(embedder, texts[:middle], positions[:middle], errors)
+        + _embed_isolating_errors(embedder, texts[middle:], positions[middle:], errors)
+    )
+
+
+def content_hash(text: str) -> str:
+    """
+    Hash SHA-256 del texto normalizado (Unicode NFC, minúsculas, espacios colapsados)
+
+    Dos textos que solo difieren en mayúsculas o espacios dan el mismo hash, así que
+    reimportar las mismas respuestas de WhatsApp no genera duplicados. El panel Gradio
+    usa el mismo criterio (src/gradio/jobs.py).
+    """
+    normalized = " ".join(unicodedata.normalize("NFC", text).casefold().split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _clean_metadata(metadata: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {key: value for key, value in (metadata or {}).items() if value is not None}
+
+
+def _count(**fields: int):
+    with _stats_lock:
+        for field, value in fields.items():
+            _stats[field] += value
+
+
+def ingestion_stats() -> Dict[str, int]:
+    """Contadores de ingesta del worker: embeddings generados y evitados por deduplicación"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _find_existing(collection, hashes: List[str], chunk_size: int) -> Dict[str, Dict[str, Any]]:
+    """
+    Buscar documentos ya guardados con alguno de los hashes (un `get` con $in por chunk)
+
+    Returns:
+        Dict hash -> {"id", "metadata"} del primer documento encontrado con ese hash
+    """
+    existing: Dict[str, Dict[str, Any]] = {}
+    for start in range(0, len(hashes), chunk_size):
+        chunk = hashes[start:start + chunk_size]
+        result = collection.get(where={CONTENT_HASH_FIELD: {"$in": chunk}}, include=["metadatas"])
+        for doc_id, metadata in zip(result["ids"] or [], result["metadatas"] or []):
+            doc_hash = (metadata or {}).get(CONTENT_HASH_FIELD)
+            if doc_hash and doc_hash not in existing:
+                existing[doc_hash] = {"id": doc_id, "metadata": metadata}
+    _count(dedupe_lookups=1)
+    return existing
+
+
+def upsert_documents(collection_name: str, documents: List[Dict[str, Any]], dedupe: str = "off") -> Dict[str, Any]:
+    """
+    Embeber e insertar/actualizar documentos en una colección por lotes
+
+    Cada documento se guarda con el hash de su texto normalizado en la metadata
+    `content_hash`. Con `dedupe` distinto de "off" se usa para no volver a embeber
+    textos que ya están en la colección (una sola consulta por chunk, sin OpenAI):
+
+    - "skip":  el documento se omite y se informa el ID del existente
+    - "merge": la metadata nueva se combina con la del existente (sin re-embeber)
+
+    En esos modos los documentos sin id usan el hash como ID, de modo que reintentar
+    la misma ingesta es idempotente, y los textos repetidos dentro del request se
+    embeben una sola vez.
+
+    Args:
+        collection_name: Nombre de la colección (se crea si no existe)
+        documents: Lista de dicts con "document" y opcionalmente "id" y "metadata".
+                   Sin id se genera un uuid4; con un id existente el documento se reemplaza.
+        dedupe: "off" (default), "skip" o "merge"
+
+    Returns:
+        Dict con totales, lotes, tiempo, throughput (docs/s), embeddings evitados y el
+        estado de cada documento en "items" (mismo orden que el request)
+
+    Raises:
+        BulkLimitError: Si hay más de API_BULK_MAX_DOCUMENTS documentos
+        ChromaUnavailableError: Si ChromaDB no está disponible
+    """
+    if dedupe not in DEDUPE_MODES:
+        raise ValueError(f"dedupe debe ser uno de {', '.join(DEDUPE_MODES)}")
+    if len(documents) > API_BULK_MAX_DOCUMENTS:
+        raise BulkLimitError(
+            f"El request trae {len(documents)} documentos; el máximo es {API_BULK_MAX_DOCUMENTS} "
+            f"(API_BULK_MAX_DOCUMENTS). Divídelo en varios requests."
+        )
+    started = time.perf_counter()
+
+    ids: List[str] = []
+    texts: List[str] = []
+    hashes: List[str] = []
+    errors: Dict[int, str] = {}
+    # Documentos que no se embeben: posición -> (estado, ID del documento existente)
+    deduplicated: Dict[int, tuple] = {}
+    first_by_hash: Dict[str, int] = {}
+    seen_ids = set()
+    for position, item in enumerate(documents):
+        text = item.get("document") or ""
+        doc_hash = content_hash(text)
+        doc_id = str(item.get("id") or (doc_hash[:32] if dedupe != "off" else uuid.uuid4()))
+        ids.append(doc_id)
+        texts.append(text)
+        hashes.append(doc_hash)
+        error = _validate_item(item)
+        if error is None and dedupe != "off" and doc_hash in first_by_hash:
+            deduplicated[position] = ("skipped", ids[first_by_hash[doc_hash]])
+            continue
+        if error is None and doc_id in seen_ids:
+            error = "ID duplicado en el request"
+        if error:
+            errors[position] = error
+            continue
+        seen_ids.add(doc_id)
+        first_by_hash.setdefault(doc_hash, position)
+
+    valid = [position for position in range(len(documents)) if position not in errors and position not in deduplicated]
+    upserted: set = set()
+    batches: List[List[int]] = []
+
+    if valid:
+        collection = chromadb_client.get_collection(collection_name)
+        max_chunk = CHROMA_UPSERT_BATCH_SIZE
+        try:
+            max_chunk = min(max_chunk, chromadb_client._get_client().get_max_batch_size())
+        except Exception:
+            pass
+
+        if dedupe != "off":
+            try:
+                existing = _find_existing(collection, [hashes[p] for p in valid], max_chunk)
+                merges = []
+                for position in valid:
+                    match = existing.get(hashes[position])
+                    if match is None:
+                        continue
+                    if dedupe == "merge":
+                        metadata = dict(match["metadata"] or {}, **_clean_metadata(documents[position].get("metadata")))
+                        merges.append((position, match["id"], metadata))
+                    else:
+                        deduplicated[position] = ("skipped", match["id"])
+                # Actualizar solo metadata: ChromaDB no vuelve a calcular el embedding
+                for start in range(0, len(merges), max_chunk):
+                    chunk = merges[start:start + max_chunk]
+                    collection.update(ids=[doc_id for _, doc_id, _ in chunk], metadatas=[meta for _, _, meta in chunk])
+                    for position, doc_id, _ in chunk:
+                        deduplicated[position] = ("merged", doc_id)
+            except Exception as e:
+                chromadb_client._check_connection_error(e)
+                raise Exception(f"Error al buscar documentos existentes: {e}")
+            valid = [position for position in valid if position not in deduplicated]
+
+        batches = plan_batches(texts, valid)
+        # Modelo de la colección, que puede no ser EMBEDDING_MODEL (ver migrate_collection.py)
+        embedder = _get_document_embedder(chromadb_client.collection_embedding_model(collection)) if batches else None
+
+        def process(batch: List[int]) -> List[int]:
+            embedded = _embed_isolating_errors(embedder, [texts[p] for p in batch], batch, errors)
+            _count(documents_embedded=len(embedded), tokens_embedded=sum(estimate_tokens(texts[p]) for p, _ in embedded))
+            done = []
+            for start in range(0, len(embedded), max_chunk):
+                chunk = embedded[start:start + max_chunk]
+                positions = [position for position, _ in chunk]
+                try:
+                    collection.upsert(
+                        ids=[ids[p] for p in positions],
+                        documents=[texts[p] for p in positions],
+                        metadatas=[
+                            dict(_clean_metadata(documents[p].get("metadata")), **{CONTENT_HASH_FIELD: hashes[p]})
+                            for p in positions
+                        ],
+                        embeddings=[vector for _, vector in chunk]
+                    )
+                except Exception as e:
+                    chromadb_client._check_connection_error(e)
+                    for p in positions:
+                        errors[p] = f"Error al escribir en ChromaDB: {e}"
+                    continue
+                done.extend(positions)
+            return done
+
+        futures = {_get_executor().submit(process, batch): batch for batch in batches}
+        for future in as_completed(futures):
+            try:
+                upserted.update(future.result())
+            except (EmbeddingRequestError, EmbeddingDeadlineExceeded) as e:
+                for p in futures[future]:
+                    errors.setdefault(p, f"Error al generar embeddings: {e}")
+
+        chromadb_client.get_connection().record_success()
+        if upserted or any(status == "merged" for status, _ in deduplicated.values()):
+            # Invalida los resultados de /mmr cacheados para esta colección (y su alias)
+            chromadb_client.invalidate_results(collection_name)
+
+    avoided = len(deduplicated)
+    if avoided:
+        _count(embeddings_avoided=avoided, tokens_avoided=sum(estimate_tokens(texts[p]) for p in deduplicated))
+
+    elapsed = time.perf_counter() - started
+    items = []
+    for position, doc_id in enumerate(ids):
+        if position in upserted:
+            items.append({"index": position, "id": doc_id, "status": "upserted"})
+        elif position in deduplicated:
+            status, existing_id = deduplicated[position]
+            items.append({"index": position, "id": existing_id, "status": status})
+        else:
+            items.append({
+                "index": position,
+                "id": doc_id,
+                "status": "error",
+                "error": errors.get(position, "No se procesó el documento")
+            })
+
+    merged = sum(1 for status, _ in deduplicated.values() if status == "merged")
+    print(f"📥 Ingesta en '{collection_name}': {len(upserted)}/{len(documents)} documentos "
+          f"en {len(batches)} lotes, {avoided} sin re-embeber ({elapsed:.2f}s)")
+    return {
+        "collection": collection_name,
+        "total": len(documents),
+        "upserted": len(upserted),
+        "skipped": avoided - merged,
+        "merged": merged,
+        "failed": len(documents) - len(upserted) - avoided,
+        "batches": len(batches),
+        "embeddings_avoided": avoided,
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_second": round((len(upserted) + avoided) / elapsed, 1) if elapsed > 0 else None,
+        "items": items
+    }
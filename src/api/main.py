@@ -2,31 +2,74 @@
 Microservicio API de ejemplo
 Puedes usar FastAPI, Flask, o cualquier framework de tu elección
 """
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import Response
+from pydantic import BaseModel, Field
 import os
+import json
+import threading
+import time
+from contextlib import asynccontextmanager
 from typing import Optional, List, Dict, Any
 import uvicorn
+import chromadb_client
 from chromadb_client import (
     get_all_vectors,
     get_vectors_by_ids,
     list_collections,
     get_collection_info,
-    mmr_search
+    mmr_search,
+    embedding_stats
 )
+from cache import get_cache
+from ingestion import upsert_documents, ingestion_stats, BulkLimitError, DEDUPE_MODES
+from chroma_connection import ChromaUnavailableError
+from embedding_client import EmbeddingDeadlineExceeded
+from degradation import SearchDeadlineExceeded, stage_latencies
+from worker_pool import get_pool, PoolSaturatedError
 
 # Configuración desde variables de entorno
 API_HOST = os.getenv("API_HOST", "0.0.0.0")
 API_PORT = int(os.getenv("API_PORT", "8009"))
+# Número de procesos de uvicorn. Con más de uno, las cachés se comparten (ver cache.py)
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+# Reciclar cada worker después de N requests (0 = nunca)
+API_MAX_REQUESTS = int(os.getenv("API_MAX_REQUESTS", "0"))
+# Segundos que el proceso padre espera a que un worker nuevo responda (importar tarda)
+API_WORKER_HEALTHCHECK_TIMEOUT = int(os.getenv("API_WORKER_HEALTHCHECK_TIMEOUT", "30"))
 ENV = os.getenv("ENV", "production")
 DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+# Importar chromadb al arrancar (false = recién en la primera búsqueda)
+API_WARMUP = os.getenv("API_WARMUP", "true").lower() == "true"
+
+
+def _startup_task():
+    """Precargar dependencias pesadas sin bloquear el arranque del servidor"""
+    try:
+        chromadb_client.warmup()
+    except Exception as e:
+        print(f"⚠️  Error al precargar dependencias: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Hilos daemon: /health responde de inmediato aunque ChromaDB no esté listo.
+    # El sondeo de salud se conecta a ChromaDB en cuanto responde (ver chroma_connection.py)
+    chromadb_client.get_connection().start()
+    if API_WARMUP:
+        threading.Thread(target=_startup_task, name="api-startup", daemon=True).start()
+    yield
+    chromadb_client.get_connection().stop()
+    get_pool().shutdown()
+
 
 # Crear aplicación FastAPI
 app = FastAPI(
     title="Microservicio API",
     description="Microservicio de ejemplo para el proyecto",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Configurar CORS si es necesario
@@ -38,6 +81,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def _saturated(e: PoolSaturatedError) -> HTTPException:
+    """Respuesta 503 cuando el pool de trabajo está lleno"""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+
+def _unavailable(e: ChromaUnavailableError) -> HTTPException:
+    """Respuesta 503 inmediata mientras ChromaDB no responde (breaker abierto)"""
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(1, round(e.retry_after)))})
+
+
+def _json_response(result: Dict[str, Any]) -> Response:
+    """Serializar una respuesta (posiblemente grande) a JSON; se llama dentro del pool"""
+    return Response(
+        content=json.dumps(result, ensure_ascii=False).encode("utf-8"),
+        media_type="application/json"
+    )
+
+
 # Modelos Pydantic
 class Item(BaseModel):
     name: str
@@ -70,6 +131,38 @@ async def health():
     """Health check endpoint"""
     return {"status": "healthy"}
 
+@app.get("/health/deep")
+async def health_deep():
+    """
+    Health check con el estado de las dependencias
+
+    Incluye el estado del breaker de ChromaDB y el último sondeo (latencia, error).
+    Responde 503 mientras el breaker está abierto.
+    """
+    chroma = chromadb_client.get_connection().health()
+    status = "healthy" if chroma["state"] == "closed" else "degraded" if chroma["state"] == "half_open" else "unhealthy"
+    body = {"status": status, "chroma": chroma}
+    if status == "unhealthy":
+        return Response(
+            content=json.dumps(body, ensure_ascii=False).encode("utf-8"),
+            media_type="application/json",
+            status_code=503
+        )
+    return body
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas del worker que atiende el request (pool de trabajo y cachés)"""
+    return {
+        "pid": os.getpid(),
+        "pool": get_pool().stats(),
+        "cache": get_cache().stats(),
+        "embeddings": embedding_stats(),
+        "ingestion": ingestion_stats(),
+        # Latencias con las que /mmr elige el nivel de degradación (None hasta tener muestras)
+        "retriever": stage_latencies.stats()
+    }
+
 @app.get("/items", response_model=List[ItemResponse])
 async def get_items():
     """Obtener todos los items"""
@@ -127,11 +220,15 @@ async def delete_item(item_id: int):
 async def list_chroma_collections():
     """Listar todas las colecciones disponibles en ChromaDB"""
     try:
-        collections = list_collections()
+        collections = await get_pool().run(list_collections)
         return {
             "collections": collections,
             "count": len(collections)
         }
+    except PoolSaturatedError as e:
+        raise _saturated(e)
+    except ChromaUnavailableError as e:
+        raise _unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -153,7 +250,7 @@ async def get_chroma_collection_vectors(
     Returns:
         Dict con todos los vectores de la colección
     """
-    try:
+    def fetch_and_serialize():
         if ids:
             # Obtener vectores específicos por IDs
             result = get_vectors_by_ids(
@@ -167,8 +264,15 @@ async def get_chroma_collection_vectors(
                 collection_name=collection_name,
                 include_embeddings=include_embeddings
             )
-        
-        return result
+        # Serializar en el pool: con embeddings la respuesta puede tener millones de floats
+        return _json_response(result)
+    
+    try:
+        return await get_pool().run(fetch_and_serialize)
+    except PoolSaturatedError as e:
+        raise _saturated(e)
+    except ChromaUnavailableError as e:
+        raise _unavailable(e)
     except Exception as e:
         error_msg = str(e)
         # Log del error para debugging
@@ -191,12 +295,88 @@ async def get_chroma_collection_info(collection_name: str):
         Dict con información de la colección
     """
     try:
-        info = get_collection_info(collection_name)
+        info = await get_pool().run(get_collection_info, collection_name)
         return info
+    except PoolSaturatedError as e:
+        raise _saturated(e)
+    except ChromaUnavailableError as e:
+        raise _unavailable(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class BulkDocument(BaseModel):
+    id: Optional[str] = None  # ID del documento (sin ID se genera un uuid4; uno existente se reemplaza)
+    document: str  # Texto a embeber
+    metadata: Optional[Dict[str, Any]] = None  # Valores str, int, float o bool
+
+
+class BulkUpsertRequest(BaseModel):
+    documents: List[BulkDocument]
+    # "skip" / "merge": no re-embeber textos que ya están en la colección (ver ingestion.py)
+    dedupe: str = "off"
+
+
+@app.post("/chroma/collections/{collection_name}/documents")
+async def post_chroma_documents(collection_name: str, request: BulkUpsertRequest):
+    """
+    Insertar o actualizar documentos en una colección (ingesta masiva)
+    
+    Los embeddings se generan por lotes (hasta EMBEDDING_BATCH_MAX_INPUTS documentos por
+    request a OpenAI), varios lotes en paralelo, y se escriben con upsert en chunks.
+    Los errores se informan por documento sin cancelar el resto.
+    
+    Con dedupe="skip" o "merge" los textos ya guardados (mismo hash de contenido
+    normalizado) no se vuelven a embeber: se omiten o se combina su metadata.
+    
+    Args:
+        collection_name: Nombre de la colección (se crea si no existe)
+        request: Documentos con texto, id y metadata opcionales, y el modo de deduplicación
+        
+    Returns:
+        Dict con totales, throughput (docs_per_second), embeddings evitados y el estado
+        de cada documento
+    """
+    if request.dedupe not in DEDUPE_MODES:
+        raise HTTPException(status_code=400, detail=f"dedupe debe ser uno de: {', '.join(DEDUPE_MODES)}")
+    documents = [doc.model_dump() for doc in request.documents]
+    
+    def ingest_and_serialize():
+        # Con miles de documentos la respuesta por ítem también se serializa en el pool
+        return _json_response(upsert_documents(collection_name, documents, dedupe=request.dedupe))
+    
+    try:
+        return await get_pool().run(ingest_and_serialize)
+    except BulkLimitError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except PoolSaturatedError as e:
+        raise _saturated(e)
+    except ChromaUnavailableError as e:
+        raise _unavailable(e)
+    except Exception as e:
+        error_msg = str(e)
+        print(f"❌ Error en ingesta masiva: {error_msg}")
+        if DEBUG:
+            import traceback
+            traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error en ingesta masiva: {error_msg}")
+
+
+@app.post("/chroma/collections/{collection_name}/cache/invalidate")
+async def post_invalidate_cache(collection_name: str):
+    """
+    Invalidar los resultados de /mmr cacheados de una colección
+    
+    Las escrituras por POST /chroma/collections/{collection_name}/documents ya la
+    invalidan. Este endpoint es para las que van directo a ChromaDB: el panel Gradio
+    lo llama después de crear, editar o eliminar documentos.
+    """
+    try:
+        return await get_pool().run(chromadb_client.invalidate_results, collection_name)
+    except PoolSaturatedError as e:
+        raise _saturated(e)
+
+
 class MMRRetrieveRequest(BaseModel):
     query: str  # Query única para búsqueda MMR
     k: int = 4  # Número final de documentos a retornar
@@ -204,15 +384,19 @@ class MMRRetrieveRequest(BaseModel):
     lambda_mult: float = 0.5  # Factor de diversidad (0.0 = solo relevancia, 1.0 = solo diversidad)
     filters: Optional[Dict[str, Any]] = None
     min_score: float = 0.4  # Score mínimo de similitud para incluir un documento
+    timeout_ms: Optional[float] = Field(None, gt=0)  # Presupuesto del request en ms (alternativa al header X-Request-Timeout-Ms)
 
 
 @app.post("/retrievers/collections/{collection_name}/mmr")
 async def post_mmr_retrieve(
     collection_name: str,
-    request: MMRRetrieveRequest
+    request: MMRRetrieveRequest,
+    x_request_timeout_ms: Optional[float] = Header(
+        None, gt=0, description="Presupuesto del request en ms (ej: el timeout del webhook de n8n)"
+    )
 ):
     """
-    Maximum Marginal Relevance (MMR) Retrieval usando LangChain
+    Maximum Marginal Relevance (MMR) Retrieval
     
     MMR busca maximizar la relevancia mientras minimiza la redundancia entre documentos.
     Selecciona documentos que son relevantes al query pero diversos entre sí.
@@ -221,10 +405,18 @@ async def post_mmr_retrieve(
     Args:
         collection_name: Nombre de la colección
         request: Request con query, k, fetch_k, lambda_mult, min_score y filtros opcionales
+        x_request_timeout_ms: Header X-Request-Timeout-Ms opcional (o campo timeout_ms; si
+            vienen ambos se usa el menor). Debe ser mayor que 0 (si no, 422). Si el presupuesto no
+            alcanza la búsqueda se degrada (ver degradation.py) y si no entra ningún nivel se
+            responde 504
         
     Returns:
-        Dict con resultados de la búsqueda MMR filtrados por min_score
+        Dict con resultados de la búsqueda MMR filtrados por min_score y el nivel de
+        degradación aplicado ("degradation")
     """
+    # El deadline se fija al recibir el request: la espera en el pool también cuenta
+    budgets_ms = [ms for ms in (x_request_timeout_ms, request.timeout_ms) if ms is not None]
+    deadline = time.monotonic() + min(budgets_ms) / 1000 if budgets_ms else None
     try:
         # Clean filters if provided
         cleaned_filters = None
@@ -243,14 +435,16 @@ async def post_mmr_retrieve(
                     else:
                         cleaned_filters[key] = value
         
-        result = mmr_search(
+        result = await get_pool().run(
+            mmr_search,
             collection_name=collection_name,
             query=request.query,
             k=request.k,
             fetch_k=request.fetch_k,
             lambda_mult=request.lambda_mult,
             filters=cleaned_filters,
-            min_score=request.min_score
+            min_score=request.min_score,
+            deadline=deadline
         )
         
         return {
@@ -259,8 +453,15 @@ async def post_mmr_retrieve(
             "results": result.get("results", []),
             "count": result.get("count", 0),
             "search_type": result.get("search_type", "mmr_langchain"),
-            "min_score": result.get("min_score", request.min_score)
+            "min_score": result.get("min_score", request.min_score),
+            "degradation": result.get("degradation", {"level": "none"})
         }
+    except PoolSaturatedError as e:
+        raise _saturated(e)
+    except ChromaUnavailableError as e:
+        raise _unavailable(e)
+    except (EmbeddingDeadlineExceeded, SearchDeadlineExceeded) as e:
+        raise HTTPException(status_code=504, detail=f"Deadline agotado: {e}")
     except Exception as e:
         error_msg = str(e)
         print(f"❌ Error en MMR retrieve: {error_msg}")
@@ -271,11 +472,21 @@ async def post_mmr_retrieve(
 
 
 if __name__ == "__main__":
+    # uvicorn no permite reload con varios workers: en modo debug se prioriza reload
+    workers = API_WORKERS if API_WORKERS > 1 and not DEBUG else None
+    if API_WORKERS > 1 and DEBUG:
+        print(f"⚠️  DEBUG=true usa reload con un solo worker (API_WORKERS={API_WORKERS} ignorado)")
+    elif workers:
+        print(f"🚀 Iniciando {workers} workers (caché compartida: {get_cache().backend.name})")
+    
     uvicorn.run(
         "main:app",
         host=API_HOST,
         port=API_PORT,
         reload=DEBUG,
+        workers=workers,
+        limit_max_requests=API_MAX_REQUESTS or None,
+        timeout_worker_healthcheck=API_WORKER_HEALTHCHECK_TIMEOUT,
         log_level="debug" if DEBUG else "info"
     )
 
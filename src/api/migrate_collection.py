@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Migración de una colección a otro modelo de embedding sin cortar el servicio
+
+Los vectores de modelos distintos no son comparables, así que cambiar de modelo
+obliga a volver a embeber todos los documentos. En lugar de borrar la colección y
+recrearla (el buscador queda vacío hasta terminar), la migración:
+
+1. Copia los documentos de la colección actual a una colección sombra, embebiendo
+   por lotes y en paralelo con el modelo nuevo. Cada tanda de páginas deja un
+   checkpoint en la metadata de la colección sombra: si se corta, se retoma.
+2. Sincroniza los cambios hechos mientras tanto (documentos nuevos, editados o
+   borrados en la colección actual).
+3. Apunta el alias a la colección sombra (ver collection_aliases.py). El API y el
+   panel Gradio la usan en cuanto vence la caché del alias.
+4. Copia los documentos nuevos que llegaron a la colección anterior antes de que
+   todos los workers vieran el alias nuevo.
+
+Durante toda la migración las búsquedas siguen usando la colección actual con el
+modelo con el que se indexó. La colección anterior no se borra: para volver atrás
+basta con apuntar el alias de nuevo a ella.
+
+Uso (dentro del contenedor del API):
+    python migrate_collection.py migrate pozos --model text-embedding-3-small
+    python migrate_collection.py status pozos
+    python migrate_collection.py alias pozos pozos     # volver a la colección original
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import chromadb_client
+import ingestion
+from collection_aliases import CHROMA_ALIAS_CACHE_TTL, EMBEDDING_MODEL_KEY
+from embedding_client import EmbeddingClient
+
+# Documentos leídos de la colección actual por página
+MIGRATION_PAGE_SIZE = int(os.getenv("MIGRATION_PAGE_SIZE", "500"))
+# Páginas embebidas en paralelo (cada tanda deja un checkpoint)
+MIGRATION_CONCURRENCY = int(os.getenv("MIGRATION_CONCURRENCY", str(ingestion.EMBEDDING_BATCH_CONCURRENCY)))
+
+# Metadata de la colección sombra con el progreso de la migración
+SOURCE_KEY = "migration_source"
+OFFSET_KEY = "migration_offset"
+STATUS_KEY = "migration_status"
+STATUS_COPYING = "copiando"
+STATUS_READY = "lista"
+
+
+def default_target_name(alias: str, model: str) -> str:
+    """Nombre de la colección sombra: alias + modelo, con los caracteres que acepta ChromaDB"""
+    return re.sub(r"[^a-zA-Z0-9._-]+", "-", f"{alias}-{model}").strip("-._")
+
+
+class Migration:
+    """Copia de una colección a otra volviendo a embeber con otro modelo"""
+
+    def __init__(self, source, target, embedder, page_size: int, concurrency: int):
+        self.source = source
+        self.target = target
+        self.embedder = embedder
+        self.page_size = max(1, page_size)
+        self.concurrency = max(1, concurrency)
+        self.stats = {"copied": 0, "failed": 0, "without_text": 0, "updated": 0, "deleted": 0}
+        # IDs de la colección actual vistos en la sincronización (ver catch_up)
+        self.synced_ids = set()
+        max_chunk = ingestion.CHROMA_UPSERT_BATCH_SIZE
+        try:
+            max_chunk = min(max_chunk, chromadb_client._get_client().get_max_batch_size())
+        except Exception:
+            pass
+        self.max_chunk = max_chunk
+
+    def _checkpoint(self, **fields: Any):
+        # modify reemplaza toda la metadata: se envía completa
+        metadata = dict(self.target.metadata or {}, **fields)
+        self.target.modify(metadata=metadata)
+
+    def _reembed(self, ids: List[str], documents: List[Optional[str]], metadatas: List[Optional[Dict]]) -> int:
+        """Embeber con el modelo nuevo y escribir en la colección sombra. Retorna los escritos."""
+        positions = [i for i, document in enumerate(documents) if document]
+        self.stats["without_text"] += len(ids) - len(positions)
+        errors: Dict[int, str] = {}
+        written = 0
+        for batch in ingestion.plan_batches(documents, positions):
+            embedded = ingestion._embed_isolating_errors(self.embedder, [documents[p] for p in batch], batch, errors)
+            for start in range(0, len(embedded), self.max_chunk):
+                chunk = embedded[start:start + self.max_chunk]
+                self.target.upsert(
+                    ids=[ids[p] for p, _ in chunk],
+                    documents=[documents[p] for p, _ in chunk],
+                    metadatas=[metadatas[p] or None for p, _ in chunk],
+                    embeddings=[vector for _, vector in chunk]
+                )
+                written += len(chunk)
+        for position, message in errors.items():
+            print(f"⚠️  Documento '{ids[position]}' no migrado: {message}")
+        self.stats["failed"] += len(errors)
+        return written
+
+    def _pages(self, offset: int):
+        """Páginas de la colección actual desde `offset`, en tandas de `concurrency`"""
+        while True:
+            window = []
+            for _ in range(self.concurrency):
+                page = self.source.get(limit=self.page_size, offset=offset, include=["documents", "metadatas"])
+                if not page["ids"]:
+                    break
+                window.append(page)
+                offset += len(page["ids"])
+            if not window:
+                return
+            yield window, offset
+            if len(window[-1]["ids"]) < self.page_size:
+                return
+
+    def copy(self, offset: int):
+        """Paso 1: copiar la colección actual desde el checkpoint"""
+        total = self.source.count()
+        started = time.perf_counter()
+        done = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="migrate") as pool:
+            for window, offset in self._pages(offset):
+                futures = [
+                    pool.submit(self._reembed, page["ids"], page["documents"], page["metadatas"])
+                    for page in window
+                ]
+                done += sum(future.result() for future in futures)
+                self._checkpoint(**{OFFSET_KEY: offset})
+                elapsed = time.perf_counter() - started
+                print(f"📦 {min(offset, total)}/{total} documentos ({done / elapsed:.1f} docs/s)")
+        self.stats["copied"] += done
+
+    def sync(self):
+        """Paso 2: aplicar los cambios hechos en la colección actual durante la copia"""
+        source_ids = self.synced_ids
+        offset = 0
+        while True:
+            page = self.source.get(limit=self.page_size, offset=offset, include=["documents", "metadatas"])
+            if not page["ids"]:
+                break
+            offset += len(page["ids"])
+            source_ids.update(page["ids"])
+            copied = self.target.get(ids=page["ids"], include=["documents", "metadatas", "embeddings"])
+            current = {
+                doc_id: (document, metadata, embedding)
+                for doc_id, document, metadata, embedding in zip(
+                    copied["ids"], copied["documents"], copied["metadatas"], copied["embeddings"]
+                )
+            }
+            changed: Tuple[List, List, List] = ([], [], [])
+            same_text: Tuple[List, List, List, List] = ([], [], [], [])
+            for doc_id, document, metadata in zip(page["ids"], page["documents"], page["metadatas"]):
+                existing = current.get(doc_id)
+                if existing is None or existing[0] != document:
+                    for column, value in zip(changed, (doc_id, document, metadata)):
+                        column.append(value)
+                elif (existing[1] or {}) != (metadata or {}):
+                    # Solo cambió la metadata: se reutiliza el embedding ya calculado
+                    for column, value in zip(same_text, (doc_id, document, metadata or None, existing[2])):
+                        column.append(value)
+            if changed[0]:
+                self.stats["updated"] += self._reembed(*changed)
+            if same_text[0]:
+                self.target.upsert(ids=same_text[0], documents=same_text[1], metadatas=same_text[2],
+                                   embeddings=same_text[3])
+                self.stats["updated"] += len(same_text[0])
+            if len(page["ids"]) < self.page_size:
+                break
+
+        removed = []
+        offset = 0
+        while True:
+            page = self.target.get(limit=self.page_size, offset=offset, include=[])
+            if not page["ids"]:
+                break
+            offset += len(page["ids"])
+            removed.extend(doc_id for doc_id in page["ids"] if doc_id not in source_ids)
+        for start in range(0, len(removed), self.max_chunk):
+            self.target.delete(ids=removed[start:start + self.max_chunk])
+        self.stats["deleted"] += len(removed)
+
+    def catch_up(self):
+        """
+        Paso 4: copiar los documentos creados en la colección anterior entre la
+        sincronización y el cambio de alias
+
+        Solo se copian IDs nuevos: los documentos que ya estaban pueden haberse
+        editado o borrado en la colección nueva después del cambio.
+        """
+        offset = 0
+        while True:
+            page = self.source.get(limit=self.page_size, offset=offset, include=["documents", "metadatas"])
+            if not page["ids"]:
+                break
+            offset += len(page["ids"])
+            new = [i for i, doc_id in enumerate(page["ids"]) if doc_id not in self.synced_ids]
+            if new:
+                present = set(self.target.get(ids=[page["ids"][i] for i in new], include=[])["ids"])
+                new = [i for i in new if page["ids"][i] not in present]
+            if new:
+                self.stats["updated"] += self._reembed(
+                    [page["ids"][i] for i in new],
+                    [page["documents"][i] for i in new],
+                    [page["metadatas"][i] for i in new]
+                )
+            if len(page["ids"]) < self.page_size:
+                break
+
+
+def _embedder(model: str):
+    if not chromadb_client.OPENAI_API_KEY:
+        raise Exception("OPENAI_API_KEY no está configurada. Se requiere para embeddings.")
+    return EmbeddingClient(chromadb_client.OPENAI_API_KEY, model, base_url=chromadb_client.OPENAI_BASE_URL)
+
+
+def _open_target(name: str, model: str, source_name: str):
+    """Crear (o retomar) la colección sombra"""
+    client = chromadb_client._get_client()
+    metadata = {EMBEDDING_MODEL_KEY: model, SOURCE_KEY: source_name, OFFSET_KEY: 0, STATUS_KEY: STATUS_COPYING}
+    kwargs: Dict[str, Any] = {}
+    embedding_function = chromadb_client.embedding_function_for(model)
+    if embedding_function:
+        kwargs["embedding_function"] = embedding_function
+    target = client.get_or_create_collection(name=name, metadata=metadata, **kwargs)
+    existing_model = (target.metadata or {}).get(EMBEDDING_MODEL_KEY)
+    if existing_model and existing_model != model:
+        raise Exception(f"La colección '{name}' ya existe con el modelo {existing_model}")
+    return target
+
+
+def migrate(alias: str, model: str, target_name: Optional[str] = None, page_size: int = MIGRATION_PAGE_SIZE,
+            concurrency: int = MIGRATION_CONCURRENCY, swap: bool = True, embedder=None) -> Dict[str, Any]:
+    """
+    Migrar el alias a una colección sombra embebida con `model`
+
+    Args:
+        alias: Alias (o nombre de la colección) que usan el API y el panel Gradio
+        model: Modelo de embedding nuevo
+        target_name: Colección sombra (default: alias + modelo)
+        page_size: Documentos por página leída de la colección actual
+        concurrency: Páginas embebidas en paralelo
+        swap: Si False, deja la colección sombra lista sin cambiar el alias
+        embedder: Embeddings a usar en lugar de OpenAI (benchmarks)
+
+    Returns:
+        Dict con source, target, estadísticas, elapsed_s y docs_per_second
+
+    Raises:
+        Exception: Si la colección destino es la actual o ya tiene otro modelo
+    """
+    client = chromadb_client._get_client()
+    source_name = chromadb_client.resolve_collection_name(alias)
+    source = client.get_collection(name=source_name)
+    source_model = chromadb_client.collection_embedding_model(source)
+    target_name = target_name or default_target_name(alias, model)
+    if target_name == source_name:
+        raise Exception(f"'{alias}' ya apunta a '{target_name}': indicar otra colección destino con --target")
+    if source_model == model:
+        print(f"⚠️  '{source_name}' ya usa {model}: se copia igual a '{target_name}'")
+
+    target = _open_target(target_name, model, source_name)
+    metadata = target.metadata or {}
+    offset = 0
+    if metadata.get(SOURCE_KEY) == source_name and metadata.get(STATUS_KEY) == STATUS_COPYING:
+        offset = int(metadata.get(OFFSET_KEY) or 0)
+    if offset:
+        print(f"🔄 Retomando la migración de '{source_name}' desde el documento {offset}")
+    else:
+        print(f"🚚 Migrando '{source_name}' ({source_model}) → '{target_name}' ({model})")
+
+    migration = Migration(source, target, embedder or _embedder(model), page_size, concurrency)
+    started = time.perf_counter()
+    migration._checkpoint(**{SOURCE_KEY: source_name, STATUS_KEY: STATUS_COPYING, OFFSET_KEY: offset})
+    migration.copy(offset)
+    print("🔁 Sincronizando cambios hechos durante la copia...")
+    migration.sync()
+    migration._checkpoint(**{STATUS_KEY: STATUS_READY, OFFSET_KEY: source.count()})
+
+    if swap:
+        previous = chromadb_client.get_aliases().set(alias, target_name)
+        print(f"✅ Alias '{alias}' → '{target_name}' (antes: '{previous}')")
+        # Los workers ven el alias nuevo cuando vence su caché: hasta entonces pueden
+        # seguir escribiendo en la colección anterior
+        time.sleep(CHROMA_ALIAS_CACHE_TTL + 1)
+        migration.catch_up()
+        # Las búsquedas por el alias que ya vieron la colección nueva pueden haber
+        # cacheado resultados sin los documentos copiados recién
+        chromadb_client.invalidate_results(target_name)
+        print(f"   Para volver atrás: python migrate_collection.py alias {alias} {previous}")
+    else:
+        print(f"✅ '{target_name}' lista. Para usarla: python migrate_collection.py alias {alias} {target_name}")
+    elapsed = time.perf_counter() - started
+
+    processed = migration.stats["copied"] + migration.stats["updated"]
+    return dict(
+        migration.stats,
+        source=source_name,
+        target=target_name,
+        count=target.count(),
+        elapsed_s=round(elapsed, 3),
+        docs_per_second=round(processed / elapsed, 1) if elapsed > 0 else None,
+    )
+
+
+def status(alias: str) -> Dict[str, Any]:
+    """Colección a la que apunta el alias y progreso de las colecciones sombra"""
+    client = chromadb_client._get_client()
+    physical = chromadb_client.resolve_collection_name(alias)
+    shadows = []
+    for collection in client.list_collections():
+        metadata = collection.metadata or {}
+        if SOURCE_KEY in metadata:
+            shadows.append({
+                "collection": collection.name,
+                "source": metadata.get(SOURCE_KEY),
+                "embedding_model": metadata.get(EMBEDDING_MODEL_KEY),
+                "status": metadata.get(STATUS_KEY),
+                "offset": metadata.get(OFFSET_KEY),
+            })
+    current = client.get_collection(name=physical)
+    return {
+        "alias": alias,
+        "collection": physical,
+        "embedding_model": chromadb_client.collection_embedding_model(current),
+        "count": current.count(),
+        "migrations": shadows,
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Migrar una colección a otro modelo de embedding sin cortar el servicio")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("migrate", help="Embeber en una colección sombra y cambiar el alias")
+    run.add_argument("alias", help="Alias o colección que usan el API y Gradio (ej: pozos)")
+    run.add_argument("--model", required=True, help="Modelo de embedding nuevo")
+    run.add_argument("--target", help="Colección sombra (default: <alias>-<modelo>)")
+    run.add_argument("--page-size", type=int, default=MIGRATION_PAGE_SIZE)
+    run.add_argument("--concurrency", type=int, default=MIGRATION_CONCURRENCY)
+    run.add_argument("--no-swap", action="store_true", help="Dejar la colección lista sin cambiar el alias")
+
+    show = commands.add_parser("status", help="Ver a qué colección apunta el alias y las migraciones")
+    show.add_argument("alias")
+
+    point = commands.add_parser("alias", help="Apuntar el alias a otra colección (alias = colección lo elimina)")
+    point.add_argument("alias")
+    point.add_argument("target")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        if args.command == "migrate":
+            result = migrate(args.alias, args.model, args.target, args.page_size, args.concurrency,
+                             swap=not args.no_swap)
+            print(f"📊 {result['copied']} copiados, {result['updated']} sincronizados, {result['deleted']} eliminados, "
+                  f"{result['failed']} con error, {result['without_text']} sin texto "
+                  f"en {result['elapsed_s']}s ({result['docs_per_second']} docs/s)")
+        elif args.command == "status":
+            info = status(args.alias)
+            print(f"📚 '{info['alias']}' → '{info['collection']}' ({info['embedding_model']}, {info['count']} documentos)")
+            for shadow in info["migrations"]:
+                print(f"   • {shadow['collection']} ← {shadow['source']}: {shadow['embedding_model']}, "
+                      f"{shadow['status']} (offset {shadow['offset']})")
+        else:
+            previous = chromadb_client.get_aliases().set(args.alias, args.target)
+            print(f"✅ Alias '{args.alias}' → '{args.target}' (antes: '{previous}')")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+#!/usr/bin/env python3
+"""
+Snapshot en caliente de una colección de ChromaDB y restauración rápida
+
+A diferencia de scripts/export-chroma.sh (que detiene ChromaDB y empaqueta
+chroma_storage), el snapshot se hace por la API de ChromaDB con el servicio en
+marcha: se recorre la colección por páginas (varias leídas en paralelo) y se
+escriben IDs, documentos, metadata y embeddings en un archivo .zip:
+
+    manifest.json      formato, colección, modelo de embedding, metadata de la
+                       colección, dimensión y la lista de chunks con su sha256
+    chunk-00000.npz    ids, documentos y metadata (JSON) y embeddings float32
+
+La restauración verifica los sha256 y hace upsert de los embeddings guardados en
+lotes grandes y en paralelo, sin volver a llamar a OpenAI. Con --alias se restaura
+en otra colección y se cambia el alias al terminar (ver collection_aliases.py), sin
+cortar el servicio.
+
+El snapshot refleja la colección mientras se recorre: un documento creado o borrado
+durante el export puede quedar o no en el archivo.
+
+Uso (dentro del contenedor del API):
+    python snapshot_collection.py export pozos -o /backups/pozos.zip
+    python snapshot_collection.py verify /backups/pozos.zip
+    python snapshot_collection.py restore /backups/pozos.zip --collection pozos-restaurada --alias pozos
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import chromadb_client
+from collection_aliases import EMBEDDING_MODEL_KEY
+
+SNAPSHOT_FORMAT = "n8npozos-chroma-snapshot"
+SNAPSHOT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+# Documentos por chunk (cada chunk es una página leída de ChromaDB)
+SNAPSHOT_PAGE_SIZE = int(os.getenv("SNAPSHOT_PAGE_SIZE", "2000"))
+# Páginas leídas / lotes escritos en paralelo
+SNAPSHOT_CONCURRENCY = int(os.getenv("SNAPSHOT_CONCURRENCY", "4"))
+# Documentos por upsert al restaurar (se acota al máximo que acepta ChromaDB)
+SNAPSHOT_RESTORE_BATCH_SIZE = int(os.getenv("SNAPSHOT_RESTORE_BATCH_SIZE", "5000"))
+
+
+def _json_array(values: List[Any]) -> np.ndarray:
+    return np.frombuffer(json.dumps(values, ensure_ascii=False).encode("utf-8"), dtype=np.uint8)
+
+
+def _encode_chunk(page: Dict[str, Any]) -> bytes:
+    """Serializar una página de ChromaDB como .npz (sin objetos de Python: no requiere pickle)"""
+    buffer = io.BytesIO()
+    np.savez(
+        buffer,
+        ids=_json_array(list(page["ids"])),
+        documents=_json_array(list(page["documents"] or [None] * len(page["ids"]))),
+        metadatas=_json_array([metadata or None for metadata in (page["metadatas"] or [None] * len(page["ids"]))]),
+        embeddings=np.asarray(page["embeddings"], dtype=np.float32),
+    )
+    return buffer.getvalue()
+
+
+def _decode_chunk(data: bytes) -> Dict[str, Any]:
+    with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+        return {
+            "ids": json.loads(arrays["ids"].tobytes().decode("utf-8")),
+            "documents": json.loads(arrays["documents"].tobytes().decode("utf-8")),
+            "metadatas": json.loads(arrays["metadatas"].tobytes().decode("utf-8")),
+            "embeddings": arrays["embeddings"],
+        }
+
+
+def _throughput(count: int, size: int, elapsed: float) -> Dict[str, Any]:
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "vectors_per_second": round(count / elapsed, 1) if elapsed > 0 else None,
+        "mb_per_second": round(size / 1e6 / elapsed, 1) if elapsed > 0 else None,
+    }
+
+
+def export_collection(collection_name: str, path: str, page_size: int = SNAPSHOT_PAGE_SIZE,
+                      concurrency: int = SNAPSHOT_CONCURRENCY, compress: bool = True) -> Dict[str, Any]:
+    """
+    Escribir un snapshot de la colección (o alias) en `path`
+
+    El archivo se escribe con otro nombre y se renombra al terminar: un export
+    cortado no deja un snapshot incompleto.
+
+    Returns:
+        Dict con collection, count, dimension, bytes, elapsed_s, vectors_per_second y mb_per_second
+    """
+    page_size = max(1, page_size)
+    collection = chromadb_client.get_collection(collection_name)
+    model = chromadb_client.collection_embedding_model(collection)
+    total = collection.count()
+    print(f"📦 Exportando '{collection.name}' ({total} documentos, {model}) → {path}")
+
+    def fetch(offset: int) -> Dict[str, Any]:
+        return collection.get(limit=page_size, offset=offset, include=["documents", "metadatas", "embeddings"])
+
+    chunks: List[Dict[str, Any]] = []
+    seen = set()
+    dimension = None
+    started = time.perf_counter()
+    tmp_path = f"{path}.tmp"
+    compression = zipfile.ZIP_DEFLATED if compress else zipfile.ZIP_STORED
+    try:
+        with zipfile.ZipFile(tmp_path, "w", compression=compression, compresslevel=1 if compress else None) as archive, \
+                ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="snapshot") as pool:
+            pending = deque()
+            next_offset = 0
+            last_page = False
+            while True:
+                # Leer por adelantado: ChromaDB atiende las páginas siguientes mientras se escribe
+                while not last_page and len(pending) < max(1, concurrency):
+                    pending.append(pool.submit(fetch, next_offset))
+                    next_offset += page_size
+                if not pending:
+                    break
+                page = pending.popleft().result()
+                if len(page["ids"]) < page_size:
+                    last_page = True
+                # Un borrado durante el export corre los offsets: no repetir documentos
+                keep = [i for i, doc_id in enumerate(page["ids"]) if doc_id not in seen]
+                if not keep:
+                    continue
+                if len(keep) < len(page["ids"]):
+                    page = {key: [page[key][i] for i in keep] for key in ("ids", "documents", "metadatas", "embeddings")}
+                seen.update(page["ids"])
+
+                data = _encode_chunk(page)
+                name = f"chunk-{len(chunks):05d}.npz"
+                archive.writestr(name, data)
+                chunks.append({"name": name, "count": len(page["ids"]), "sha256": hashlib.sha256(data).hexdigest()})
+                dimension = dimension or int(np.asarray(page["embeddings"][0]).shape[0])
+                elapsed = time.perf_counter() - started
+                print(f"   {len(seen)}/{max(total, len(seen))} documentos ({len(seen) / elapsed:.0f} vectores/s)")
+
+            manifest = {
+                "format": SNAPSHOT_FORMAT,
+                "version": SNAPSHOT_VERSION,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "collection": collection_name,
+                "physical_collection": collection.name,
+                EMBEDDING_MODEL_KEY: model,
+                "metadata": collection.metadata or {},
+                "dimension": dimension,
+                "count": len(seen),
+                "chunks": chunks,
+            }
+            archive.writestr(MANIFEST_NAME, json.dumps(manifest, ensure_ascii=False, indent=2))
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    chromadb_client.get_connection().record_success()
+
+    size = os.path.getsize(path)
+    result = {"collection": collection.name, "count": len(seen), "dimension": dimension, "bytes": size}
+    result.update(_throughput(len(seen), size, time.perf_counter() - started))
+    return result
+
+
+def read_manifest(archive: zipfile.ZipFile) -> Dict[str, Any]:
+    """
+    Leer y validar el manifest de un snapshot
+
+    Raises:
+        Exception: Si el archivo no es un snapshot o es de una versión desconocida
+    """
+    try:
+        manifest = json.loads(archive.read(MANIFEST_NAME))
+    except KeyError:
+        raise Exception(f"El archivo no tiene {MANIFEST_NAME}: no es un snapshot o está incompleto")
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("version") != SNAPSHOT_VERSION:
+        raise Exception(f"Formato de snapshot no soportado: {manifest.get('format')} v{manifest.get('version')}")
+    return manifest
+
+
+def _read_chunk(archive: zipfile.ZipFile, chunk: Dict[str, Any]) -> bytes:
+    data = archive.read(chunk["name"])
+    if hashlib.sha256(data).hexdigest() != chunk["sha256"]:
+        raise Exception(f"Checksum inválido en {chunk['name']}: el snapshot está dañado")
+    return data
+
+
+def verify_snapshot(path: str) -> Dict[str, Any]:
+    """
+    Verificar los sha256 de todos los chunks de un snapshot
+
+    Returns:
+        Manifest del snapshot
+
+    Raises:
+        Exception: Si falta un chunk o su checksum no coincide
+    """
+    with zipfile.ZipFile(path) as archive:
+        manifest = read_manifest(archive)
+        count = 0
+        for chunk in manifest["chunks"]:
+            _read_chunk(archive, chunk)
+            count += chunk["count"]
+    if count != manifest["count"]:
+        raise Exception(f"El snapshot declara {manifest['count']} documentos pero sus chunks tienen {count}")
+    return manifest
+
+
+def restore_collection(path: str, collection_name: Optional[str] = None, alias: Optional[str] = None,
+                       batch_size: int = SNAPSHOT_RESTORE_BATCH_SIZE, concurrency: int = SNAPSHOT_CONCURRENCY,
+                       force: bool = False) -> Dict[str, Any]:
+    """
+    Restaurar un snapshot con los embeddings guardados (sin llamar a OpenAI)
+
+    Args:
+        path: Archivo del snapshot
+        collection_name: Colección destino (default: la colección original)
+        alias: Alias a apuntar a la colección restaurada al terminar
+        batch_size: Documentos por upsert
+        concurrency: Upserts en paralelo
+        force: Restaurar aunque la colección destino ya tenga documentos
+
+    Returns:
+        Dict con collection, count, restored, bytes, elapsed_s, vectors_per_second y mb_per_second
+
+    Raises:
+        Exception: Si el snapshot está dañado o la colección destino no está vacía
+    """
+    manifest = verify_snapshot(path)
+    name = collection_name or manifest["physical_collection"]
+    model = manifest[EMBEDDING_MODEL_KEY]
+    client = chromadb_client._get_client()
+
+    metadata = dict(manifest.get("metadata") or {}, **{EMBEDDING_MODEL_KEY: model})
+    kwargs: Dict[str, Any] = {}
+    embedding_function = chromadb_client.embedding_function_for(model)
+    if embedding_function:
+        kwargs["embedding_function"] = embedding_function
+    collection = client.get_or_create_collection(name=name, metadata=metadata, **kwargs)
+    existing = collection.count()
+    if existing and not force:
+        raise Exception(f"La colección '{name}' ya tiene {existing} documentos (usar --force para hacer upsert encima)")
+
+    max_chunk = max(1, batch_size)
+    try:
+        max_chunk = min(max_chunk, client.get_max_batch_size())
+    except Exception:
+        pass
+
+    print(f"📥 Restaurando {manifest['count']} documentos ({model}) en '{name}'")
+    restored = 0
+    started = time.perf_counter()
+
+    def upsert(batch: Dict[str, Any]) -> int:
+        collection.upsert(
+            ids=batch["ids"],
+            documents=batch["documents"],
+            metadatas=batch["metadatas"],
+            embeddings=batch["embeddings"],
+        )
+        return len(batch["ids"])
+
+    with zipfile.ZipFile(path) as archive, \
+            ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="restore") as pool:
+        pending = deque()
+        for chunk in manifest["chunks"]:
+            page = _decode_chunk(_read_chunk(archive, chunk))
+            for start in range(0, len(page["ids"]), max_chunk):
+                end = start + max_chunk
+                pending.append(pool.submit(upsert, {
+                    "ids": page["ids"][start:end],
+                    "documents": page["documents"][start:end],
+                    "metadatas": page["metadatas"][start:end],
+                    "embeddings": page["embeddings"][start:end],
+                }))
+                # Acotar los lotes en memoria esperando a los más viejos
+                while len(pending) > max(1, concurrency) * 2:
+                    restored += pending.popleft().result()
+            elapsed = time.perf_counter() - started
+            print(f"   {restored}/{manifest['count']} documentos ({restored / elapsed:.0f} vectores/s)")
+        while pending:
+            restored += pending.popleft().result()
+    chromadb_client.get_connection().record_success()
+
+    if alias:
+        previous = chromadb_client.get_aliases().set(alias, name)
+        print(f"✅ Alias '{alias}' → '{name}' (antes: '{previous}')")
+
+    size = os.path.getsize(path)
+    result = {"collection": name, "count": collection.count(), "restored": restored, "bytes": size}
+    result.update(_throughput(restored, size, time.perf_counter() - started))
+    return result
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Snapshot en caliente y restauración de colecciones de ChromaDB")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Escribir un snapshot de una colección (o alias)")
+    export.add_argument("collection")
+    export.add_argument("-o", "--output", help="Archivo de salida (default: <colección>_<fecha>.zip)")
+    export.add_argument("--page-size", type=int, default=SNAPSHOT_PAGE_SIZE)
+    export.add_argument("--concurrency", type=int, default=SNAPSHOT_CONCURRENCY)
+    export.add_argument("--no-compress", action="store_true", help="Guardar los chunks sin comprimir (más rápido)")
+
+    verify = commands.add_parser("verify", help="Verificar los checksums de un snapshot")
+    verify.add_argument("path")
+
+    restore = commands.add_parser("restore", help="Restaurar un snapshot sin volver a embeber")
+    restore.add_argument("path")
+    restore.add_argument("--collection", help="Colección destino (default: la original)")
+    restore.add_argument("--alias", help="Apuntar este alias a la colección restaurada")
+    restore.add_argument("--batch-size", type=int, default=SNAPSHOT_RESTORE_BATCH_SIZE)
+    restore.add_argument("--concurrency", type=int, default=SNAPSHOT_CONCURRENCY)
+    restore.add_argument("--force", action="store_true", help="Hacer upsert aunque la colección tenga documentos")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    try:
+        if args.command == "export":
+            output = args.output or f"{args.collection}_{time.strftime('%Y%m%d_%H%M%S')}.zip"
+            result = export_collection(args.collection, output, args.page_size, args.concurrency,
+                                       compress=not args.no_compress)
+            print(f"✅ Snapshot: {result['count']} vectores de {result['dimension']} dimensiones, "
+                  f"{result['bytes'] / 1e6:.1f} MB en {result['elapsed_s']}s "
+                  f"({result['vectors_per_second']} vectores/s, {result['mb_per_second']} MB/s)")
+        elif args.command == "verify":
+            manifest = verify_snapshot(args.path)
+            print(f"✅ Snapshot válido: '{manifest['physical_collection']}', {manifest['count']} documentos, "
+                  f"{len(manifest['chunks'])} chunks, {manifest[EMBEDDING_MODEL_KEY]} ({manifest['created_at']})")
+        else:
+            result = restore_collection(args.path, args.collection, args.alias, args.batch_size,
+                                        args.concurrency, force=args.force)
+            print(f"✅ Restaurados {result['restored']} vectores en '{result['collection']}' en {result['elapsed_s']}s "
+                  f"({result['vectors_per_second']} vectores/s, {result['mb_per_second']} MB/s)")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
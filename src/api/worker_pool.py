@@ -0,0 +1,119 @@
+"""
+Pool acotado de threads para sacar del event loop el trabajo pesado del API
+
+Las llamadas a ChromaDB, el cálculo de MMR/similitud (NumPy libera el GIL) y la
+serialización de respuestas grandes se ejecutan en este pool, de modo que un
+volcado de vectores o un fetch_k grande no agrega latencia a los requests chicos.
+
+Si hay más de API_POOL_SIZE + API_POOL_QUEUE tareas pendientes, las nuevas se
+rechazan con PoolSaturatedError (el API responde 503) en lugar de encolarse sin límite.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", str(min(32, (os.cpu_count() or 1) + 4))))
+API_POOL_QUEUE = int(os.getenv("API_POOL_QUEUE", "64"))
+
+
+class PoolSaturatedError(Exception):
+    """El pool tiene todos los threads ocupados y la cola llena"""
+
+
+class BoundedPool:
+    """ThreadPoolExecutor con profundidad de cola acotada y métricas"""
+
+    def __init__(self, size: int, queue_depth: int):
+        self.size = size
+        self.queue_depth = queue_depth
+        self._executor = ThreadPoolExecutor(max_workers=size, thread_name_prefix="api-pool")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._running = 0
+        self._stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "queue_wait_ms_total": 0.0,
+            "run_ms_total": 0.0,
+            "queue_wait_ms_max": 0.0,
+        }
+
+    async def run(self, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Ejecutar fn(*args, **kwargs) en el pool y esperar el resultado sin bloquear el loop"""
+        with self._lock:
+            if self._pending >= self.size + self.queue_depth:
+                self._stats["rejected"] += 1
+                raise PoolSaturatedError(
+                    f"Servidor ocupado: {self._pending} tareas pendientes "
+                    f"(pool={self.size}, cola={self.queue_depth}). Reintenta en unos segundos."
+                )
+            self._pending += 1
+            self._stats["submitted"] += 1
+
+        submitted_at = time.perf_counter()
+
+        def task():
+            started_at = time.perf_counter()
+            with self._lock:
+                self._running += 1
+                wait_ms = (started_at - submitted_at) * 1000
+                self._stats["queue_wait_ms_total"] += wait_ms
+                self._stats["queue_wait_ms_max"] = max(self._stats["queue_wait_ms_max"], wait_ms)
+            ok = False
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                with self._lock:
+                    self._running -= 1
+                    self._stats["run_ms_total"] += (time.perf_counter() - started_at) * 1000
+                    self._stats["completed" if ok else "failed"] += 1
+
+        try:
+            return await asyncio.wrap_future(self._executor.submit(task))
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            running = self._running
+            pending = self._pending
+        finished = stats["completed"] + stats["failed"]
+        return {
+            "size": self.size,
+            "queue_depth": self.queue_depth,
+            "running": running,
+            "queued": max(0, pending - running),
+            "submitted": stats["submitted"],
+            "completed": stats["completed"],
+            "failed": stats["failed"],
+            "rejected": stats["rejected"],
+            "avg_queue_wait_ms": stats["queue_wait_ms_total"] / finished if finished else 0.0,
+            "max_queue_wait_ms": stats["queue_wait_ms_max"],
+            "avg_run_ms": stats["run_ms_total"] / finished if finished else 0.0,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_pool_instance: Optional[BoundedPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> BoundedPool:
+    """Obtener el pool del proceso (uno por worker de uvicorn)"""
+    global _pool_instance
+    if _pool_instance is None:
+        with _pool_lock:
+            if _pool_instance is None:
+                _pool_instance = BoundedPool(API_POOL_SIZE, API_POOL_QUEUE)
+    return _pool_instance
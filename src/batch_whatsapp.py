@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+"""
+Procesamiento por lotes de chats exportados de WhatsApp.
+
+Para cada exportación ejecuta process_whatsapp.py (→ _procesado.txt) y
+convert_to_json.py (→ _procesado.json) en un pool de procesos. Guarda un estado con
+hash SHA-256, mtime y parámetros de cada entrada: en las siguientes ejecuciones las
+exportaciones sin cambios se saltan.
+
+Las exportaciones se indican de dos formas:
+    - Manifest JSON: {"ruta/chat.txt": {"texto_empresa": "...", "telefono": "..."}, ...}
+      (rutas relativas al manifest; texto_empresa puede omitirse si se pasa --empresa)
+    - Directorio: los archivos "Chat de WhatsApp con <telefono>.txt" o ".zip" (nombre
+      de la exportación de WhatsApp), con el texto de empresa de --empresa
+
+Uso:
+    python batch_whatsapp.py --manifest chats.json [--salida DIR] [--procesos N]
+    python batch_whatsapp.py --directorio chats/ --empresa "Limpieza de pozos:" [--forzar]
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+import convert_to_json
+import process_whatsapp
+
+# Nombre de la exportación de WhatsApp: "Chat de WhatsApp con +591 69023378.txt" (o .zip con multimedia)
+PATRON_NOMBRE_EXPORTACION = re.compile(r'^Chat de WhatsApp con (.+)\.(?:txt|zip)$', re.IGNORECASE)
+
+# Estado de la última ejecución, en el directorio de salida
+ARCHIVO_ESTADO = ".batch_whatsapp_estado.json"
+
+
+def cargar_manifest(ruta_manifest: str, texto_empresa: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    Lee el manifest {archivo: {"texto_empresa", "telefono"}}.
+
+    Returns:
+        Lista de {"archivo", "texto_empresa", "telefono"} con rutas absolutas
+
+    Raises:
+        Exception: Si una entrada no tiene teléfono o texto de empresa
+    """
+    with open(ruta_manifest, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    base = os.path.dirname(os.path.abspath(ruta_manifest))
+    entradas = []
+    for archivo, parametros in manifest.items():
+        empresa = parametros.get("texto_empresa") or texto_empresa
+        telefono = parametros.get("telefono")
+        if not empresa or not telefono:
+            raise Exception(f"La entrada '{archivo}' del manifest necesita texto_empresa y telefono")
+        entradas.append({
+            "archivo": os.path.normpath(os.path.join(base, archivo)),
+            "texto_empresa": empresa,
+            "telefono": telefono
+        })
+    return entradas
+
+
+def buscar_exportaciones(directorio: str, texto_empresa: str) -> List[Dict[str, str]]:
+    """
+    Busca en el directorio las exportaciones "Chat de WhatsApp con <telefono>.txt" o ".zip".
+
+    Si están las dos versiones de un chat, se usa el .txt.
+
+    Returns:
+        Lista de {"archivo", "texto_empresa", "telefono"} ordenada por nombre
+    """
+    nombres = sorted(os.listdir(directorio))
+    textos = {os.path.splitext(nombre)[0] for nombre in nombres if nombre.lower().endswith(".txt")}
+    entradas = []
+    for nombre in nombres:
+        match = PATRON_NOMBRE_EXPORTACION.match(nombre)
+        base, ext = os.path.splitext(nombre)
+        if ext.lower() == ".zip" and base in textos:
+            continue
+        if match and not nombre.endswith("_procesado.txt"):
+            entradas.append({
+                "archivo": os.path.abspath(os.path.join(directorio, nombre)),
+                "texto_empresa": texto_empresa,
+                "telefono": match.group(1).strip()
+            })
+    return entradas
+
+
+def hash_archivo(ruta: str) -> str:
+    """SHA-256 del archivo, leído por bloques"""
+    sha256 = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(bloque)
+    return sha256.hexdigest()
+
+
+def rutas_salida(archivo: str, directorio_salida: Optional[str]) -> Dict[str, str]:
+    """Rutas del _procesado.txt y del JSON de una exportación"""
+    base = os.path.splitext(os.path.basename(archivo))[0]
+    directorio = directorio_salida or os.path.dirname(archivo)
+    procesado = os.path.join(directorio, f"{base}_procesado.txt")
+    return {"procesado": procesado, "json": f"{os.path.splitext(procesado)[0]}.json"}
+
+
+def procesar_entrada(entrada: Dict[str, str], directorio_salida: Optional[str],
+                     hash_anterior: Optional[str], reglas: Optional[process_whatsapp.ReglasTexto] = None) -> Dict[str, Any]:
+    """
+    Procesa una exportación (se ejecuta en un worker del pool).
+
+    Si el hash coincide con hash_anterior, no se procesa de nuevo. La salida de los
+    scripts se descarta para no mezclar los logs de varios workers.
+
+    Args:
+        reglas: Reglas de descarte y reemplazo (default: las de process_whatsapp)
+
+    Returns:
+        {"estado": "procesado" | "sin_cambios" | "error", "sha256", "conversaciones", "error"}
+    """
+    resultado = {"archivo": entrada["archivo"], "sha256": None, "conversaciones": 0, "error": None}
+    inicio = time.perf_counter()
+    if reglas is not None:
+        process_whatsapp.usar_reglas(reglas)
+    try:
+        resultado["sha256"] = hash_archivo(entrada["archivo"])
+        if resultado["sha256"] == hash_anterior:
+            return {**resultado, "estado": "sin_cambios", "segundos": time.perf_counter() - inicio}
+
+        salidas = rutas_salida(entrada["archivo"], directorio_salida)
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            process_whatsapp.procesar_archivo_whatsapp(
+                entrada["archivo"], entrada["texto_empresa"], entrada["telefono"], salidas["procesado"]
+            )
+            archivo_json = convert_to_json.procesar_archivo(salidas["procesado"])
+        if archivo_json is None:
+            raise Exception("No se encontraron conversaciones user/ai")
+
+        with open(archivo_json, 'r', encoding='utf-8') as f:
+            resultado["conversaciones"] = len(json.load(f))
+        return {**resultado, "estado": "procesado", "segundos": time.perf_counter() - inicio}
+    except Exception as e:
+        return {**resultado, "estado": "error", "error": str(e), "segundos": time.perf_counter() - inicio}
+
+
+def cargar_estado(ruta_estado: str) -> Dict[str, Any]:
+    if not os.path.exists(ruta_estado):
+        return {}
+    try:
+        with open(ruta_estado, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        print(f"⚠️  No se pudo leer el estado {ruta_estado}: {str(e)} (se procesa todo)")
+        return {}
+
+
+def guardar_estado(ruta_estado: str, estado: Dict[str, Any]):
+    """Escribe el estado en un temporal y lo reemplaza (no queda a medias si se corta)"""
+    temporal = f"{ruta_estado}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta_estado)
+
+
+def mismos_parametros(registro: Dict[str, Any], entrada: Dict[str, str], directorio_salida: Optional[str]) -> bool:
+    """Mismos texto de empresa, teléfono y reglas que la última vez, y el JSON sigue existiendo"""
+    return (
+        registro.get("texto_empresa") == entrada["texto_empresa"]
+        and registro.get("telefono") == entrada["telefono"]
+        and registro.get("reglas", process_whatsapp.REGLAS_DEFAULT.huella()) == process_whatsapp.REGLAS.huella()
+        and os.path.exists(rutas_salida(entrada["archivo"], directorio_salida)["json"])
+    )
+
+
+def sin_cambios_aparentes(registro: Dict[str, Any], entrada: Dict[str, str], directorio_salida: Optional[str]) -> bool:
+    """Mismo mtime y tamaño que la última vez (no hace falta leer el archivo)"""
+    stat = os.stat(entrada["archivo"])
+    return (
+        registro.get("mtime") == stat.st_mtime
+        and registro.get("tamano") == stat.st_size
+        and mismos_parametros(registro, entrada, directorio_salida)
+    )
+
+
+def procesar_lote(entradas: List[Dict[str, str]], directorio_salida: Optional[str] = None,
+                  procesos: Optional[int] = None, forzar: bool = False,
+                  ruta_estado: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Procesa las exportaciones en un pool de procesos, saltando las que no cambiaron.
+
+    Args:
+        entradas: Lista de {"archivo", "texto_empresa", "telefono"}
+        directorio_salida: Directorio de los _procesado.txt/.json (default: junto a cada exportación)
+        procesos: Tamaño del pool (default: CPUs disponibles)
+        forzar: Procesar todo aunque no haya cambios
+        ruta_estado: Archivo de estado (default: ARCHIVO_ESTADO en directorio_salida o en el actual)
+
+    Returns:
+        Resumen: archivos procesados/saltados/fallidos, bytes, segundos, MB/s y errores
+    """
+    if directorio_salida:
+        os.makedirs(directorio_salida, exist_ok=True)
+    ruta_estado = ruta_estado or os.path.join(directorio_salida or ".", ARCHIVO_ESTADO)
+    estado = {} if forzar else cargar_estado(ruta_estado)
+
+    resumen = {"total": len(entradas), "procesados": 0, "sin_cambios": 0, "fallidos": 0,
+               "bytes": 0, "conversaciones": 0, "errores": {}}
+    inicio = time.perf_counter()
+
+    pendientes = []
+    for entrada in entradas:
+        if not os.path.exists(entrada["archivo"]):
+            resumen["fallidos"] += 1
+            resumen["errores"][entrada["archivo"]] = "El archivo no existe"
+            print(f"❌ {os.path.basename(entrada['archivo'])}: el archivo no existe")
+        elif sin_cambios_aparentes(estado.get(entrada["archivo"], {}), entrada, directorio_salida):
+            resumen["sin_cambios"] += 1
+            print(f"⏭️  {os.path.basename(entrada['archivo'])}: sin cambios")
+        else:
+            pendientes.append(entrada)
+
+    print(f"🔄 Procesando {len(pendientes)} de {len(entradas)} exportaciones...")
+    with ProcessPoolExecutor(max_workers=procesos or os.cpu_count() or 1) as pool:
+        futuros = {}
+        for entrada in pendientes:
+            # Cambió el mtime: el worker compara el hash antes de procesar
+            registro = estado.get(entrada["archivo"], {})
+            hash_anterior = registro.get("sha256") if mismos_parametros(registro, entrada, directorio_salida) else None
+            futuros[pool.submit(procesar_entrada, entrada, directorio_salida, hash_anterior,
+                                process_whatsapp.REGLAS)] = entrada
+
+        for futuro in as_completed(futuros):
+            entrada = futuros[futuro]
+            resultado = futuro.result()
+            nombre = os.path.basename(entrada["archivo"])
+
+            if resultado["estado"] == "error":
+                resumen["fallidos"] += 1
+                resumen["errores"][entrada["archivo"]] = resultado["error"]
+                print(f"❌ {nombre}: {resultado['error']}")
+                continue
+
+            stat = os.stat(entrada["archivo"])
+            registro = estado.get(entrada["archivo"], {})
+            if resultado["estado"] == "procesado":
+                registro = {
+                    "sha256": resultado["sha256"],
+                    "texto_empresa": entrada["texto_empresa"],
+                    "telefono": entrada["telefono"],
+                    "reglas": process_whatsapp.REGLAS.huella(),
+                    "conversaciones": resultado["conversaciones"],
+                    "procesado_en": time.time()
+                }
+            estado[entrada["archivo"]] = {**registro, "mtime": stat.st_mtime, "tamano": stat.st_size}
+            guardar_estado(ruta_estado, estado)
+
+            if resultado["estado"] == "sin_cambios":
+                resumen["sin_cambios"] += 1
+                print(f"⏭️  {nombre}: sin cambios (mismo contenido)")
+            else:
+                resumen["procesados"] += 1
+                resumen["bytes"] += stat.st_size
+                resumen["conversaciones"] += resultado["conversaciones"]
+                print(f"✅ {nombre}: {resultado['conversaciones']} conversaciones en {resultado['segundos']:.2f}s")
+
+    resumen["segundos"] = round(time.perf_counter() - inicio, 3)
+    resumen["mb_por_segundo"] = round(resumen["bytes"] / 1e6 / resumen["segundos"], 2) if resumen["segundos"] else 0.0
+    return resumen
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Procesa lotes de chats de WhatsApp a JSON user/ai")
+    origen = parser.add_mutually_exclusive_group(required=True)
+    origen.add_argument("--manifest", help="JSON {archivo: {texto_empresa, telefono}}")
+    origen.add_argument("--directorio", help="Directorio con exportaciones 'Chat de WhatsApp con <telefono>.txt'")
+    parser.add_argument("--empresa", help="Texto que identifica a la empresa (requerido con --directorio)")
+    parser.add_argument("--salida", help="Directorio de salida (default: junto a cada exportación)")
+    parser.add_argument("--procesos", type=int, help="Procesos del pool (default: CPUs disponibles)")
+    parser.add_argument("--forzar", action="store_true", help="Procesar todo aunque no haya cambios")
+    parser.add_argument("--reglas", default=process_whatsapp.ARCHIVO_REGLAS,
+                        help="JSON con reglas de descarte y reemplazo (default: $WHATSAPP_REGLAS o las incluidas)")
+    return parser.parse_args()
+
+
+def main():
+    """Función principal del script"""
+    args = parse_args()
+
+    try:
+        process_whatsapp.usar_reglas(process_whatsapp.cargar_reglas(args.reglas))
+        if args.manifest:
+            entradas = cargar_manifest(args.manifest, args.empresa)
+        else:
+            if not args.empresa:
+                raise Exception("--empresa es requerido con --directorio")
+            entradas = buscar_exportaciones(args.directorio, args.empresa)
+    except Exception as e:
+        print(f"❌ Error: {str(e)}")
+        sys.exit(1)
+
+    if not entradas:
+        print("⚠️  No se encontraron exportaciones para procesar")
+        return
+
+    # El estado queda en la salida o, si no hay, junto a las exportaciones
+    base_estado = args.salida or args.directorio or os.path.dirname(os.path.abspath(args.manifest))
+    resumen = procesar_lote(entradas, args.salida, args.procesos, args.forzar,
+                            os.path.join(base_estado, ARCHIVO_ESTADO))
+
+    print(f"\n{'='*60}")
+    print(f"✅ Lote completado en {resumen['segundos']:.2f}s")
+    print(f"   Procesados: {resumen['procesados']}  Sin cambios: {resumen['sin_cambios']}  "
+          f"Fallidos: {resumen['fallidos']}  (total {resumen['total']})")
+    print(f"   Conversaciones: {resumen['conversaciones']}")
+    print(f"   Throughput: {resumen['bytes'] / 1e6:.1f} MB a {resumen['mb_por_segundo']:.2f} MB/s")
+    for archivo, error in resumen["errores"].items():
+        print(f"   ❌ {archivo}: {error}")
+
+    if resumen["fallidos"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,17 +17,26 @@ y los convierte a JSON con la estructura:
 ]
 
 Uso:
-    python convert_to_json.py [directorio]
+    python convert_to_json.py [directorio] [--incremental [--final]]
     
 Si no se especifica directorio, usa el directorio actual.
+
+Con --incremental, cada JSON guarda un punto de control (bytes ya convertidos del
+_procesado.txt y su hash): si process_whatsapp.py --incremental agregó líneas, solo
+se convierten esas y los pares nuevos se agregan al final del JSON existente. El
+último par del archivo queda pendiente hasta la próxima versión (la empresa puede
+responder después de la exportación). Con --final también se convierte el último par,
+para chats que ya terminaron.
 """
 
+import argparse
+import hashlib
+import io
 import os
 import json
-import sys
 import re
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 
 
 def procesar_linea(linea: str) -> Optional[Dict[str, str]]:
@@ -60,44 +69,28 @@ def procesar_linea(linea: str) -> Optional[Dict[str, str]]:
     return None
 
 
-def convertir_a_json(archivo_entrada: str) -> List[Dict[str, str]]:
+def emparejar_turnos(turnos: Iterable[Tuple[str, str]]) -> Iterator[Dict[str, str]]:
     """
-    Convierte un archivo _procesado.txt a formato JSON.
+    Empareja turnos (tipo, mensaje) en objetos {user, ai} a medida que llegan.
+    
+    Un user sin respuesta se emite con ai vacío y un ai sin user previo con user vacío.
     
     Args:
-        archivo_entrada: Ruta al archivo _procesado.txt
+        turnos: Pares ("user" | "ai", mensaje) en orden
         
-    Returns:
-        Lista de diccionarios con estructura {user: "...", ai: "..."}
+    Yields:
+        Diccionarios con estructura {user: "...", ai: "..."}
     """
-    conversaciones = []
     user_actual = None
     
-    print(f"📖 Leyendo archivo: {archivo_entrada}")
-    
-    try:
-        with open(archivo_entrada, 'r', encoding='utf-8', errors='ignore') as f:
-            lineas = f.readlines()
-    except Exception as e:
-        print(f"❌ Error al leer el archivo: {str(e)}")
-        return []
-    
-    for i, linea in enumerate(lineas, 1):
-        resultado = procesar_linea(linea)
-        
-        if resultado is None:
-            continue
-        
-        tipo = resultado["tipo"]
-        mensaje = resultado["mensaje"]
-        
+    for tipo, mensaje in turnos:
         if tipo == "user":
             # Si hay un user pendiente sin ai, guardarlo con ai vacío
             if user_actual is not None:
-                conversaciones.append({
+                yield {
                     "user": user_actual,
                     "ai": ""
-                })
+                }
             
             # Guardar el nuevo mensaje de user
             user_actual = mensaje
@@ -105,34 +98,145 @@ def convertir_a_json(archivo_entrada: str) -> List[Dict[str, str]]:
         elif tipo == "ai":
             # Si hay un user pendiente, crear el objeto completo
             if user_actual is not None:
-                conversaciones.append({
+                yield {
                     "user": user_actual,
                     "ai": mensaje
-                })
+                }
                 user_actual = None
             else:
                 # Si no hay user previo, crear con user vacío
-                conversaciones.append({
+                yield {
                     "user": "",
                     "ai": mensaje
-                })
+                }
     
     # Si queda un user sin ai al final, agregarlo
     if user_actual is not None:
-        conversaciones.append({
+        yield {
             "user": user_actual,
             "ai": ""
-        })
+        }
+
+
+def convertir_a_json(archivo_entrada: str, desde: int = 0) -> List[Dict[str, str]]:
+    """
+    Convierte un archivo _procesado.txt a formato JSON.
+    
+    Args:
+        archivo_entrada: Ruta al archivo _procesado.txt
+        desde: Byte desde el que se lee (inicio de una línea)
+        
+    Returns:
+        Lista de diccionarios con estructura {user: "...", ai: "..."}
+    """
+    print(f"📖 Leyendo archivo: {archivo_entrada}")
+    
+    try:
+        with open(archivo_entrada, 'rb') as binario:
+            binario.seek(desde)
+            with io.TextIOWrapper(binario, encoding='utf-8', errors='ignore') as f:
+                lineas = f.readlines()
+    except Exception as e:
+        print(f"❌ Error al leer el archivo: {str(e)}")
+        return []
+    
+    resultados = (procesar_linea(linea) for linea in lineas)
+    turnos = ((resultado["tipo"], resultado["mensaje"]) for resultado in resultados if resultado is not None)
+    return list(emparejar_turnos(turnos))
+
+
+def escribir_json_atomico(archivo_salida: str, conversaciones: List[Dict[str, str]]):
+    """Escribe el JSON en un temporal y lo reemplaza (no queda a medias si se corta)"""
+    temporal = f"{archivo_salida}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(conversaciones, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, archivo_salida)
+
+
+def anexar_pares_json(archivo_salida: str, nuevos: List[Dict[str, str]]) -> str:
+    """
+    Agrega pares al final de un JSON existente sin modificar los anteriores.
+    
+    Los pares agregados se escriben también en <base>_nuevos.json, para enviar
+    downstream solo lo que no se embebió antes.
+    
+    Returns:
+        Ruta del JSON con los pares nuevos
+    """
+    existentes = []
+    if os.path.exists(archivo_salida):
+        with open(archivo_salida, 'r', encoding='utf-8') as f:
+            existentes = json.load(f)
+    escribir_json_atomico(archivo_salida, existentes + nuevos)
     
-    return conversaciones
+    base, ext = os.path.splitext(archivo_salida)
+    archivo_nuevos = f"{base}_nuevos{ext}"
+    escribir_json_atomico(archivo_nuevos, nuevos)
+    return archivo_nuevos
+
+
+def hash_prefijo(ruta: str, prefijo: int) -> str:
+    """SHA-256 de los primeros `prefijo` bytes del archivo"""
+    sha256 = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        while prefijo > 0:
+            bloque = f.read(min(prefijo, 1024 * 1024))
+            if not bloque:
+                break
+            sha256.update(bloque)
+            prefijo -= len(bloque)
+    return sha256.hexdigest()
+
+
+def pares_confirmados(
+    archivo_entrada: str,
+    desde: int = 0,
+    final: bool = False
+) -> Tuple[List[Dict[str, str]], int]:
+    """
+    Pares de un _procesado.txt desde un byte, sin el último par.
+    
+    El último par puede seguir en una versión posterior del archivo (la pregunta
+    todavía sin respuesta, o una respuesta que continúa), así que no se convierte: se
+    devuelve el byte donde empieza, para volver a leerlo la próxima vez. Con final se
+    convierten todos los pares y se devuelve el fin del archivo.
+    
+    Returns:
+        (pares anteriores al último, byte de inicio del último par o fin del archivo)
+    """
+    print(f"📖 Leyendo archivo: {archivo_entrada}")
+    turnos = []  # (tipo, mensaje, byte de inicio de la línea)
+    posicion = desde
+    with open(archivo_entrada, 'rb') as f:
+        f.seek(desde)
+        for linea in f:
+            resultado = procesar_linea(linea.decode('utf-8', errors='ignore'))
+            if resultado is not None:
+                turnos.append((resultado["tipo"], resultado["mensaje"], posicion))
+            posicion += len(linea)
+    
+    if final or not turnos:
+        return list(emparejar_turnos((tipo, mensaje) for tipo, mensaje, _ in turnos)), posicion
+    corte = len(turnos) - 1
+    if turnos[corte][0] == "ai" and corte > 0 and turnos[corte - 1][0] == "user":
+        corte -= 1
+    pares = list(emparejar_turnos((tipo, mensaje) for tipo, mensaje, _ in turnos[:corte]))
+    return pares, turnos[corte][2]
+
+
+def ruta_punto_control(archivo_salida: str) -> str:
+    """Archivo del punto de control de un JSON, junto a él"""
+    return f"{archivo_salida}.checkpoint.json"
 
 
-def procesar_archivo(archivo_entrada: str) -> Optional[str]:
+def procesar_archivo(archivo_entrada: str, incremental: bool = False, final: bool = False) -> Optional[str]:
     """
     Procesa un archivo _procesado.txt y genera el JSON correspondiente.
     
     Args:
         archivo_entrada: Ruta al archivo _procesado.txt
+        incremental: Convertir solo lo agregado desde el punto de control y anexarlo al JSON
+        final: Con incremental, convertir también el último par
         
     Returns:
         Ruta al archivo JSON generado, o None si hay error
@@ -141,6 +245,9 @@ def procesar_archivo(archivo_entrada: str) -> Optional[str]:
     base, ext = os.path.splitext(archivo_entrada)
     archivo_salida = f"{base}.json"
     
+    if incremental:
+        return procesar_incremental(archivo_entrada, archivo_salida, final)
+    
     # Convertir a JSON
     conversaciones = convertir_a_json(archivo_entrada)
     
@@ -161,6 +268,53 @@ def procesar_archivo(archivo_entrada: str) -> Optional[str]:
         return None
 
 
+def procesar_incremental(archivo_entrada: str, archivo_salida: str, final: bool = False) -> Optional[str]:
+    """
+    Convierte solo las líneas agregadas al _procesado.txt desde la última vez.
+    
+    El punto de control guarda los bytes ya convertidos y su hash. El último par del
+    archivo no se convierte (ver pares_confirmados): el punto de control queda al
+    inicio de ese par y se completa con la próxima versión del archivo (con final se
+    convierte y el punto de control queda al final). Si el inicio del archivo cambió (se regeneró completo), se convierte todo de nuevo.
+    
+    Returns:
+        Ruta al archivo JSON, o None si hay error
+    """
+    ruta_punto = ruta_punto_control(archivo_salida)
+    punto = None
+    if os.path.exists(ruta_punto) and os.path.exists(archivo_salida):
+        with open(ruta_punto, 'r', encoding='utf-8') as f:
+            punto = json.load(f)
+    
+    tamano = os.path.getsize(archivo_entrada)
+    if punto and (punto["offset"] > tamano or hash_prefijo(archivo_entrada, punto["offset"]) != punto["hash"]):
+        print(f"⚠️  {archivo_entrada} cambió desde el punto de control, se convierte completo")
+        punto = None
+    desde = punto["offset"] if punto else 0
+    
+    try:
+        conversaciones, hasta = pares_confirmados(archivo_entrada, desde, final)
+        if punto is None:
+            escribir_json_atomico(archivo_salida, conversaciones)
+            print(f"✅ Archivo JSON creado: {archivo_salida}")
+            print(f"   Conversaciones procesadas: {len(conversaciones)}")
+        else:
+            archivo_nuevos = anexar_pares_json(archivo_salida, conversaciones)
+            print(f"✅ {len(conversaciones)} conversaciones nuevas agregadas a: {archivo_salida}")
+            print(f"   Solo las nuevas: {archivo_nuevos}")
+        if hasta < tamano:
+            print("⏳ El último par queda pendiente hasta la próxima versión del archivo (--final para incluirlo)")
+        
+        temporal = f"{ruta_punto}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({"offset": hasta, "hash": hash_prefijo(archivo_entrada, hasta)}, f, indent=2)
+        os.replace(temporal, ruta_punto)
+        return archivo_salida
+    except Exception as e:
+        print(f"❌ Error al escribir el archivo JSON: {str(e)}")
+        return None
+
+
 def buscar_archivos_procesados(directorio: str = ".") -> List[str]:
     """
     Busca todos los archivos que terminan en "_procesado.txt" en el directorio.
@@ -190,13 +344,20 @@ def buscar_archivos_procesados(directorio: str = ".") -> List[str]:
         return []
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convierte archivos _procesado.txt a JSON user/ai")
+    parser.add_argument("directorio", nargs="?", default=".", help="Directorio a buscar (default: actual)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Convertir solo lo agregado desde el último punto de control y anexarlo al JSON")
+    parser.add_argument("--final", action="store_true",
+                        help="Con --incremental, convertir también el último par en lugar de dejarlo pendiente")
+    return parser.parse_args()
+
+
 def main():
     """Función principal del script"""
-    # Determinar directorio
-    if len(sys.argv) > 1:
-        directorio = sys.argv[1]
-    else:
-        directorio = "."
+    args = parse_args()
+    directorio = args.directorio
     
     print(f"🔍 Buscando archivos _procesado.txt en: {os.path.abspath(directorio)}")
     
@@ -217,7 +378,7 @@ def main():
     archivos_procesados = 0
     for archivo in archivos:
         print(f"\n{'='*60}")
-        resultado = procesar_archivo(archivo)
+        resultado = procesar_archivo(archivo, incremental=args.incremental, final=args.final)
         if resultado:
             archivos_procesados += 1
     
@@ -5,7 +5,7 @@ import gradio as gr
 import chromadb
 from chromadb.utils import embedding_functions
 import requests
-import json
+import jobs
 
 # Configuración desde variables de entorno
 # En Docker, siempre usar el nombre del servicio y puerto interno
@@ -46,6 +46,13 @@ GRADIO_AUTH_PASSWORD = os.getenv("GRADIO_AUTH_PASSWORD", "admin123")
 GRADIO_SERVER_PORT = int(os.getenv("GRADIO_SERVER_PORT", "7860"))
 ENV = os.getenv("ENV", "production")
 DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+# Filas por página en "Listar y Editar" y caracteres del texto mostrados en la tabla
+LISTAR_PAGE_SIZE = int(os.getenv("LISTAR_PAGE_SIZE", "50"))
+LISTAR_TEXTO_MAX = int(os.getenv("LISTAR_TEXTO_MAX", "300"))
+# Segundos entre actualizaciones automáticas de la tabla de trabajos
+JOBS_POLL_SECONDS = float(os.getenv("JOBS_POLL_SECONDS", "2"))
+DESTINO_N8N = "n8n"
+DESTINO_CHROMA = "ChromaDB directo"
 
 # Configuración de n8n
 N8N_HOST = os.getenv("N8N_HOST", "localhost")
@@ -62,9 +69,18 @@ try:
 except:
     N8N_URL = f"{N8N_PROTOCOL}://{N8N_HOST}:{N8N_PORT}/webhook/{N8N_WEBHOOK_PATH}"
 
+# Valores por defecto para emparejar chats de WhatsApp sin procesar (ver jobs.py)
+WHATSAPP_TEXTO_EMPRESA = os.getenv("WHATSAPP_TEXTO_EMPRESA", "")
+WHATSAPP_TELEFONO = os.getenv("WHATSAPP_TELEFONO", "")
+
 print(f"🔧 Configuración n8n:")
 print(f"   N8N_URL: {N8N_URL}")
 
+# API de búsqueda: cachea los resultados de /mmr, así que se le avisa después de cada
+# escritura en ChromaDB desde este panel para que no siga sirviendo lo anterior
+API_URL = os.getenv("API_URL", "http://localhost:8009").rstrip("/")
+API_INVALIDATE_TIMEOUT = float(os.getenv("API_INVALIDATE_TIMEOUT", "2"))
+
 # Configuración del modelo de embedding de OpenAI
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-large")
@@ -194,42 +210,96 @@ for attempt in range(max_retries):
                 print(f"   Error: {error_msg}")
                 raise
 
-try:
-    
-    # Intentar crear o obtener la colección con el modelo de embedding especificado
-    # Si la colección existe con un modelo diferente, eliminarla y crear una nueva
+# Alias de colecciones: mismo registro que el API (src/api/collection_aliases.py).
+# Durante una migración de modelo (src/api/migrate_collection.py) el alias sigue
+# apuntando a la colección anterior y se cambia al terminar.
+CHROMA_ALIAS_COLLECTION = os.getenv("CHROMA_ALIAS_COLLECTION", "collection_aliases")
+CHROMA_ALIAS_CACHE_TTL = float(os.getenv("CHROMA_ALIAS_CACHE_TTL", "5"))
+_alias_cache = {}  # alias -> (colección física, instante)
+_modelos_coleccion = {}  # colección física -> modelo de embedding
+_embedding_functions = {EMBEDDING_MODEL: embedding_function}
+_conflictos_advertidos = set()
+
+def resolver_coleccion(nombre):
+    """Colección física a la que apunta un alias (el mismo nombre si no es un alias)"""
+    ahora = time.monotonic()
+    cache = _alias_cache.get(nombre)
+    if cache and ahora - cache[1] < CHROMA_ALIAS_CACHE_TTL:
+        return cache[0]
+    destino = nombre
     try:
-        if embedding_function:
-            collection = client.get_or_create_collection(
-                name=COLLECTION_NAME,
-                embedding_function=embedding_function
-            )
-        else:
-            collection = client.get_or_create_collection(COLLECTION_NAME)
-    except ValueError as ve:
-        # Si hay conflicto de embedding function, eliminar la colección existente y crear una nueva
-        if "embedding function conflict" in str(ve).lower() or "embedding function already exists" in str(ve).lower():
-            print(f"\n⚠️  La colección '{COLLECTION_NAME}' existe con un modelo de embedding diferente.")
-            print(f"   Eliminando la colección existente para usar el nuevo modelo...")
-            try:
-                client.delete_collection(name=COLLECTION_NAME)
-                print(f"   ✅ Colección eliminada. Creando nueva colección con modelo: {EMBEDDING_MODEL}")
-            except Exception as delete_error:
-                print(f"   ⚠️  No se pudo eliminar la colección: {delete_error}")
-                print(f"   Intenta eliminarla manualmente o usa un nombre de colección diferente.")
-                raise
-            
-            # Crear la nueva colección con el modelo correcto
+        registro = client.get_collection(name=CHROMA_ALIAS_COLLECTION)
+        resultado = registro.get(ids=[nombre], include=["metadatas"])
+        if resultado["ids"]:
+            destino = (resultado["metadatas"][0] or {}).get("target") or nombre
+    except Exception as e:
+        # Sin registro de alias todavía; otro error no se ignora para no escribir en la
+        # colección anterior a un cambio de alias
+        if "does not exist" not in str(e).lower():
+            raise
+    _alias_cache[nombre] = (destino, ahora)
+    return destino
+
+def embedding_function_para(modelo):
+    """Función de embedding de OpenAI para el modelo de una colección"""
+    if not OPENAI_API_KEY:
+        return None
+    if modelo not in _embedding_functions:
+        _embedding_functions[modelo] = embedding_functions.OpenAIEmbeddingFunction(
+            api_key=OPENAI_API_KEY,
+            model_name=modelo
+        )
+    return _embedding_functions[modelo]
+
+def get_or_create_collection():
+    """
+    Obtener o crear la colección, manejando reconexiones
+
+    Si COLLECTION_NAME es un alias se usa la colección a la que apunta, con la
+    función de embedding del modelo con el que se indexó (metadata "embedding_model").
+    """
+    global collection
+    try:
+        nombre = resolver_coleccion(COLLECTION_NAME)
+        modelo = _modelos_coleccion.get(nombre)
+        try:
+            if modelo is None:
+                existente = client.get_collection(name=nombre)
+                modelo = (existente.metadata or {}).get("embedding_model") or EMBEDDING_MODEL
+                _modelos_coleccion[nombre] = modelo
+            ef = embedding_function_para(modelo)
+            collection = client.get_collection(name=nombre, embedding_function=ef) if ef else client.get_collection(name=nombre)
+        except Exception as e:
+            if "embedding function" in str(e).lower():
+                # Conflicto de embedding function: la colección se creó con otra configuración.
+                # Se usa tal cual; para cambiar de modelo ver src/api/migrate_collection.py
+                if nombre not in _conflictos_advertidos:
+                    _conflictos_advertidos.add(nombre)
+                    print(f"⚠️  La colección '{nombre}' existe con otra función de embedding; se usa sin cambios")
+                collection = client.get_collection(name=nombre)
+                return collection
+            # Si no existe, crearla
             if embedding_function:
-                collection = client.get_or_create_collection(
-                    name=COLLECTION_NAME,
-                    embedding_function=embedding_function
+                collection = client.create_collection(
+                    name=nombre,
+                    embedding_function=embedding_function,
+                    metadata={"embedding_model": EMBEDDING_MODEL}
                 )
             else:
-                collection = client.get_or_create_collection(COLLECTION_NAME)
-            print(f"   ✅ Nueva colección creada exitosamente")
-        else:
-            raise
+                collection = client.create_collection(name=nombre)
+            _modelos_coleccion[nombre] = EMBEDDING_MODEL
+            print(f"✅ Colección '{nombre}' creada")
+        return collection
+    except Exception as e:
+        raise Exception(f"Error al obtener/crear colección: {str(e)}")
+
+try:
+    # La colección no se borra aunque exista con otro modelo de embedding: se sigue
+    # usando con su modelo hasta migrarla (ver src/api/migrate_collection.py)
+    collection = get_or_create_collection()
+    if _modelos_coleccion.get(collection.name, EMBEDDING_MODEL) != EMBEDDING_MODEL:
+        print(f"ℹ️  La colección '{collection.name}' usa el modelo {_modelos_coleccion[collection.name]} "
+              f"(EMBEDDING_MODEL={EMBEDDING_MODEL})")
 except Exception as e:
     print(f"\n❌ Error al conectar con ChromaDB en {CHROMA_HOST}:{CHROMA_PORT}")
     print(f"   Error: {str(e)}")
@@ -240,26 +310,26 @@ except Exception as e:
     print(f"   - Si ChromaDB está en Docker, espera unos segundos para que inicie completamente")
     raise
 
-def get_or_create_collection():
-    """Obtener o crear la colección, manejando reconexiones"""
-    global collection
+def invalidar_cache_busquedas():
+    """
+    Invalidar en el API los resultados de /mmr cacheados de la colección
+    
+    Si el API no responde solo se avisa en el log: la escritura ya está hecha y los
+    resultados cacheados vencen solos (RESULT_CACHE_TTL / RESULT_STALE_TTL del API).
+    """
+    if not API_URL:
+        return
     try:
-        # Verificar si la colección existe
-        try:
-            collection = client.get_collection(name=COLLECTION_NAME)
-        except Exception:
-            # Si no existe, crearla
-            if embedding_function:
-                collection = client.create_collection(
-                    name=COLLECTION_NAME,
-                    embedding_function=embedding_function
-                )
-            else:
-                collection = client.create_collection(name=COLLECTION_NAME)
-            print(f"✅ Colección '{COLLECTION_NAME}' creada")
-        return collection
+        response = requests.post(
+            f"{API_URL}/chroma/collections/{COLLECTION_NAME}/cache/invalidate", timeout=API_INVALIDATE_TIMEOUT
+        )
+        response.raise_for_status()
     except Exception as e:
-        raise Exception(f"Error al obtener/crear colección: {str(e)}")
+        print(f"⚠️  No se pudo invalidar la caché de búsquedas del API ({API_URL}): {e}")
+
+def cola_trabajos():
+    """Cola de trabajos de ingesta (se crea y retoma los pendientes en el primer uso)"""
+    return jobs.get_queue(get_or_create_collection, invalidar_cache_busquedas)
 
 def crear_embedding(texto, categoria, source):
     """Crear un nuevo embedding en ChromaDB"""
@@ -270,29 +340,29 @@ def crear_embedding(texto, categoria, source):
         # Asegurar que la colección existe
         collection = get_or_create_collection()
         
+        # Si el mismo texto ya está guardado no se vuelve a pagar el embedding
+        hash_texto = jobs.content_hash(texto)
+        existente = collection.get(where={"content_hash": hash_texto}, limit=1, include=[])
+        if existente.get("ids"):
+            return f"⚠️ Ya existe un embedding con el mismo texto (no se creó otro)\nID: {existente['ids'][0]}", ""
+        
         # Generar ID único
         doc_id = str(uuid.uuid4())
         
         # Preparar metadatos (solo si hay valores)
-        metadata = {}
+        metadata = {"content_hash": hash_texto}
         if categoria and categoria.strip():
             metadata["categoria"] = categoria.strip()
         if source and source.strip():
             metadata["source"] = source.strip()
         
         # Agregar a la colección
-        # ChromaDB no acepta metadatos vacíos, así que solo los pasamos si hay datos
-        if metadata:
-            collection.add(
-                documents=[texto.strip()],
-                metadatas=[metadata],
-                ids=[doc_id]
-            )
-        else:
-            collection.add(
-                documents=[texto.strip()],
-                ids=[doc_id]
-            )
+        collection.add(
+            documents=[texto.strip()],
+            metadatas=[metadata],
+            ids=[doc_id]
+        )
+        invalidar_cache_busquedas()
         
         return f"✅ Embedding creado exitosamente\nID: {doc_id}", ""
     except Exception as e:
@@ -302,31 +372,78 @@ def crear_embedding(texto, categoria, source):
             error_msg += f"\n\n{traceback.format_exc()}"
         return error_msg, texto if texto else ""
 
-def listar():
-    """Listar todos los embeddings"""
+def listar_pagina(pagina=1, texto_filtro="", categoria_filtro=""):
+    """
+    Listar una página de embeddings, filtrando en ChromaDB
+    
+    Solo se piden a ChromaDB los documentos de la página (limit/offset) más uno para
+    saber si hay página siguiente, así que el costo no depende del tamaño de la colección.
+    
+    Args:
+        pagina: Número de página (desde 1)
+        texto_filtro: Texto que debe contener el documento (distingue mayúsculas)
+        categoria_filtro: Categoría exacta
+        
+    Returns:
+        (filas, texto informativo, hay página siguiente)
+    """
     try:
         collection = get_or_create_collection()
-        data = collection.get(include=["documents", "metadatas"])
+        pagina = max(1, int(pagina or 1))
+        texto_filtro = (texto_filtro or "").strip()
+        categoria_filtro = (categoria_filtro or "").strip()
+        
+        data = collection.get(
+            where={"categoria": categoria_filtro} if categoria_filtro else None,
+            where_document={"$contains": texto_filtro} if texto_filtro else None,
+            limit=LISTAR_PAGE_SIZE + 1,
+            offset=(pagina - 1) * LISTAR_PAGE_SIZE,
+            include=["documents", "metadatas"]
+        )
+        ids = data.get("ids") or []
+        hay_siguiente = len(ids) > LISTAR_PAGE_SIZE
         rows = []
-        if data.get("ids"):
-            for i, doc in enumerate(data["documents"]):
-                meta = data["metadatas"][i] if i < len(data["metadatas"]) else {}
-                rows.append([
-                    data["ids"][i],
-                    doc,
-                    meta.get("categoria", "") if meta else "",
-                    meta.get("source", "") if meta else ""
-                ])
-        return rows
+        for i, doc_id in enumerate(ids[:LISTAR_PAGE_SIZE]):
+            doc = data["documents"][i] or ""
+            meta = data["metadatas"][i] if i < len(data["metadatas"]) else {}
+            # La tabla muestra un extracto; el texto completo se carga al editar
+            if len(doc) > LISTAR_TEXTO_MAX:
+                doc = doc[:LISTAR_TEXTO_MAX] + "…"
+            rows.append([
+                doc_id,
+                doc,
+                meta.get("categoria", "") if meta else "",
+                meta.get("source", "") if meta else ""
+            ])
+        
+        desde = (pagina - 1) * LISTAR_PAGE_SIZE
+        if not rows:
+            info = f"Página {pagina} · sin resultados"
+        elif texto_filtro or categoria_filtro:
+            info = f"Página {pagina} · resultados {desde + 1}–{desde + len(rows)} (filtrados)"
+        else:
+            # count() sin filtros es barato: ChromaDB no recorre los documentos
+            info = f"Página {pagina} · documentos {desde + 1}–{desde + len(rows)} de {collection.count()}"
+        return rows, info, hay_siguiente
     except Exception as e:
         error_msg = f"❌ Error al listar: {str(e)}"
         if DEBUG:
             import traceback
             error_msg += f"\n\n{traceback.format_exc()}"
-        return [[error_msg, "", "", ""]]
+        return [[error_msg, "", "", ""]], error_msg, False
 
 def actualizar_embedding(id_doc, texto, categoria, source):
-    """Actualizar un embedding existente"""
+    """
+    Actualizar un embedding existente
+    
+    Compara con lo guardado y solo regenera el embedding (llamada a OpenAI) si el
+    texto cambió de verdad:
+    - Sin cambios: no se escribe nada
+    - Solo cambió categoría/fuente: se actualiza únicamente la metadata
+    - El texto solo cambió en mayúsculas o espacios (mismo content_hash): se guarda el
+      texto nuevo reutilizando el embedding almacenado
+    - El texto cambió: se actualiza el documento y ChromaDB lo vuelve a embeber
+    """
     try:
         if not id_doc or not id_doc.strip():
             return "❌ Error: El ID es requerido"
@@ -336,30 +453,53 @@ def actualizar_embedding(id_doc, texto, categoria, source):
         
         # Asegurar que la colección existe
         collection = get_or_create_collection()
+        id_doc = id_doc.strip()
+        texto = texto.strip()
         
-        # Preparar metadatos (solo si hay valores)
-        metadata = {}
-        if categoria and categoria.strip():
-            metadata["categoria"] = categoria.strip()
-        if source and source.strip():
-            metadata["source"] = source.strip()
+        actual = collection.get(ids=[id_doc], include=["documents", "metadatas"])
+        if not actual.get("ids"):
+            return f"⚠️ No se encontró un embedding con ID: {id_doc}"
+        texto_actual = actual["documents"][0] if actual.get("documents") else None
+        meta_actual = (actual["metadatas"][0] if actual.get("metadatas") else None) or {}
+        
+        # Metadatos deseados. update combina la metadata con la guardada:
+        # None elimina los campos que se dejaron vacíos
+        hash_texto = jobs.content_hash(texto)
+        metadata = {
+            "content_hash": hash_texto,
+            "categoria": categoria.strip() if categoria and categoria.strip() else None,
+            "source": source.strip() if source and source.strip() else None,
+        }
+        cambios_meta = {
+            clave: valor for clave, valor in metadata.items()
+            if meta_actual.get(clave) != valor
+        }
         
-        # Actualizar usando upsert (actualiza si existe, crea si no)
-        # ChromaDB requiere metadatos, así que siempre pasamos al menos un dict vacío válido
-        # Pero primero eliminamos el documento y lo recreamos si no hay metadatos
-        if metadata:
+        if texto == texto_actual:
+            if not cambios_meta:
+                return f"ℹ️ Sin cambios\nID: {id_doc}"
+            collection.update(ids=[id_doc], metadatas=[cambios_meta])
+            invalidar_cache_busquedas()
+            return f"✅ Metadatos actualizados (sin regenerar el embedding)\nID: {id_doc}"
+        
+        if texto_actual is not None and jobs.content_hash(texto_actual) == hash_texto:
+            # Mismo contenido normalizado: el embedding guardado sigue sirviendo
+            guardado = collection.get(ids=[id_doc], include=["embeddings"])
             collection.update(
-                ids=[id_doc.strip()],
-                documents=[texto.strip()],
-                metadatas=[metadata]
-            )
-        else:
-            # Si no hay metadatos, eliminamos y recreamos sin metadatos
-            collection.delete(ids=[id_doc.strip()])
-            collection.add(
-                documents=[texto.strip()],
-                ids=[id_doc.strip()]
+                ids=[id_doc],
+                documents=[texto],
+                metadatas=[cambios_meta or metadata],
+                embeddings=[guardado["embeddings"][0]]
             )
+            invalidar_cache_busquedas()
+            return f"✅ Texto actualizado (sin regenerar el embedding)\nID: {id_doc}"
+        
+        collection.update(
+            ids=[id_doc],
+            documents=[texto],
+            metadatas=[metadata]
+        )
+        invalidar_cache_busquedas()
         
         return f"✅ Embedding actualizado exitosamente\nID: {id_doc}"
     except Exception as e:
@@ -377,6 +517,7 @@ def eliminar_embedding(id_doc):
         
         collection = get_or_create_collection()
         collection.delete(ids=[id_doc.strip()])
+        invalidar_cache_busquedas()
         return f"✅ Embedding eliminado exitosamente\nID: {id_doc}"
     except Exception as e:
         error_msg = f"❌ Error al eliminar: {str(e)}"
@@ -424,116 +565,79 @@ def obtener_embedding(id_doc):
             error_msg += f"\n\n{traceback.format_exc()}"
         return "", "", "", error_msg
 
-def procesar_archivo_whatsapp(archivo, n8n_url):
-    """Procesar archivo txt o JSON de WhatsApp y enviarlo a n8n"""
+def encolar_archivo_whatsapp(archivo, n8n_url, destino, categoria, texto_empresa, telefono):
+    """
+    Encolar un archivo txt, JSON o .zip de WhatsApp para procesarlo en segundo plano
+    
+    El trabajo corre en la cola local (jobs.py): se envía a n8n por lotes o se embebe
+    y guarda directamente en ChromaDB. Con el texto de la empresa y el teléfono, un chat
+    sin procesar se convierte en pares user/ai igual que con whatsapp_pairs.py. El
+    estado se consulta con estado_trabajos().
+    """
     try:
         if archivo is None:
             return "❌ Error: No se ha seleccionado ningún archivo"
         
-        if not n8n_url or not n8n_url.strip():
-            return "❌ Error: Debes ingresar la URL de n8n"
-        
-        # Validar que la URL sea válida
-        url_limpia = n8n_url.strip()
-        if not url_limpia.startswith(('http://', 'https://')):
-            return "❌ Error: La URL debe comenzar con http:// o https://"
-        
         # Obtener la ruta del archivo (Gradio con type="filepath" devuelve una cadena)
         file_path = archivo if isinstance(archivo, str) else (archivo.name if hasattr(archivo, 'name') else str(archivo))
         
         if not file_path or not os.path.exists(file_path):
             return "❌ Error: El archivo no existe o no se pudo acceder"
-        
-        # Detectar tipo de archivo
-        filename = os.path.basename(file_path)
-        es_json = filename.lower().endswith('.json')
-        
-        # Leer el contenido del archivo
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                contenido = f.read()
-        except UnicodeDecodeError:
-            # Intentar con diferentes codificaciones
-            try:
-                with open(file_path, 'r', encoding='latin-1') as f:
-                    contenido = f.read()
-            except Exception as e:
-                return f"❌ Error al leer el archivo: {str(e)}"
-        except Exception as e:
-            return f"❌ Error al leer el archivo: {str(e)}"
-        
-        if not contenido or not contenido.strip():
+        if os.path.getsize(file_path) == 0:
             return "❌ Error: El archivo está vacío"
         
-        # Si es JSON, validar y procesar
-        if es_json:
-            try:
-                datos_json = json.loads(contenido)
-                # Validar estructura básica
-                if not isinstance(datos_json, list):
-                    return "❌ Error: El JSON debe ser un array de objetos"
-                
-                # Preparar el payload para n8n con datos JSON
-                payload = {
-                    "file_content": contenido,
-                    "filename": filename,
-                    "file_type": "json",
-                    "data": datos_json  # Incluir los datos parseados también
-                }
-            except json.JSONDecodeError as e:
-                return f"❌ Error: El archivo JSON no es válido: {str(e)}"
-        else:
-            # Preparar el payload para n8n con archivo de texto
-            payload = {
-                "file_content": contenido,
-                "filename": filename,
-                "file_type": "txt"
-            }
-        
-        # Hacer POST a n8n
-        try:
-            response = requests.post(
-                url_limpia,
-                json=payload,
-                timeout=30,
-                headers={"Content-Type": "application/json"}
-            )
-            
-            # Verificar respuesta
-            if response.status_code == 200:
-                try:
-                    result = response.json()
-                    tipo_archivo = "JSON" if es_json else "TXT"
-                    return f"✅ Archivo {tipo_archivo} procesado exitosamente\n\nURL: {url_limpia}\nArchivo: {filename}\n\nRespuesta de n8n:\n{json.dumps(result, indent=2, ensure_ascii=False)}"
-                except:
-                    return f"✅ Archivo procesado exitosamente\n\nURL: {url_limpia}\nArchivo: {filename}\n\nRespuesta de n8n:\n{response.text}"
-            else:
-                error_msg = f"❌ Error al enviar a n8n (código {response.status_code})\n\nURL: {url_limpia}\nArchivo: {filename}"
-                try:
-                    error_detail = response.json()
-                    error_msg += f"\n\nDetalle: {error_detail}"
-                except:
-                    error_msg += f"\n\nRespuesta: {response.text}"
-                return error_msg
-                
-        except requests.exceptions.Timeout:
-            return f"❌ Error: Timeout al conectar con n8n en {url_limpia}"
-        except requests.exceptions.ConnectionError:
-            return f"❌ Error: No se pudo conectar con n8n en {url_limpia}\n\nVerifica que n8n esté corriendo y que la URL sea correcta."
-        except Exception as e:
-            error_msg = f"❌ Error al enviar a n8n: {str(e)}\n\nURL: {url_limpia}"
-            if DEBUG:
-                import traceback
-                error_msg += f"\n\n{traceback.format_exc()}"
-            return error_msg
-            
+        params = {}
+        if destino == DESTINO_N8N:
+            if not n8n_url or not n8n_url.strip():
+                return "❌ Error: Debes ingresar la URL de n8n"
+            # Validar que la URL sea válida
+            url_limpia = n8n_url.strip()
+            if not url_limpia.startswith(('http://', 'https://')):
+                return "❌ Error: La URL debe comenzar con http:// o https://"
+            params["n8n_url"] = url_limpia
+        if categoria and categoria.strip():
+            params["categoria"] = categoria.strip()
+        if texto_empresa and texto_empresa.strip() and telefono and telefono.strip():
+            params["texto_empresa"] = texto_empresa.strip()
+            params["telefono"] = telefono.strip()
+        
+        filename = os.path.basename(file_path)
+        job_id = cola_trabajos().submit(
+            file_path, filename, "n8n" if destino == DESTINO_N8N else "chroma", params
+        )
+        return f"📥 Archivo encolado\n\nTrabajo: {job_id}\nArchivo: {filename}\nDestino: {destino}\n\nEl avance se muestra en la tabla de trabajos."
     except Exception as e:
-        error_msg = f"❌ Error al procesar archivo: {str(e)}"
+        error_msg = f"❌ Error al encolar archivo: {str(e)}"
         if DEBUG:
             import traceback
             error_msg += f"\n\n{traceback.format_exc()}"
         return error_msg
 
+def estado_trabajos():
+    """Filas de la tabla de trabajos recientes y detalle de errores del último con errores"""
+    try:
+        filas = []
+        detalle = ""
+        for job in cola_trabajos().recent():
+            total = job["total"]
+            progreso = f"{job['procesados'] + job['fallidos']}/{total}" if total else "-"
+            filas.append([
+                job["id"],
+                job["filename"],
+                job["destino"],
+                job["estado"],
+                progreso,
+                job["docs_por_segundo"] if job["docs_por_segundo"] is not None else "",
+                job["fallidos"],
+            ])
+            error_fatal = (job["resultado"] or {}).get("error")
+            if not detalle and (job["errores"] or error_fatal):
+                lineas = ([error_fatal] if error_fatal else []) + job["errores"][-5:]
+                detalle = f"Trabajo {job['id']}:\n" + "\n".join(lineas)
+        return filas, detalle
+    except Exception as e:
+        return [], f"❌ Error al consultar trabajos: {str(e)}"
+
 with gr.Blocks(title="Panel Admin - ChromaDB") as demo:
     gr.Markdown("# 🗄️ Panel Admin – ChromaDB")
     gr.Markdown("Gestiona embeddings y documentos en ChromaDB")
@@ -582,10 +686,22 @@ with gr.Blocks(title="Panel Admin - ChromaDB") as demo:
         
         # Pestaña 2: Listar y Editar
         with gr.Tab("📋 Listar y Editar"):
-            gr.Markdown("### Listar todos los embeddings")
+            gr.Markdown("### Listar embeddings")
             
             with gr.Row():
-                listar_btn = gr.Button("🔄 Actualizar Lista", variant="secondary")
+                filtro_texto = gr.Textbox(
+                    label="Buscar en el texto",
+                    placeholder="Contiene... (distingue mayúsculas)",
+                    lines=1,
+                    scale=3
+                )
+                filtro_categoria = gr.Textbox(
+                    label="Categoría",
+                    placeholder="Ej: precio",
+                    lines=1,
+                    scale=1
+                )
+                listar_btn = gr.Button("🔄 Actualizar Lista", variant="secondary", scale=1)
             
             tabla = gr.Dataframe(
                 headers=["ID", "Texto", "Categoria", "Source"],
@@ -595,15 +711,48 @@ with gr.Blocks(title="Panel Admin - ChromaDB") as demo:
                 label="Lista de Embeddings (puedes seleccionar y copiar el ID directamente de la tabla)"
             )
             
-            # Variable para mantener los datos de la tabla
+            with gr.Row():
+                anterior_btn = gr.Button("◀ Anterior", interactive=False, scale=1)
+                pagina_info = gr.Markdown("")
+                siguiente_btn = gr.Button("Siguiente ▶", interactive=False, scale=1)
+            
+            # Solo se guardan las filas de la página visible (para leer el ID seleccionado)
             tabla_data = gr.State(value=None)
+            pagina_actual = gr.State(value=1)
             
-            def listar_con_datos():
-                """Listar y guardar los datos para poder acceder al ID seleccionado"""
-                data = listar()
-                return data, data
+            def cargar_pagina(pagina, texto_filtro, categoria_filtro):
+                """Cargar una página y actualizar la navegación"""
+                pagina = max(1, int(pagina or 1))
+                rows, info, hay_siguiente = listar_pagina(pagina, texto_filtro, categoria_filtro)
+                if not rows and pagina > 1:
+                    # Se eliminó el último documento de la página: volver a la anterior
+                    pagina -= 1
+                    rows, info, hay_siguiente = listar_pagina(pagina, texto_filtro, categoria_filtro)
+                return (
+                    rows,
+                    rows,
+                    pagina,
+                    info,
+                    gr.update(interactive=pagina > 1),
+                    gr.update(interactive=hay_siguiente)
+                )
             
-            listar_btn.click(listar_con_datos, outputs=[tabla, tabla_data])
+            salidas_pagina = [tabla, tabla_data, pagina_actual, pagina_info, anterior_btn, siguiente_btn]
+            filtros = [filtro_texto, filtro_categoria]
+            
+            listar_btn.click(lambda t, c: cargar_pagina(1, t, c), inputs=filtros, outputs=salidas_pagina)
+            filtro_texto.submit(lambda t, c: cargar_pagina(1, t, c), inputs=filtros, outputs=salidas_pagina)
+            filtro_categoria.submit(lambda t, c: cargar_pagina(1, t, c), inputs=filtros, outputs=salidas_pagina)
+            anterior_btn.click(
+                lambda p, t, c: cargar_pagina(p - 1, t, c),
+                inputs=[pagina_actual] + filtros,
+                outputs=salidas_pagina
+            )
+            siguiente_btn.click(
+                lambda p, t, c: cargar_pagina(p + 1, t, c),
+                inputs=[pagina_actual] + filtros,
+                outputs=salidas_pagina
+            )
             
             gr.Markdown("---")
             gr.Markdown("### Editar Embedding")
@@ -673,8 +822,9 @@ with gr.Blocks(title="Panel Admin - ChromaDB") as demo:
                 inputs=[buscar_id, edit_texto, edit_categoria, edit_source],
                 outputs=[resultado_editar]
             ).then(
-                fn=listar,
-                outputs=[tabla]
+                fn=cargar_pagina,
+                inputs=[pagina_actual] + filtros,
+                outputs=salidas_pagina
             )
             
             eliminar_btn.click(
@@ -685,14 +835,15 @@ with gr.Blocks(title="Panel Admin - ChromaDB") as demo:
                 fn=lambda: ("", "", "", ""),
                 outputs=[buscar_id, edit_texto, edit_categoria, edit_source]
             ).then(
-                fn=listar,
-                outputs=[tabla]
+                fn=cargar_pagina,
+                inputs=[pagina_actual] + filtros,
+                outputs=salidas_pagina
             )
         
         # Pestaña 3: Subir archivo WhatsApp
         with gr.Tab("📱 Subir WhatsApp"):
             gr.Markdown("### Subir archivo de WhatsApp")
-            gr.Markdown("Sube un archivo de texto (.txt) o JSON (.json) exportado de WhatsApp para procesarlo con n8n")
+            gr.Markdown("Sube un archivo de texto (.txt), JSON (.json) o el .zip exportado de WhatsApp (se lee solo el chat, sin la multimedia). Se procesa en segundo plano (con n8n o directo a ChromaDB) y el avance se ve en la tabla de trabajos")
             
             # JavaScript para manejar localStorage - se ejecuta después de que se renderice el componente
             gr.HTML("""
@@ -805,25 +956,73 @@ with gr.Blocks(title="Panel Admin - ChromaDB") as demo:
                     gr.Markdown("💾 La URL se guarda automáticamente en tu navegador (localStorage)")
             
             archivo_input = gr.File(
-                label="Archivo de WhatsApp (TXT o JSON)",
-                file_types=[".txt", ".json"],
+                label="Archivo de WhatsApp (TXT, JSON o ZIP exportado)",
+                file_types=[".txt", ".json", ".zip"],
                 type="filepath"
             )
             
-            procesar_btn = gr.Button("🚀 Procesar y Enviar a n8n", variant="primary")
+            with gr.Row():
+                destino_input = gr.Radio(
+                    choices=[DESTINO_N8N, DESTINO_CHROMA],
+                    value=DESTINO_N8N,
+                    label="Destino",
+                    info="Los chats sin procesar se convierten en pares user/ai si se indican la empresa y el teléfono"
+                )
+                categoria_whatsapp = gr.Textbox(
+                    label="Categoría (opcional, solo ChromaDB directo)",
+                    lines=1
+                )
+            
+            with gr.Row():
+                texto_empresa_input = gr.Textbox(
+                    label="Texto de la empresa (chat sin procesar)",
+                    placeholder="Ej: Limpieza de pozos:",
+                    lines=1,
+                    value=WHATSAPP_TEXTO_EMPRESA
+                )
+                telefono_input = gr.Textbox(
+                    label="Teléfono del cliente (chat sin procesar)",
+                    placeholder="Ej: +591 69023378",
+                    lines=1,
+                    value=WHATSAPP_TELEFONO
+                )
+            
+            procesar_btn = gr.Button("🚀 Encolar archivo", variant="primary")
             resultado_whatsapp = gr.Textbox(
                 label="Resultado",
                 interactive=False,
-                lines=10
+                lines=6
             )
             
+            gr.Markdown("### Trabajos")
+            trabajos_tabla = gr.Dataframe(
+                headers=["Trabajo", "Archivo", "Destino", "Estado", "Progreso", "Docs/s", "Errores"],
+                interactive=False,
+                wrap=True
+            )
+            trabajos_errores = gr.Textbox(label="Últimos errores", interactive=False, lines=4)
+            refrescar_btn = gr.Button("🔄 Actualizar estado", variant="secondary")
+            
             procesar_btn.click(
-                fn=procesar_archivo_whatsapp,
-                inputs=[archivo_input, n8n_url_input],
+                fn=encolar_archivo_whatsapp,
+                inputs=[archivo_input, n8n_url_input, destino_input, categoria_whatsapp, texto_empresa_input,
+                        telefono_input],
                 outputs=[resultado_whatsapp]
+            ).then(
+                fn=estado_trabajos,
+                outputs=[trabajos_tabla, trabajos_errores]
             )
+            refrescar_btn.click(fn=estado_trabajos, outputs=[trabajos_tabla, trabajos_errores])
+    
+    # La tabla de trabajos se refresca sola mientras la página está abierta
+    if hasattr(gr, "Timer"):
+        gr.Timer(JOBS_POLL_SECONDS).tick(fn=estado_trabajos, outputs=[trabajos_tabla, trabajos_errores])
+    else:
+        demo.load(fn=estado_trabajos, outputs=[trabajos_tabla, trabajos_errores], every=JOBS_POLL_SECONDS)
 
 if __name__ == "__main__":
+    # Retomar los trabajos que quedaron pendientes antes del reinicio
+    cola_trabajos()
     demo.launch(
         server_name="0.0.0.0",
         server_port=GRADIO_SERVER_PORT,
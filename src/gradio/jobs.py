@@ -0,0 +1,447 @@
+"""
+Cola local de trabajos de ingesta para el panel Gradio
+
+Los archivos de WhatsApp se procesan en segundo plano en lugar de dentro del handler
+del botón: el usuario encola el archivo, la UI consulta el estado y un pool acotado
+de threads (JOBS_WORKERS) ejecuta el pipeline:
+
+    leer → armar pares user/ai → embeber + upsert en ChromaDB   (destino "chroma")
+    leer → armar pares user/ai → enviar a n8n por lotes           (destino "n8n")
+
+Los chats de WhatsApp sin procesar (.txt o .zip exportado) se emparejan con el parser
+de whatsapp_pairs.py, con el texto de la empresa y el teléfono indicados en el panel.
+
+Los trabajos y una copia del archivo se guardan en JOBS_DIR (SQLite), así que
+sobreviven a un reinicio: al arrancar, los trabajos pendientes o interrumpidos se
+retoman desde el último lote confirmado (checkpoint). De una exportación .zip de
+WhatsApp solo se copia el .txt del chat (la multimedia no se extrae).
+"""
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import unicodedata
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+# Parser de WhatsApp de src/ (en la imagen de Gradio se copia junto a app.py)
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from whatsapp_pairs import pares_whatsapp
+
+JOBS_DIR = os.getenv("JOBS_DIR", os.path.join(tempfile.gettempdir(), "n8npozos_jobs"))
+# Trabajos procesados en paralelo
+JOBS_WORKERS = int(os.getenv("JOBS_WORKERS", "2"))
+# Pares por lote: un request de embeddings + un upsert, o un POST a n8n
+JOBS_BATCH_SIZE = int(os.getenv("JOBS_BATCH_SIZE", "100"))
+# Timeout de cada POST a n8n (segundos) y reintentos si no se pudo conectar. Un POST
+# que llegó a n8n (timeout de lectura, 5xx) no se reintenta: el flujo embebe e inserta,
+# y repetirlo duplicaría el lote
+JOBS_N8N_TIMEOUT = float(os.getenv("JOBS_N8N_TIMEOUT", "120"))
+JOBS_N8N_RETRIES = int(os.getenv("JOBS_N8N_RETRIES", "3"))
+
+QUEUED = "en_cola"
+RUNNING = "procesando"
+DONE = "completado"
+FAILED = "error"
+
+# Errores por lote que se conservan en el trabajo
+_MAX_ERRORES = 20
+
+
+def content_hash(texto: str) -> str:
+    """
+    Hash del texto normalizado (NFC, minúsculas, espacios colapsados)
+
+    Mismo criterio que la ingesta del API (src/api/ingestion.py, que se copia aparte en
+    su imagen): se guarda en la metadata "content_hash" del panel y de la cola para
+    detectar textos repetidos sin llamar a OpenAI.
+    """
+    normalizado = " ".join(unicodedata.normalize("NFC", texto).casefold().split())
+    return hashlib.sha256(normalizado.encode("utf-8")).hexdigest()
+
+
+def es_zip(path: str) -> bool:
+    """True si el archivo es una exportación .zip de WhatsApp (chat + multimedia)"""
+    return path.lower().endswith(".zip") and zipfile.is_zipfile(path)
+
+
+def miembro_chat(archivo_zip: zipfile.ZipFile) -> zipfile.ZipInfo:
+    """
+    .txt del chat dentro del .zip, mismo criterio que process_whatsapp.miembro_chat
+
+    Prefiere "_chat.txt" (iOS) o "Chat de WhatsApp con ....txt" (Android); si no, el
+    .txt más grande.
+
+    Raises:
+        ValueError: Si el .zip no tiene ningún .txt
+    """
+    textos = [
+        info for info in archivo_zip.infolist()
+        if not info.is_dir() and info.filename.lower().endswith(".txt") and not info.filename.startswith("__MACOSX/")
+    ]
+    if not textos:
+        raise ValueError("El .zip no contiene un chat de WhatsApp (.txt)")
+
+    def prioridad(info: zipfile.ZipInfo) -> Tuple[bool, int]:
+        nombre = os.path.basename(info.filename).lower()
+        return nombre == "_chat.txt" or nombre.startswith(("chat de whatsapp", "whatsapp chat")), info.file_size
+
+    return max(textos, key=prioridad)
+
+
+def copiar_chat(path: str, destino: str):
+    """Copiar el archivo, o de un .zip solo el .txt del chat descomprimido en streaming"""
+    if not es_zip(path):
+        shutil.copyfile(path, destino)
+        return
+    with zipfile.ZipFile(path) as archivo_zip, archivo_zip.open(miembro_chat(archivo_zip)) as origen, \
+            open(destino, "wb") as salida:
+        shutil.copyfileobj(origen, salida, 1024 * 1024)
+
+
+def leer_archivo(path: str) -> str:
+    """Leer el archivo (o el chat de un .zip) como UTF-8 y, si falla, como latin-1"""
+    if es_zip(path):
+        with zipfile.ZipFile(path) as archivo_zip:
+            datos = archivo_zip.read(miembro_chat(archivo_zip))
+        try:
+            return datos.decode("utf-8")
+        except UnicodeDecodeError:
+            return datos.decode("latin-1")
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except UnicodeDecodeError:
+        with open(path, "r", encoding="latin-1") as f:
+            return f.read()
+
+
+def armar_pares(contenido: str, es_json: bool) -> Optional[List[Dict[str, str]]]:
+    """
+    Convertir el contenido en pares {"user", "ai"}
+
+    - JSON: array de objetos con "user" y/o "ai" (salida de convert_to_json.py)
+    - TXT procesado: líneas "user: ..." / "ai: ..." (salida de process_whatsapp.py),
+      emparejadas con la misma lógica que convert_to_json.py
+
+    Returns:
+        Lista de pares, o None si el contenido no tiene ese formato (ej: un chat de
+        WhatsApp sin procesar, ver pares_chat)
+
+    Raises:
+        ValueError: Si el JSON no es válido o no es un array
+    """
+    if es_json:
+        datos = json.loads(contenido)
+        if not isinstance(datos, list):
+            raise ValueError("El JSON debe ser un array de objetos")
+        if not all(isinstance(d, dict) and ("user" in d or "ai" in d) for d in datos):
+            return None
+        return [{"user": str(d.get("user") or ""), "ai": str(d.get("ai") or "")} for d in datos]
+
+    pares: List[Dict[str, str]] = []
+    user_actual = None
+    reconocidas = 0
+    for linea in contenido.splitlines():
+        linea = linea.strip()
+        if linea.startswith("user: "):
+            reconocidas += 1
+            if user_actual is not None:
+                pares.append({"user": user_actual, "ai": ""})
+            user_actual = linea[6:].strip().replace("\\n", "\n")
+        elif linea.startswith("ai: "):
+            reconocidas += 1
+            pares.append({"user": user_actual or "", "ai": linea[4:].strip().replace("\\n", "\n")})
+            user_actual = None
+    if user_actual is not None:
+        pares.append({"user": user_actual, "ai": ""})
+    return pares if reconocidas else None
+
+
+def pares_chat(path: str, texto_empresa: str, telefono: str) -> List[Dict[str, str]]:
+    """
+    Pares {"user", "ai"} de un chat de WhatsApp sin procesar, con el mismo resultado
+    que whatsapp_pairs.py (el chat se lee en streaming)
+
+    Raises:
+        ValueError: Si el chat no tiene mensajes de la empresa ni del cliente
+    """
+    pares = list(pares_whatsapp(path, texto_empresa, telefono))
+    if not pares:
+        raise ValueError(
+            f"No se encontraron pares user/ai en el chat. Revisa el texto de la empresa ('{texto_empresa}') "
+            f"y el teléfono ('{telefono}')"
+        )
+    return pares
+
+
+def documento_de_par(par: Dict[str, str]) -> str:
+    """Texto que se embebe por cada par (mismo formato que los archivos _procesado.txt)"""
+    return f"user: {par['user']}\nai: {par['ai']}".strip()
+
+
+def _sin_conectar(error: requests.exceptions.ConnectionError) -> bool:
+    """True si el error fue al abrir la conexión, antes de enviar el request"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    motivo = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(motivo, NewConnectionError)
+
+
+class JobQueue:
+    """Cola de trabajos persistida en SQLite con un pool acotado de threads"""
+
+    def __init__(
+        self, directorio: str, workers: int, get_collection: Callable[[], Any],
+        on_write: Optional[Callable[[], None]] = None
+    ):
+        self.directorio = directorio
+        self.get_collection = get_collection
+        # Se llama después de cada lote escrito en ChromaDB (invalida la caché de búsquedas del API)
+        self.on_write = on_write
+        os.makedirs(directorio, exist_ok=True)
+        self.db_path = os.path.join(directorio, "jobs.sqlite3")
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="jobs")
+        with self._conn() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " id TEXT PRIMARY KEY, filename TEXT, path TEXT, destino TEXT, params TEXT,"
+                " estado TEXT, total INTEGER, procesados INTEGER DEFAULT 0, fallidos INTEGER DEFAULT 0,"
+                " checkpoint INTEGER DEFAULT 0, errores TEXT DEFAULT '[]', resultado TEXT,"
+                " creado REAL, iniciado REAL, terminado REAL)"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _update(self, job_id: str, **campos):
+        columnas = ", ".join(f"{campo} = ?" for campo in campos)
+        with self._lock, self._conn() as conn:
+            conn.execute(f"UPDATE jobs SET {columnas} WHERE id = ?", (*campos.values(), job_id))
+
+    # ------------------------------------------------------------------ API
+
+    def submit(self, archivo: str, filename: str, destino: str, params: Dict[str, Any]) -> str:
+        """
+        Encolar un archivo (se copia a JOBS_DIR: el temporal de Gradio puede borrarse)
+
+        De un .zip solo se guarda el .txt del chat.
+
+        Returns:
+            ID del trabajo
+
+        Raises:
+            ValueError: Si el .zip no contiene un chat
+        """
+        job_id = uuid.uuid4().hex[:12]
+        destino_path = os.path.join(self.directorio, f"{job_id}_{os.path.basename(filename)}")
+        if es_zip(archivo):
+            destino_path = f"{os.path.splitext(destino_path)[0]}.txt"
+        copiar_chat(archivo, destino_path)
+        with self._lock, self._conn() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, filename, path, destino, params, estado, creado) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, filename, destino_path, destino, json.dumps(params), QUEUED, time.time())
+            )
+        self._executor.submit(self._run, job_id)
+        return job_id
+
+    def resume(self) -> int:
+        """Re-encolar los trabajos pendientes o interrumpidos por un reinicio"""
+        with self._conn() as conn:
+            ids = [row["id"] for row in conn.execute(
+                "SELECT id FROM jobs WHERE estado IN (?, ?) ORDER BY creado", (QUEUED, RUNNING)
+            )]
+        for job_id in ids:
+            self._update(job_id, estado=QUEUED)
+            self._executor.submit(self._run, job_id)
+        if ids:
+            print(f"🔁 Retomando {len(ids)} trabajos de ingesta pendientes")
+        return len(ids)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._conn() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._as_dict(row) if row else None
+
+    def recent(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._conn() as conn:
+            rows = conn.execute("SELECT * FROM jobs ORDER BY creado DESC LIMIT ?", (limit,)).fetchall()
+        return [self._as_dict(row) for row in rows]
+
+    @staticmethod
+    def _as_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        job = dict(row)
+        job["errores"] = json.loads(job["errores"] or "[]")
+        job["resultado"] = json.loads(job["resultado"]) if job["resultado"] else None
+        fin = job["terminado"] or time.time()
+        elapsed = fin - job["iniciado"] if job["iniciado"] else 0
+        job["docs_por_segundo"] = round(job["procesados"] / elapsed, 1) if elapsed > 0 else None
+        return job
+
+    # ------------------------------------------------------------- pipeline
+
+    def _run(self, job_id: str):
+        job = self.get(job_id)
+        if job is None or job["estado"] not in (QUEUED, RUNNING):
+            return
+        self._update(job_id, estado=RUNNING, iniciado=job["iniciado"] or time.time())
+        try:
+            resultado = self._pipeline(job)
+            # Si fallaron todos los lotes el trabajo no se da por completado
+            estado = FAILED if job["fallidos"] and not job["procesados"] else DONE
+            self._update(job_id, estado=estado, terminado=time.time(), resultado=json.dumps(resultado, ensure_ascii=False))
+        except Exception as e:
+            print(f"❌ Trabajo {job_id} ({job['filename']}) falló: {e}")
+            self._update(job_id, estado=FAILED, terminado=time.time(), resultado=json.dumps({"error": str(e)}))
+
+    def _pipeline(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        params = json.loads(job["params"] or "{}")
+        es_json = job["filename"].lower().endswith(".json")
+        contenido = leer_archivo(job["path"])
+        if not contenido.strip():
+            raise ValueError("El archivo está vacío")
+        pares = armar_pares(contenido, es_json)
+        if pares is None and not es_json and params.get("texto_empresa") and params.get("telefono"):
+            pares = pares_chat(job["path"], params["texto_empresa"], params["telefono"])
+
+        if job["destino"] == "chroma":
+            if pares is None:
+                raise ValueError(
+                    "El archivo no tiene pares user/ai. Para un chat de WhatsApp sin procesar indica el texto "
+                    "de la empresa y el teléfono"
+                )
+            return self._a_chroma(job, pares, params)
+        return self._a_n8n(job, contenido, pares, params)
+
+    def _lotes(self, job: Dict[str, Any], total: int):
+        """Recorrer los lotes pendientes desde el checkpoint, registrando el avance"""
+        self._update(job["id"], total=total)
+        for inicio in range(job["checkpoint"], total, JOBS_BATCH_SIZE):
+            yield inicio, min(inicio + JOBS_BATCH_SIZE, total)
+
+    def _avance(self, job: Dict[str, Any], fin: int, procesados: int, fallidos: int, error: Optional[str] = None):
+        job["procesados"] += procesados
+        job["fallidos"] += fallidos
+        campos = {"checkpoint": fin, "procesados": job["procesados"], "fallidos": job["fallidos"]}
+        if error:
+            job["errores"] = (job["errores"] + [error])[-_MAX_ERRORES:]
+            campos["errores"] = json.dumps(job["errores"], ensure_ascii=False)
+        self._update(job["id"], **campos)
+
+    def _a_chroma(self, job: Dict[str, Any], pares: List[Dict[str, str]], params: Dict[str, Any]) -> Dict[str, Any]:
+        collection = self.get_collection()
+        omitidos = 0
+        for inicio, fin in self._lotes(job, len(pares)):
+            documentos = {}
+            for par in pares[inicio:fin]:
+                texto = documento_de_par(par)
+                if texto:
+                    documentos.setdefault(content_hash(texto), texto)
+            try:
+                # Textos ya guardados (mismo hash) no se vuelven a embeber
+                existentes = collection.get(
+                    where={"content_hash": {"$in": list(documentos)}}, include=["metadatas"]
+                )["metadatas"] or []
+                for meta in existentes:
+                    documentos.pop((meta or {}).get("content_hash"), None)
+                omitidos += fin - inicio - len(documentos)
+                if documentos:
+                    metadata = {"source": params.get("source") or job["filename"]}
+                    if params.get("categoria"):
+                        metadata["categoria"] = params["categoria"]
+                    # Un solo upsert por lote: la función de embedding hace un request a OpenAI
+                    collection.upsert(
+                        ids=[h[:32] for h in documentos],
+                        documents=list(documentos.values()),
+                        metadatas=[dict(metadata, content_hash=h) for h in documentos]
+                    )
+                    if self.on_write:
+                        self.on_write()
+                self._avance(job, fin, fin - inicio, 0)
+            except Exception as e:
+                self._avance(job, fin, 0, fin - inicio, f"Pares {inicio + 1}-{fin}: {e}")
+        return {"pares": len(pares), "omitidos_existentes": omitidos}
+
+    def _post_n8n(self, url: str, payload: Dict[str, Any]) -> requests.Response:
+        """
+        POST a n8n, reintentando solo si no se pudo conectar (el request no se envió)
+
+        Un timeout de lectura o un 5xx se devuelven sin reintentar: n8n puede haber
+        procesado el lote (o parte) y el flujo no es idempotente.
+        """
+        for intento in range(JOBS_N8N_RETRIES + 1):
+            try:
+                return requests.post(url, json=payload, timeout=JOBS_N8N_TIMEOUT)
+            except requests.exceptions.ConnectionError as e:
+                if intento == JOBS_N8N_RETRIES or not _sin_conectar(e):
+                    raise
+            time.sleep(min(30, 2 ** intento))
+        raise RuntimeError("reintentos agotados")
+
+    def _a_n8n(
+        self, job: Dict[str, Any], contenido: str, pares: Optional[List[Dict[str, str]]], params: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        url = params["n8n_url"]
+        if pares is None:
+            # Chat sin procesar y sin empresa/teléfono: n8n lo procesa completo en un solo request
+            lotes: List[Tuple[int, int, Dict[str, Any]]] = [
+                (0, 1, {"file_content": contenido, "filename": job["filename"], "file_type": "txt"})
+            ]
+            total = 1
+        else:
+            # Pares (JSON, TXT procesado o chat emparejado): un POST por lote, con el lote y
+            # su clave de idempotencia (la misma si se reenvía al retomar el trabajo)
+            total = len(pares)
+            lotes = []
+            for inicio, fin in self._lotes(job, total):
+                datos = pares[inicio:fin]
+                lotes.append((inicio, fin, {
+                    "file_content": json.dumps(datos, ensure_ascii=False),
+                    "filename": job["filename"],
+                    "file_type": "json",
+                    "data": datos,
+                    "batch": {"from": inicio, "to": fin, "total": total},
+                    "idempotency_key": f"{job['id']}:{inicio}-{fin}"
+                }))
+        self._update(job["id"], total=total)
+
+        respuestas = []
+        for inicio, fin, payload in lotes:
+            if fin <= job["checkpoint"]:
+                continue
+            try:
+                response = self._post_n8n(url, payload)
+                if response.status_code == 200:
+                    self._avance(job, fin, fin - inicio, 0)
+                    respuestas.append(response.text[:500])
+                else:
+                    self._avance(job, fin, 0, fin - inicio, f"Lote {inicio + 1}-{fin}: n8n respondió {response.status_code}: {response.text[:200]}")
+            except Exception as e:
+                self._avance(job, fin, 0, fin - inicio, f"Lote {inicio + 1}-{fin}: {e}")
+        return {"url": url, "respuestas_n8n": respuestas[-3:]}
+
+
+_queue: Optional[JobQueue] = None
+
+
+def get_queue(get_collection: Callable[[], Any], on_write: Optional[Callable[[], None]] = None) -> JobQueue:
+    """Crear (una vez) la cola de trabajos y retomar los pendientes"""
+    global _queue
+    if _queue is None:
+        _queue = JobQueue(JOBS_DIR, JOBS_WORKERS, get_collection, on_write)
+        _queue.resume()
+    return _queue
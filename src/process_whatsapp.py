@@ -7,12 +7,31 @@ Uso:
 
 Ejemplo:
     python process_whatsapp.py "Limpieza de pozos:" "+591 69023378" chat.txt chat_procesado.txt
+
+    # Exportación .zip de WhatsApp (chat + multimedia): se lee solo el .txt del chat
+    python process_whatsapp.py "Limpieza de pozos:" "+591 69023378" "Chat de WhatsApp con +591 69023378.zip"
+
+    # Exportación muy grande: repartir el parseo entre 4 procesos
+    python process_whatsapp.py "Limpieza de pozos:" "+591 69023378" chat.txt --procesos 4
+
+    # Exportación de Android ("d/m/aa h:mm - Nombre: mensaje"): el formato se detecta solo
+    python process_whatsapp.py "Limpieza de pozos:" "+591 69023378" "WhatsApp Chat with +591 69023378.txt"
+
+    # Reglas de descarte y reemplazo propias (ver reglas_whatsapp.ejemplo.json)
+    python process_whatsapp.py "Limpieza de pozos:" "+591 69023378" chat.txt --reglas reglas.json
 """
 
+import argparse
+import hashlib
+import io
+import json
 import sys
 import re
 import os
-from typing import Optional
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
 
 
 def identificar_tipo_linea(linea: str, texto_empresa: str, telefono: str) -> Optional[str]:
@@ -83,20 +102,1040 @@ def identificar_tipo_linea(linea: str, texto_empresa: str, telefono: str) -> Opt
     return None
 
 
+# Patrón de una línea de mensaje: [fecha, hora] - Remitente: mensaje
+PATRON_LINEA = re.compile(r'\[(\d{1,2}/\d{1,2}/\d{2,4},?\s+\d{1,2}:\d{2}(?::\d{2})?\s*[AP]?M?)\]\s*-\s*([^:]+):\s*(.+)')
+
+# Inicio de un mensaje en bytes, para alinear los rangos del modo paralelo
+PATRON_INICIO_MENSAJE = re.compile(rb'[ \t]*\[\d{1,2}/\d{1,2}/\d{2,4},?\s+\d{1,2}:\d{2}')
+
+# Componentes de la marca de tiempo: d/m/aa (o d.m.aa), h:mm[:ss] [AM|PM|a. m.|p. m.]
+PATRON_MARCA_TIEMPO = re.compile(r'(\d{1,2})[/.](\d{1,2})[/.](\d{2,4}),?\s+(\d{1,2}):(\d{2})(?::(\d{2}))?\s*([AP])?', re.IGNORECASE)
+
+
+class FormatoExportacion(NamedTuple):
+    """Formato de las líneas de una exportación de WhatsApp"""
+    nombre: str
+    ejemplo: str
+    patron: re.Pattern  # Línea de mensaje, con grupos (marca de tiempo, remitente, mensaje)
+    inicio: re.Pattern  # Inicio de una entrada (mensaje o mensaje de sistema)
+    inicio_bytes: re.Pattern  # Inicio en bytes, para alinear los rangos del modo paralelo
+    unir_continuaciones: bool  # Las líneas que no son una entrada se agregan al mensaje anterior
+
+
+# Fecha y hora de los formatos detectados: d/m/aa o d.m.aa, 24 h o 12 h (AM, p. m., ...)
+_FECHA = r'\d{1,2}[/.]\d{1,2}[/.]\d{2,4}'
+_HORA = r'\d{1,2}:\d{2}(?::\d{2})?(?:\s*[aApP]\.?\s*[mM]\.?)?'
+_FECHA_HORA = _FECHA + r',?\s+' + _HORA
+# Marca de izquierda a derecha (U+200E) que WhatsApp pone antes de algunas líneas
+_LRM = r'\u200e?'
+
+# Formatos conocidos, en orden de preferencia si empatan al detectarlos
+FORMATOS_EXPORTACION = {
+    # Formato original del script: cada línea se clasifica por separado
+    "corchetes": FormatoExportacion(
+        "corchetes", "[d/m/aa, h:mm] - Nombre: mensaje", PATRON_LINEA,
+        re.compile(r'\[\d{1,2}/\d{1,2}/\d{2,4},?\s+\d{1,2}:\d{2}(?::\d{2})?\s*[AP]?M?\]\s*-'), PATRON_INICIO_MENSAJE,
+        False
+    ),
+    "ios": FormatoExportacion(
+        "ios", "[d/m/aa, h:mm:ss] Nombre: mensaje",
+        re.compile(_LRM + r'\[(' + _FECHA_HORA + r')\]\s+(?=[^\s-])([^:]+):\s*(.*)'),
+        re.compile(_LRM + r'\[' + _FECHA_HORA + r'\]\s+(?=[^\s-])'),
+        re.compile(rb'[ \t]*(?:\xe2\x80\x8e)?\[' + _FECHA_HORA.encode() + rb'\]\s+(?=[^\s-])'), True
+    ),
+    "android": FormatoExportacion(
+        "android", "d/m/aa h:mm - Nombre: mensaje",
+        re.compile(_LRM + r'(' + _FECHA_HORA + r')\s+-\s+([^:]+):\s*(.*)'),
+        re.compile(_LRM + _FECHA_HORA + r'\s+-\s'),
+        re.compile(rb'[ \t]*(?:\xe2\x80\x8e)?' + _FECHA_HORA.encode() + rb'\s+-\s'), True
+    ),
+}
+FORMATO_DEFAULT = FORMATOS_EXPORTACION["corchetes"]
+
+# Líneas no vacías del inicio del archivo que se revisan para detectar el formato
+LINEAS_MUESTRA = 300
+
+# Tamaño aproximado de cada rango del archivo en el modo paralelo
+TAMANO_RANGO = 8 * 1024 * 1024
+
+# Caracteres que se ignoran al comparar teléfonos
+_SIN_SEPARADORES = str.maketrans('', '', ' +-()')
+
+# Mensajes de sistema de WhatsApp que se descartan
+TEXTO_SEGURIDAD = "Cambió tu código de seguridad con"
+
+# Reemplazos de texto aplicados a cada mensaje
+TEXTO_A_REEMPLAZAR = "¿Puedes darme más información sobre esto?"
+TEXTO_REEMPLAZO = "Cuanto cuesta el servicio?"
+
+# Archivo JSON de reglas de descarte y reemplazo (default: las de arriba)
+ARCHIVO_REGLAS = os.getenv("WHATSAPP_REGLAS")
+
+
+def _compilar_textos(textos: Iterable[str]) -> Optional[re.Pattern]:
+    # Con un solo texto alcanza con "in"/replace (más rápido que una expresión regular)
+    textos = sorted(textos, key=len, reverse=True)
+    if len(textos) < 2:
+        return None
+    # Los más largos primero: si un texto contiene a otro, gana el más largo
+    return re.compile('|'.join(map(re.escape, textos)))
+
+
+class ReglasTexto:
+    """
+    Reglas de descarte de líneas y de reemplazo de texto, compiladas una vez.
+    
+    Todos los textos a descartar se buscan con una sola expresión regular
+    (alternación), y lo mismo los textos a reemplazar: el costo por línea casi no
+    crece al agregar reglas. Los textos se comparan literalmente, con mayúsculas.
+    """
+    
+    def __init__(self, descartar: Dict[str, str], reemplazar: Dict[str, str]):
+        """
+        Args:
+            descartar: {texto: motivo}: se descarta la línea que contiene el texto
+            reemplazar: {texto: reemplazo}: se aplica a cada mensaje
+        """
+        self.descartar = dict(descartar)
+        self.reemplazar = dict(reemplazar)
+        self._descartar = _compilar_textos(self.descartar)
+        self._reemplazar = _compilar_textos(self.reemplazar)
+        self._descartar_unico = next(iter(self.descartar)) if len(self.descartar) == 1 else None
+        self._reemplazar_unico = next(iter(self.reemplazar)) if len(self.reemplazar) == 1 else None
+    
+    def motivo_descarte(self, linea: str) -> Optional[str]:
+        """Motivo de la regla de descarte que aplica a la línea, o None si se conserva"""
+        if self._descartar is not None:
+            match = self._descartar.search(linea)
+            return self.descartar[match.group(0)] if match else None
+        if self._descartar_unico is not None and self._descartar_unico in linea:
+            return self.descartar[self._descartar_unico]
+        return None
+    
+    def aplicar(self, mensaje: str) -> str:
+        """Aplica todos los reemplazos al mensaje en una sola pasada"""
+        if self._reemplazar is not None:
+            return self._reemplazar.sub(lambda match: self.reemplazar[match.group(0)], mensaje)
+        if self._reemplazar_unico is not None and self._reemplazar_unico in mensaje:
+            return mensaje.replace(self._reemplazar_unico, self.reemplazar[self._reemplazar_unico])
+        return mensaje
+    
+    def huella(self) -> str:
+        """SHA-256 de las reglas, para saber si cambiaron entre ejecuciones"""
+        contenido = json.dumps([self.descartar, self.reemplazar], ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+REGLAS_DEFAULT = ReglasTexto(
+    descartar={TEXTO_SEGURIDAD: "mensaje de seguridad"},
+    reemplazar={TEXTO_A_REEMPLAZAR: TEXTO_REEMPLAZO}
+)
+
+
+def cargar_reglas(ruta: Optional[str]) -> ReglasTexto:
+    """
+    Lee las reglas de un archivo JSON {"descartar": {texto: motivo}, "reemplazar": {texto: reemplazo}}.
+    
+    Las reglas del archivo reemplazan a las de por defecto (si se quieren conservar,
+    hay que incluirlas). Sin ruta devuelve REGLAS_DEFAULT.
+    
+    Raises:
+        Exception: Si el archivo no tiene el formato esperado
+    """
+    if not ruta:
+        return REGLAS_DEFAULT
+    with open(ruta, 'r', encoding='utf-8') as f:
+        datos = json.load(f)
+    if not isinstance(datos, dict):
+        raise Exception(f"Las reglas de {ruta} deben ser un objeto con \"descartar\" y/o \"reemplazar\"")
+    for clave in ("descartar", "reemplazar"):
+        valor = datos.get(clave, {})
+        if not isinstance(valor, dict) or not all(isinstance(k, str) and k and isinstance(v, str)
+                                                  for k, v in valor.items()):
+            raise Exception(f"\"{clave}\" en {ruta} debe ser un objeto {{texto: texto}} sin textos vacíos")
+    return ReglasTexto(datos.get("descartar", {}), datos.get("reemplazar", {}))
+
+
+# Reglas en uso (ver usar_reglas)
+REGLAS = cargar_reglas(ARCHIVO_REGLAS)
+
+
+def usar_reglas(reglas: ReglasTexto):
+    """Cambia las reglas de descarte y reemplazo que usa el procesamiento"""
+    global REGLAS
+    REGLAS = reglas
+
+
+def aplicar_reemplazo(mensaje: str) -> str:
+    """Aplica reemplazos de texto al mensaje"""
+    return REGLAS.aplicar(mensaje)
+
+
+def motivo_descarte(linea: str) -> Optional[str]:
+    """Motivo por el que se descarta la línea según las reglas en uso, o None"""
+    return REGLAS.motivo_descarte(linea)
+
+
+def es_zip(archivo_entrada: str) -> bool:
+    """True si el archivo es una exportación .zip (chat + multimedia)"""
+    return archivo_entrada.lower().endswith('.zip') and zipfile.is_zipfile(archivo_entrada)
+
+
+def miembro_chat(archivo_zip: zipfile.ZipFile) -> zipfile.ZipInfo:
+    """
+    Elige el .txt del chat dentro de una exportación .zip de WhatsApp.
+    
+    Prefiere "_chat.txt" (iOS) o "Chat de WhatsApp con ....txt" / "WhatsApp Chat with
+    ....txt" (Android); si no, el .txt más grande. La multimedia se ignora.
+    
+    Raises:
+        Exception: Si el .zip no tiene ningún .txt
+    """
+    textos = [
+        info for info in archivo_zip.infolist()
+        if not info.is_dir() and info.filename.lower().endswith('.txt') and not info.filename.startswith('__MACOSX/')
+    ]
+    if not textos:
+        raise Exception("El .zip no contiene un chat de WhatsApp (.txt)")
+    
+    def prioridad(info: zipfile.ZipInfo) -> Tuple[bool, int]:
+        nombre = os.path.basename(info.filename).lower()
+        return nombre == '_chat.txt' or nombre.startswith(('chat de whatsapp', 'whatsapp chat')), info.file_size
+    
+    return max(textos, key=prioridad)
+
+
+def leer_lineas(archivo_entrada: str) -> Iterator[str]:
+    """
+    Lee el archivo línea por línea, sin cargarlo completo en memoria.
+    
+    Si es una exportación .zip, descomprime en streaming solo el .txt del chat
+    (sin extraer nada a disco).
+    
+    Yields:
+        Cada línea sin el salto de línea final
+    """
+    if es_zip(archivo_entrada):
+        with zipfile.ZipFile(archivo_entrada) as archivo_zip:
+            with archivo_zip.open(miembro_chat(archivo_zip)) as binario:
+                with io.TextIOWrapper(binario, encoding='utf-8', errors='ignore') as f:
+                    for linea in f:
+                        yield linea.rstrip('\n\r')
+        return
+    
+    with open(archivo_entrada, 'r', encoding='utf-8', errors='ignore') as f:
+        for linea in f:
+            yield linea.rstrip('\n\r')
+
+
+def detectar_formato(lineas: Iterable[str], muestra: int = LINEAS_MUESTRA) -> FormatoExportacion:
+    """
+    Elige el formato con más inicios de entrada entre las primeras líneas no vacías.
+    
+    Se cuentan los inicios (marca de tiempo con el separador del formato) y no las
+    líneas de mensaje completas: los patrones de mensaje de cada formato aceptan cosas
+    distintas (el original exige texto después del remitente), y un mensaje vacío no
+    debe inclinar la detección. El formato original (corchetes) se deja solo si otro
+    tiene más del doble de inicios; si ninguna línea coincide, se usa el original.
+    """
+    conteo = dict.fromkeys(FORMATOS_EXPORTACION, 0)
+    revisadas = 0
+    for linea in lineas:
+        linea = linea.strip()
+        if not linea:
+            continue
+        for nombre, formato in FORMATOS_EXPORTACION.items():
+            if formato.inicio.match(linea):
+                conteo[nombre] += 1
+        revisadas += 1
+        if revisadas >= muestra:
+            break
+    mejor = max(conteo, key=conteo.get)
+    if conteo[mejor] <= 2 * conteo[FORMATO_DEFAULT.nombre]:
+        return FORMATO_DEFAULT
+    return FORMATOS_EXPORTACION[mejor]
+
+
+def formato_archivo(archivo_entrada: str, formato: Optional[str] = None) -> FormatoExportacion:
+    """
+    Formato de la exportación: el indicado por nombre o el detectado en sus primeras líneas.
+    
+    Raises:
+        Exception: Si el nombre no es un formato conocido
+    """
+    if formato:
+        if formato not in FORMATOS_EXPORTACION:
+            raise Exception(f"Formato de exportación desconocido: {formato} "
+                            f"(opciones: {', '.join(FORMATOS_EXPORTACION)})")
+        return FORMATOS_EXPORTACION[formato]
+    lineas = leer_lineas(archivo_entrada)
+    try:
+        return detectar_formato(lineas)
+    finally:
+        lineas.close()
+
+
+def leer_rango(archivo_entrada: str, inicio: int, fin: int) -> Iterator[str]:
+    """
+    Lee las líneas del rango de bytes [inicio, fin) del archivo.
+    
+    El rango debe empezar al inicio de una línea: se decodifica igual que leer_lineas.
+    """
+    with open(archivo_entrada, 'rb') as f:
+        f.seek(inicio)
+        datos = f.read(fin - inicio)
+    with io.TextIOWrapper(io.BytesIO(datos), encoding='utf-8', errors='ignore') as texto:
+        for linea in texto:
+            yield linea.rstrip('\n\r')
+
+
+def dividir_en_rangos(
+    archivo_entrada: str,
+    tamano_rango: int = TAMANO_RANGO,
+    patron_inicio: re.Pattern = PATRON_INICIO_MENSAJE
+) -> List[Tuple[int, int]]:
+    """
+    Divide el archivo en rangos de bytes de ~tamano_rango alineados a inicios de mensaje.
+    
+    Cada rango (salvo el primero) empieza en una línea que coincide con patron_inicio
+    (por defecto "[d/m/aa, h:mm] ..."). Si entre dos cortes no hay ninguna, los rangos
+    se unen.
+    
+    Returns:
+        Lista de (inicio, fin) que cubre el archivo completo
+    """
+    tamano = os.path.getsize(archivo_entrada)
+    cortes = [0]
+    with open(archivo_entrada, 'rb') as f:
+        for objetivo in range(tamano_rango, tamano, tamano_rango):
+            if objetivo <= cortes[-1]:
+                continue
+            f.seek(objetivo)
+            f.readline()  # Descartar la línea cortada
+            limite = objetivo + tamano_rango
+            while True:
+                posicion = f.tell()
+                linea = f.readline()
+                if not linea or posicion >= limite:
+                    break
+                if patron_inicio.match(linea):
+                    cortes.append(posicion)
+                    break
+    cortes.append(tamano)
+    return [(inicio, fin) for inicio, fin in zip(cortes, cortes[1:]) if fin > inicio]
+
+
+class RegistroLinea(NamedTuple):
+    """Línea del chat interpretada por ClasificadorLineas"""
+    marca_tiempo: Optional[str]  # "d/m/aa, h:mm" (None si la línea no tiene el formato estándar)
+    remitente: Optional[str]
+    rol: Optional[str]  # 'empresa', 'usuario' o None (texto suelto, se escribe sin prefijo)
+    texto: str
+
+
+class ClasificadorLineas:
+    """
+    Clasificador de líneas de un chat, construido una vez por archivo.
+    
+    Guarda normalizados el texto de la empresa y las variantes del teléfono, y
+    parsea cada línea con una sola búsqueda del patrón compilado. Da el mismo
+    resultado que identificar_tipo_linea y la extracción del mensaje.
+    """
+    
+    def __init__(self, texto_empresa: str, telefono: str):
+        self.texto_empresa = texto_empresa
+        self._empresa = texto_empresa.lower().strip()
+        
+        # Mismas variantes que identificar_tipo_linea, ya sin separadores. Basta con
+        # buscarlas en la línea sin separadores: si una variante aparece en la línea,
+        # también aparece al quitar los separadores de ambas.
+        variantes = [
+            telefono.strip(),
+            re.sub(r'[\s\+\-\(\)]', '', telefono),
+            telefono.replace('+', '').replace(' ', '').strip(),
+            telefono.replace('+', '').replace('-', '').replace(' ', '').strip(),
+            telefono.replace('+', '').replace(' ', '').replace('(', '').replace(')', '').strip(),
+        ]
+        self._telefonos = tuple(dict.fromkeys(
+            variante.translate(_SIN_SEPARADORES) for variante in variantes if len(variante) >= 6
+        ))
+    
+    def _contiene_telefono(self, texto: str) -> bool:
+        texto_sin_separadores = texto.translate(_SIN_SEPARADORES)
+        return any(variante in texto_sin_separadores for variante in self._telefonos)
+    
+    def _rol_por_linea(self, linea: str) -> Optional[str]:
+        # Sin remitente reconocible: buscar empresa o teléfono en la línea completa
+        if self._empresa in linea.lower():
+            return 'empresa'
+        if self._contiene_telefono(linea):
+            return 'usuario'
+        return None
+    
+    def _rol_por_remitente(self, nombre: str, mensaje: str) -> Optional[str]:
+        if self._empresa in nombre.lower():
+            return 'empresa'
+        if self._contiene_telefono(nombre):
+            return 'usuario'
+        # El mensaje contiene el texto de la empresa (puede ser respuesta)
+        if self._empresa in mensaje.lower():
+            return 'empresa'
+        return None
+    
+    def identificar(self, linea: str) -> Optional[str]:
+        """Equivalente a identificar_tipo_linea(linea, texto_empresa, telefono)"""
+        match = PATRON_LINEA.match(linea)
+        if match:
+            rol = self._rol_por_remitente(match.group(2).strip(), match.group(3).strip())
+            if rol:
+                return rol
+        return self._rol_por_linea(linea)
+    
+    def parsear(self, linea_stripped: str) -> RegistroLinea:
+        """
+        Interpreta una línea no vacía (sin espacios al inicio y final).
+        
+        Las líneas que no se pueden identificar se asumen del usuario, salvo el texto
+        suelto sin ":" (se escribe sin prefijo).
+        """
+        match = PATRON_LINEA.match(linea_stripped)
+        return self.interpretar(linea_stripped, match.groups() if match else None)
+    
+    def interpretar(self, linea_stripped: str, grupos: Optional[Tuple[str, str, str]]) -> RegistroLinea:
+        """
+        Como parsear, con el patrón de la línea ya buscado.
+        
+        Args:
+            grupos: (marca de tiempo, remitente, mensaje) del patrón del formato, o None
+                    si la línea no coincide
+        """
+        if grupos:
+            marca_tiempo, nombre, mensaje = grupos
+            nombre = nombre.strip()
+            mensaje = mensaje.strip()
+            rol = self._rol_por_remitente(nombre, mensaje) or self._rol_por_linea(linea_stripped)
+            return RegistroLinea(marca_tiempo, nombre, rol or 'usuario', mensaje)
+        
+        rol = self._rol_por_linea(linea_stripped)
+        if rol is None:
+            if ':' in linea_stripped:
+                # Intentar extraer después del último ":"
+                return RegistroLinea(None, None, 'usuario', linea_stripped.rsplit(':', 1)[1].strip())
+            return RegistroLinea(None, None, None, linea_stripped)
+        
+        if ' - ' in linea_stripped:
+            # Dividir por " - " y tomar la segunda parte (remitente: mensaje)
+            parte_derecha = linea_stripped.split(' - ', 1)[1]
+            # El primer ":" separa el nombre del mensaje (el resto incluye URLs completas)
+            indice_dos_puntos = parte_derecha.find(':')
+            mensaje = parte_derecha[indice_dos_puntos + 1:].strip() if indice_dos_puntos >= 0 else parte_derecha
+        elif ':' in linea_stripped and not linea_stripped.startswith(('http://', 'https://')):
+            # Sin " - ": el primer ":" probablemente separa nombre de mensaje
+            mensaje = linea_stripped[linea_stripped.find(':') + 1:].strip()
+        else:
+            # Sin ":" ni " - " (o una URL): es solo el mensaje
+            mensaje = linea_stripped
+        return RegistroLinea(None, None, rol, mensaje)
+
+
+def formatear_registro(registro: RegistroLinea) -> str:
+    """Línea de salida: "ai: mensaje", "user: mensaje" o el texto suelto"""
+    mensaje = aplicar_reemplazo(registro.texto)
+    if registro.rol == 'empresa':
+        return f"ai: {mensaje}"
+    if registro.rol == 'usuario':
+        return f"user: {mensaje}"
+    return mensaje
+
+
+def avisar_eliminada(numero: int, motivo: str, linea: str):
+    print(f"🗑️  Línea {numero} eliminada ({motivo}): {linea[:50]}...")
+
+
+def avisar_combinadas(inicio: int, fin: int, cantidad: int, prefijo: str):
+    print(f"🔗 Líneas {inicio + 1}-{fin} combinadas: {cantidad} mensajes de {prefijo[:-2]}")
+
+
+def _unir_mensaje(linea: str, marca_tiempo: str, remitente: str, partes: List[str]) -> Tuple[str, Tuple[str, str, str]]:
+    # Las líneas vacías al final del mensaje no son parte de él
+    while len(partes) > 1 and not partes[-1]:
+        partes.pop()
+    return linea, (marca_tiempo, remitente, "\\n".join(partes))
+
+
+def mensajes_chat(
+    lineas: Iterable[str],
+    texto_empresa: str,
+    formato: Optional[FormatoExportacion] = None,
+    descartar_empresa: bool = True,
+    al_eliminar: Callable[[int, str, str], None] = avisar_eliminada
+) -> Iterator[Optional[Tuple[str, Optional[Tuple[str, str, str]]]]]:
+    """
+    Separa las líneas del chat en mensajes, con el patrón del formato.
+    
+    Descarta las líneas de las reglas de descarte (REGLAS; por defecto, los mensajes
+    de seguridad de WhatsApp) y la primera línea que contiene el texto de la empresa
+    (si descartar_empresa).
+    
+    En el formato original (corchetes) cada línea es un mensaje. En los formatos con
+    continuaciones (ios, android), las líneas que no empiezan con fecha y hora son
+    parte del mensaje anterior (unidas con "\\n" literal, como los turnos
+    combinados); las entradas sin remitente son mensajes de sistema y se descartan
+    junto con sus continuaciones.
+    
+    Yields:
+        (primera línea sin espacios, (marca de tiempo, remitente, mensaje) o None si
+        la línea no coincide con el patrón) por cada mensaje, o None por cada línea
+        vacía en el formato original
+    """
+    formato = formato or FORMATO_DEFAULT
+    texto_empresa_lower = texto_empresa.lower()
+    motivo_descarte = REGLAS.motivo_descarte
+    patron = formato.patron.match
+    encontro_empresa = not descartar_empresa
+    
+    if not formato.unir_continuaciones:
+        for i, linea_original in enumerate(lineas, 1):
+            linea_stripped = linea_original.strip()
+            
+            if not linea_stripped:
+                yield None
+                continue
+            
+            # Eliminar líneas de las reglas de descarte (mensajes de seguridad de WhatsApp, etc.)
+            motivo = motivo_descarte(linea_stripped)
+            if motivo:
+                al_eliminar(i, motivo, linea_stripped)
+                continue
+            
+            # Buscar la primera línea con el texto de la empresa y eliminarla
+            if not encontro_empresa and texto_empresa_lower in linea_stripped.lower():
+                al_eliminar(i, "contiene texto de empresa", linea_stripped)
+                encontro_empresa = True
+                continue
+            
+            match = patron(linea_stripped)
+            yield linea_stripped, match.groups() if match else None
+        return
+    
+    inicio = formato.inicio.match
+    actual = None  # [primera línea, marca de tiempo, remitente, partes del mensaje]
+    for i, linea_original in enumerate(lineas, 1):
+        linea_stripped = linea_original.strip()
+        match = patron(linea_stripped) if linea_stripped else None
+        nueva = match is not None or (linea_stripped and inicio(linea_stripped) is not None)
+        
+        if nueva and actual:
+            yield _unir_mensaje(*actual)
+            actual = None
+        
+        if linea_stripped:
+            motivo = motivo_descarte(linea_stripped)
+            if not motivo and not encontro_empresa and texto_empresa_lower in linea_stripped.lower():
+                motivo = "contiene texto de empresa"
+                encontro_empresa = True
+            if not motivo and nueva and not match:
+                motivo = "mensaje de sistema"
+            if not motivo and not nueva and not actual:
+                motivo = "continuación de una línea descartada"
+            if motivo:
+                al_eliminar(i, motivo, linea_stripped)
+                continue
+        
+        if match:
+            marca_tiempo, remitente, mensaje = match.groups()
+            actual = [linea_stripped, marca_tiempo, remitente, [mensaje.strip()]]
+        elif actual:
+            actual[3].append(linea_stripped)
+    
+    if actual:
+        yield _unir_mensaje(*actual)
+
+
+def registros_chat(
+    lineas: Iterable[str],
+    texto_empresa: str,
+    telefono: str,
+    descartar_empresa: bool = True,
+    al_eliminar: Callable[[int, str, str], None] = avisar_eliminada,
+    formato: Optional[FormatoExportacion] = None
+) -> Iterator[Optional[RegistroLinea]]:
+    """
+    Interpreta los mensajes del chat uno por uno (ver mensajes_chat).
+    
+    Yields:
+        RegistroLinea de cada mensaje, o None por cada línea vacía
+    """
+    interpretar = ClasificadorLineas(texto_empresa, telefono).interpretar
+    for mensaje in mensajes_chat(lineas, texto_empresa, formato, descartar_empresa, al_eliminar):
+        yield None if mensaje is None else interpretar(*mensaje)
+
+
+def clasificar_lineas(
+    lineas: Iterable[str],
+    texto_empresa: str,
+    telefono: str,
+    descartar_empresa: bool = True,
+    al_eliminar: Callable[[int, str, str], None] = avisar_eliminada,
+    formato: Optional[FormatoExportacion] = None
+) -> Iterator[str]:
+    """
+    Convierte las líneas del chat en líneas "ai: ..." / "user: ..." una por una.
+    
+    Descarta las líneas de las reglas de descarte y la primera línea que contiene el
+    texto de la empresa (si descartar_empresa). Las líneas vacías se mantienen.
+    """
+    return formatear_registros(registros_chat(lineas, texto_empresa, telefono, descartar_empresa, al_eliminar, formato))
+
+
+def prefijo_turno(linea: str) -> Optional[str]:
+    """Hablante de la línea: "ai: ", "user: " o None"""
+    if linea.startswith("ai: "):
+        return "ai: "
+    if linea.startswith("user: "):
+        return "user: "
+    return None
+
+
+def unir_turno(prefijo: str, grupo: List[str]) -> str:
+    """Une las líneas de un mismo hablante separando los mensajes con "\\n" literal"""
+    if len(grupo) == 1:
+        return grupo[0]
+    return prefijo + "\\n".join(linea[len(prefijo):].strip() for linea in grupo)
+
+
+def combinar_turnos(
+    lineas: Iterable[str],
+    al_combinar: Callable[[int, int, int, str], None] = avisar_combinadas
+) -> Iterator[str]:
+    """
+    Combina líneas consecutivas del mismo hablante ("ai: " o "user: ") en una sola.
+    
+    Los mensajes combinados se separan con "\\n" literal. Solo se guarda en memoria
+    el turno en curso.
+    """
+    prefijo_actual = None
+    grupo = []
+    inicio = 0
+    
+    def cerrar_turno(fin: int) -> str:
+        if len(grupo) > 1:
+            al_combinar(inicio, fin, len(grupo), prefijo_actual)
+        return unir_turno(prefijo_actual, grupo)
+    
+    indice = -1
+    for indice, linea in enumerate(lineas):
+        prefijo = prefijo_turno(linea)
+        
+        if grupo and prefijo == prefijo_actual:
+            grupo.append(linea)
+            continue
+        if grupo:
+            yield cerrar_turno(indice)
+            grupo = []
+        if prefijo is None:
+            # No es una línea "ai:" ni "user:", mantenerla como está
+            yield linea
+        else:
+            prefijo_actual = prefijo
+            grupo = [linea]
+            inicio = indice
+    
+    if grupo:
+        yield cerrar_turno(indice + 1)
+
+
+class ResultadoRango(NamedTuple):
+    """Rango del archivo procesado por un worker del modo paralelo"""
+    lineas_entrada: int  # Líneas leídas del rango
+    salidas: int  # Líneas clasificadas (antes de combinar turnos)
+    cabeza: List[str]  # Primer turno sin combinar: puede continuar el turno del rango anterior
+    cuerpo: List[str]  # Turnos intermedios ya combinados
+    cola: List[str]  # Último turno sin combinar: puede seguir en el rango siguiente
+    tiene_empresa: bool  # Hay una línea candidata a "primera línea con texto de empresa"
+    descarto_empresa: bool  # Se procesó descartando esa línea
+    eventos: List[tuple]  # Avisos con números relativos al rango, en orden
+
+
+def procesar_rango(
+    archivo_entrada: str,
+    inicio: int,
+    fin: int,
+    texto_empresa: str,
+    telefono: str,
+    descartar_empresa: bool,
+    reglas: Optional[ReglasTexto] = None,
+    formato: Optional[FormatoExportacion] = None
+) -> ResultadoRango:
+    """
+    Clasifica y combina los turnos de un rango de bytes (se ejecuta en un worker).
+    
+    El primer y el último turno se devuelven sin combinar para unirlos con los
+    rangos vecinos.
+    
+    Args:
+        reglas: Reglas del proceso principal (un worker nuevo no hereda usar_reglas)
+    """
+    if reglas is not None:
+        usar_reglas(reglas)
+    eventos = []
+    texto_empresa_lower = texto_empresa.lower()
+    lineas = list(leer_rango(archivo_entrada, inicio, fin))
+    # Mismo criterio que clasificar_lineas para la primera línea con texto de empresa
+    tiene_empresa = any(
+        linea and not motivo_descarte(linea) and texto_empresa_lower in linea.lower()
+        for linea in map(str.strip, lineas)
+    )
+    clasificadas = list(clasificar_lineas(
+        lineas, texto_empresa, telefono, descartar_empresa,
+        al_eliminar=lambda *datos: eventos.append(("eliminada",) + datos),
+        formato=formato
+    ))
+    total = len(clasificadas)
+    
+    # Primer turno
+    primero = prefijo_turno(clasificadas[0]) if clasificadas else None
+    i = 0
+    if primero:
+        while i < total and prefijo_turno(clasificadas[i]) == primero:
+            i += 1
+    if i == total:
+        return ResultadoRango(len(lineas), total, clasificadas, [], [], tiene_empresa, descartar_empresa, eventos)
+    
+    # Último turno
+    ultimo = prefijo_turno(clasificadas[-1])
+    j = total
+    if ultimo:
+        while j > i and prefijo_turno(clasificadas[j - 1]) == ultimo:
+            j -= 1
+    
+    cuerpo = list(combinar_turnos(
+        clasificadas[i:j],
+        al_combinar=lambda desde, hasta, cantidad, prefijo: eventos.append(
+            ("combinadas", desde + i, hasta + i, cantidad, prefijo)
+        )
+    ))
+    return ResultadoRango(len(lineas), total, clasificadas[:i], cuerpo, clasificadas[j:],
+                          tiene_empresa, descartar_empresa, eventos)
+
+
+def procesar_en_paralelo(
+    archivo_entrada: str,
+    texto_empresa: str,
+    telefono: str,
+    procesos: int,
+    tamano_rango: int = TAMANO_RANGO,
+    contador: Optional[dict] = None,
+    formato: Optional[FormatoExportacion] = None
+) -> Iterator[str]:
+    """
+    Equivalente a combinar_turnos(clasificar_lineas(leer_lineas(...))) repartiendo los
+    rangos del archivo entre varios procesos.
+    
+    Los resultados se unen en orden: el turno abierto al final de un rango se combina
+    con el primero del siguiente, y solo se descarta la primera línea con texto de
+    empresa de todo el archivo. Los rangos empiezan en un inicio de entrada del
+    formato, así que un mensaje con continuaciones nunca queda partido. Como mucho
+    procesos * 2 rangos quedan en memoria.
+    
+    Args:
+        contador: Si se pasa, se suma en contador["procesadas"] la cantidad de líneas clasificadas
+    """
+    formato = formato or FORMATO_DEFAULT
+    rangos = dividir_en_rangos(archivo_entrada, tamano_rango, formato.inicio_bytes)
+    print(f"⚙️  {len(rangos)} rangos en {procesos} procesos")
+    
+    # Turno abierto: [prefijo, líneas, índice global de su primera línea]
+    abierto = [None, [], 0]
+    
+    def cerrar(fin: int) -> Iterator[str]:
+        prefijo, grupo, inicio = abierto
+        if grupo:
+            if len(grupo) > 1:
+                avisar_combinadas(inicio, fin, len(grupo), prefijo)
+            yield unir_turno(prefijo, grupo)
+        abierto[1] = []
+    
+    encontro_empresa = False
+    lineas_base = 0  # Líneas de entrada de los rangos anteriores
+    indice_base = 0  # Líneas clasificadas de los rangos anteriores
+    
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        pendientes = deque()
+        siguiente = 0
+        while pendientes or siguiente < len(rangos):
+            while siguiente < len(rangos) and len(pendientes) < procesos * 2:
+                inicio, fin = rangos[siguiente]
+                # Solo el primer rango descarta la línea de empresa; si no la tiene, se
+                # reprocesa el primer rango que sí la tenga
+                pendientes.append(pool.submit(
+                    procesar_rango, archivo_entrada, inicio, fin, texto_empresa, telefono, siguiente == 0,
+                    REGLAS, formato
+                ))
+                siguiente += 1
+            
+            resultado = pendientes.popleft().result()
+            if not encontro_empresa and resultado.tiene_empresa:
+                encontro_empresa = True
+                if not resultado.descarto_empresa:
+                    inicio, fin = rangos[siguiente - len(pendientes) - 1]
+                    resultado = procesar_rango(archivo_entrada, inicio, fin, texto_empresa, telefono, True,
+                                               formato=formato)
+            
+            for evento in resultado.eventos:
+                if evento[0] == "eliminada":
+                    avisar_eliminada(evento[1] + lineas_base, *evento[2:])
+                else:
+                    avisar_combinadas(evento[1] + indice_base, evento[2] + indice_base, *evento[3:])
+            
+            if resultado.cabeza:
+                prefijo = prefijo_turno(resultado.cabeza[0])
+                if abierto[1] and abierto[0] == prefijo:
+                    abierto[1].extend(resultado.cabeza)
+                else:
+                    yield from cerrar(indice_base)
+                    abierto[:] = [prefijo, list(resultado.cabeza), indice_base]
+            if len(resultado.cabeza) < resultado.salidas:
+                yield from cerrar(indice_base + len(resultado.cabeza))
+                yield from resultado.cuerpo
+                if resultado.cola:
+                    abierto[:] = [prefijo_turno(resultado.cola[0]), list(resultado.cola),
+                                  indice_base + resultado.salidas - len(resultado.cola)]
+            
+            lineas_base += resultado.lineas_entrada
+            indice_base += resultado.salidas
+            if contador is not None:
+                contador["procesadas"] += resultado.salidas
+    
+    yield from cerrar(indice_base)
+
+
+class PuntoControl(NamedTuple):
+    """Último mensaje procesado de una conversación"""
+    marca_tiempo: str
+    hash: str  # hash_registro del mensaje
+    ocurrencia: int  # Cuántos mensajes iguales (misma marca y hash) hubo hasta él inclusive
+
+
+def hash_registro(registro: RegistroLinea) -> str:
+    """SHA-256 de marca de tiempo, remitente y texto del mensaje"""
+    contenido = f"{registro.marca_tiempo}\x1f{registro.remitente}\x1f{registro.texto}"
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def clave_tiempo(marca_tiempo: str) -> Optional[Tuple[int, ...]]:
+    """
+    Marca de tiempo "d/m/aa, h:mm[:ss] [AM|PM]" como tupla ordenable.
+    
+    Returns:
+        (año, mes, día, hora, minuto, segundo), o None si no tiene ese formato
+    """
+    match = PATRON_MARCA_TIEMPO.match(marca_tiempo)
+    if not match:
+        return None
+    dia, mes, anio, hora, minuto, segundo, meridiano = match.groups()
+    anio, hora = int(anio), int(hora)
+    if anio < 100:
+        anio += 2000
+    if meridiano:
+        hora = hora % 12 + (12 if meridiano.upper() == 'P' else 0)
+    return anio, int(mes), int(dia), hora, int(minuto), int(segundo or 0)
+
+
+def ruta_punto_control(archivo_salida: str) -> str:
+    """Archivo del punto de control de una conversación, junto a su salida"""
+    return f"{archivo_salida}.checkpoint.json"
+
+
+def leer_punto_control(ruta: str) -> Optional[PuntoControl]:
+    if not os.path.exists(ruta):
+        return None
+    with open(ruta, 'r', encoding='utf-8') as f:
+        datos = json.load(f)
+    return PuntoControl(datos["marca_tiempo"], datos["hash"], datos.get("ocurrencia", 1))
+
+
+def guardar_punto_control(ruta: str, punto: PuntoControl):
+    temporal = f"{ruta}.tmp"
+    with open(temporal, 'w', encoding='utf-8') as f:
+        json.dump(punto._asdict(), f, ensure_ascii=False, indent=2)
+    os.replace(temporal, ruta)
+
+
+def hablante_registro(registro: Optional[RegistroLinea]) -> Optional[str]:
+    """Hablante de la línea de salida del registro: "ai: ", "user: " o None"""
+    if registro is None:
+        return None
+    if registro.rol == 'empresa':
+        return "ai: "
+    if registro.rol == 'usuario':
+        return "user: "
+    return prefijo_turno(aplicar_reemplazo(registro.texto))
+
+
+def filtrar_nuevos(
+    registros: Iterable[Optional[RegistroLinea]],
+    punto: Optional[PuntoControl],
+    ultimo: dict,
+    final: bool = False
+) -> Iterator[Optional[RegistroLinea]]:
+    """
+    Deja pasar solo los mensajes posteriores al punto de control.
+    
+    Se salta todo hasta el mensaje del punto de control (misma marca de tiempo, hash
+    y ocurrencia) y sus líneas de continuación. Si ese mensaje no aparece (fue
+    borrado), lo nuevo empieza en el primer mensaje con marca de tiempo posterior.
+    Sin punto de control pasa todo.
+    
+    El último par (la pregunta del cliente y la respuesta de la empresa, o el turno
+    abierto al final) no se deja pasar: puede seguir en la próxima exportación (la
+    empresa responde después, o el cliente escribe otro mensaje del mismo turno). El
+    punto de control queda en el mensaje anterior a ese par, así que la próxima
+    ejecución lo vuelve a leer completo y el resultado es el mismo que procesando
+    todo de una vez.
+    
+    Con final (el chat terminó y no se va a volver a exportar), el último par también
+    pasa y el punto de control queda en el último mensaje.
+    
+    Args:
+        ultimo: Se actualiza con los campos de PuntoControl del último mensaje
+                procesado (queda vacío si no hubo nada a partir del punto de control)
+        final: Dejar pasar también el último par
+    """
+    nuevo = punto is None
+    clave_punto = clave_tiempo(punto.marca_tiempo) if punto else None
+    encontrado = False
+    marca_actual = None
+    conteo = {}
+    pendientes = []  # Registros del último par, todavía abierto
+    confirmado = {}  # Punto de control del último mensaje antes de los pendientes
+    actual = {}  # Punto de control del último mensaje leído
+    anterior = None  # Hablante de la línea anterior
+    ultimo_hablante = None  # Hablante de la última línea con hablante
+    
+    for registro in registros:
+        if registro is not None and registro.marca_tiempo:
+            # Los mensajes repetidos se cuentan dentro de cada marca de tiempo
+            if registro.marca_tiempo != marca_actual:
+                marca_actual = registro.marca_tiempo
+                conteo = {}
+            hash_actual = hash_registro(registro)
+            conteo[hash_actual] = conteo.get(hash_actual, 0) + 1
+    
+            if not nuevo:
+                if (registro.marca_tiempo, hash_actual, conteo[hash_actual]) == tuple(punto):
+                    encontrado = True
+                    actual = confirmado = punto._asdict()
+                    continue
+                clave = clave_tiempo(registro.marca_tiempo)
+                if encontrado or (clave and clave_punto and clave > clave_punto):
+                    nuevo = True
+                else:
+                    continue
+    
+            # Un turno nuevo que no responde a un user abierto cierra el par anterior
+            hablante = hablante_registro(registro)
+            if hablante and hablante != anterior and (hablante == "user: " or ultimo_hablante != "user: "):
+                yield from pendientes
+                pendientes = []
+                confirmado = actual
+            actual = {"marca_tiempo": registro.marca_tiempo, "hash": hash_actual, "ocurrencia": conteo[hash_actual]}
+        elif not nuevo:
+            continue
+    
+        pendientes.append(registro)
+        anterior = hablante_registro(registro)
+        if anterior:
+            ultimo_hablante = anterior
+    
+    # Sin ningún mensaje con hablante no hay par que pueda seguir
+    if final or ultimo_hablante is None:
+        yield from pendientes
+        confirmado = actual
+    elif pendientes:
+        print(f"⏳ {len(pendientes)} líneas del último par quedan pendientes hasta la próxima exportación "
+              f"(--final para incluirlas)")
+    ultimo.update(confirmado)
+
+
+def formatear_registros(registros: Iterable[Optional[RegistroLinea]]) -> Iterator[str]:
+    """Líneas "ai: ..." / "user: ..." de los registros (línea vacía por cada None)"""
+    for registro in registros:
+        yield '' if registro is None else formatear_registro(registro)
+
+
+def escribir_lineas(lineas: Iterable[str], archivo_salida: str, anexar: bool = False) -> int:
+    """
+    Escribe las líneas a medida que llegan, separadas por salto de línea.
+    
+    Agrega un salto de línea final si la última línea no está vacía. Con anexar, las
+    líneas se agregan al final del archivo existente.
+    
+    Returns:
+        Cantidad de líneas escritas
+    """
+    total = 0
+    ultima = ''
+    separar = False
+    if anexar and os.path.exists(archivo_salida) and os.path.getsize(archivo_salida):
+        with open(archivo_salida, 'rb') as f:
+            f.seek(-1, os.SEEK_END)
+            separar = f.read(1) != b'\n'
+    with open(archivo_salida, 'a' if anexar else 'w', encoding='utf-8') as f:
+        if separar:
+            f.write('\n')
+        for linea in lineas:
+            if total:
+                f.write('\n')
+            f.write(linea)
+            ultima = linea
+            total += 1
+        if total and ultima:
+            f.write('\n')
+    return total
+
+
 def procesar_archivo_whatsapp(
     archivo_entrada: str,
     texto_empresa: str,
     telefono: str,
-    archivo_salida: Optional[str] = None
+    archivo_salida: Optional[str] = None,
+    procesos: int = 1,
+    tamano_rango: int = TAMANO_RANGO,
+    incremental: bool = False,
+    formato: Optional[str] = None,
+    final: bool = False
 ) -> str:
     """
     Procesa un archivo de WhatsApp y lo convierte en formato estructurado.
     
+    El archivo se procesa en streaming (leer → clasificar → extraer → combinar turnos
+    → escribir), así que la memoria usada no depende del tamaño del chat.
+    
+    Con procesos > 1 y un archivo más grande que tamano_rango, el archivo se divide en
+    rangos alineados a inicios de mensaje que se parsean en paralelo. El resultado es
+    idéntico al secuencial. Las exportaciones .zip se leen siempre en secuencia (el
+    .txt comprimido no se puede dividir por bytes).
+    
+    Con incremental, se guarda un punto de control (último mensaje procesado) junto a
+    la salida. En la siguiente ejecución con una exportación nueva del mismo chat,
+    solo se procesan los mensajes posteriores y se agregan al final de la salida. El
+    último par queda pendiente hasta la próxima exportación (ver filtrar_nuevos),
+    salvo con final.
+    
+    El formato de la exportación (corchetes, ios o android) se detecta en las primeras
+    líneas del archivo, salvo que se indique.
+    
     Args:
         archivo_entrada: Ruta al archivo de WhatsApp original
         texto_empresa: Texto que identifica a la empresa
         telefono: Número de teléfono del usuario
         archivo_salida: Ruta al archivo de salida (opcional, si no se proporciona se usa entrada_procesado.txt)
+        procesos: Procesos para parsear el archivo (1 = secuencial)
+        tamano_rango: Tamaño aproximado en bytes de cada rango del modo paralelo
+        incremental: Procesar solo lo posterior al punto de control (siempre secuencial)
+        formato: Formato de la exportación (default: detectarlo)
+        final: Con incremental, incluir el último par (el chat no va a seguir)
         
     Returns:
         Ruta al archivo procesado
@@ -107,294 +1146,95 @@ def procesar_archivo_whatsapp(
     # Determinar archivo de salida
     if archivo_salida is None:
         base, ext = os.path.splitext(archivo_entrada)
-        archivo_salida = f"{base}_procesado{ext}"
-    
-    texto_empresa_lower = texto_empresa.lower()
-    lineas_procesadas = []
-    encontro_empresa = False
-    eliminar_siguiente = False
-    
-    # Texto a reemplazar
-    texto_a_reemplazar = "¿Puedes darme más información sobre esto?"
-    texto_reemplazo = "Cuanto cuesta el servicio?"
-    
-    def aplicar_reemplazo(mensaje: str) -> str:
-        """Aplica reemplazos de texto al mensaje"""
-        if texto_a_reemplazar in mensaje:
-            mensaje = mensaje.replace(texto_a_reemplazar, texto_reemplazo)
-        return mensaje
+        archivo_salida = f"{base}_procesado{'.txt' if es_zip(archivo_entrada) else ext}"
     
     print(f"📖 Leyendo archivo: {archivo_entrada}")
     print(f"🔍 Buscando empresa: '{texto_empresa}'")
     print(f"📱 Teléfono usuario: '{telefono}'")
+    formato_exportacion = formato_archivo(archivo_entrada, formato)
+    print(f"🧭 Formato: {formato_exportacion.nombre} ({formato_exportacion.ejemplo})")
+    print(f"💾 Escribiendo archivo procesado: {archivo_salida}")
     
-    with open(archivo_entrada, 'r', encoding='utf-8', errors='ignore') as f:
-        lineas = f.readlines()
-    
-    total_lineas = len(lineas)
-    print(f"📊 Total de líneas a procesar: {total_lineas}")
+    contador = {"procesadas": 0}
     
-    for i, linea in enumerate(lineas, 1):
-        linea_original = linea.rstrip('\n\r')
-        linea_stripped = linea_original.strip()
-        
-        # Si la línea está vacía, mantenerla
-        if not linea_stripped:
-            lineas_procesadas.append('')
-            continue
-        
-        # Eliminar líneas que contengan mensajes de seguridad de WhatsApp
-        if "Cambió tu código de seguridad con" in linea_stripped:
-            print(f"🗑️  Línea {i} eliminada (mensaje de seguridad): {linea_stripped[:50]}...")
-            continue
-        
-        # Buscar la primera línea con el texto de la empresa y eliminarla
-        if not encontro_empresa and texto_empresa_lower in linea_stripped.lower():
-            print(f"🗑️  Línea {i} eliminada (contiene texto de empresa): {linea_stripped[:50]}...")
-            encontro_empresa = True
-            eliminar_siguiente = True
-            continue
-        
-        # Si acabamos de eliminar una línea, procesar la siguiente
-        if eliminar_siguiente:
-            eliminar_siguiente = False
-        
-        # Identificar el tipo de línea
-        tipo = identificar_tipo_linea(linea_stripped, texto_empresa, telefono)
-        
-        if tipo == 'empresa':
-            # Extraer solo el mensaje (sin fecha/hora/nombre)
-            # Usar un patrón que capture TODO después del nombre del remitente
-            patron_mensaje = r'\[\d{1,2}/\d{1,2}/\d{2,4},?\s+\d{1,2}:\d{2}(?::\d{2})?\s*[AP]?M?\]\s*-\s*[^:]+:\s*(.+)'
-            match = re.match(patron_mensaje, linea_stripped)
-            
-            if match:
-                mensaje = match.group(1).strip()
-                mensaje = aplicar_reemplazo(mensaje)
-                lineas_procesadas.append(f"ai: {mensaje}")
-            else:
-                # Si no coincide con el patrón estándar, buscar manualmente
-                if ' - ' in linea_stripped:
-                    # Dividir por " - " y tomar la segunda parte (remitente: mensaje)
-                    partes_guion = linea_stripped.split(' - ', 1)
-                    if len(partes_guion) > 1:
-                        parte_derecha = partes_guion[1]
-                        # Buscar el primer ":" que separa el nombre del mensaje
-                        indice_dos_puntos = parte_derecha.find(':')
-                        if indice_dos_puntos >= 0:
-                            # Extraer todo después del primer ":" (incluye URLs completas)
-                            mensaje = parte_derecha[indice_dos_puntos + 1:].strip()
-                            mensaje = aplicar_reemplazo(mensaje)
-                            lineas_procesadas.append(f"ai: {mensaje}")
-                        else:
-                            # Si no hay ":", la parte derecha es el mensaje completo
-                            mensaje = aplicar_reemplazo(parte_derecha)
-                            lineas_procesadas.append(f"ai: {mensaje}")
-                    else:
-                        mensaje = aplicar_reemplazo(linea_stripped)
-                        lineas_procesadas.append(f"ai: {mensaje}")
-                elif ':' in linea_stripped:
-                    # Si no hay " - ", buscar el primer ":" que separa nombre de mensaje
-                    if linea_stripped.startswith(('http://', 'https://')):
-                        mensaje = aplicar_reemplazo(linea_stripped)
-                        lineas_procesadas.append(f"ai: {mensaje}")
-                    else:
-                        indice_primer_dos_puntos = linea_stripped.find(':')
-                        if indice_primer_dos_puntos >= 0:
-                            mensaje = linea_stripped[indice_primer_dos_puntos + 1:].strip()
-                            mensaje = aplicar_reemplazo(mensaje)
-                            lineas_procesadas.append(f"ai: {mensaje}")
-                        else:
-                            mensaje = aplicar_reemplazo(linea_stripped)
-                            lineas_procesadas.append(f"ai: {mensaje}")
-                else:
-                    # No hay ":" ni " - ", es probablemente solo el mensaje
-                    mensaje = aplicar_reemplazo(linea_stripped)
-                    lineas_procesadas.append(f"ai: {mensaje}")
-        
-        elif tipo == 'usuario':
-            # Extraer solo el mensaje (sin fecha/hora/nombre)
-            # Usar un patrón que capture TODO después del nombre del remitente
-            # Esto maneja URLs y otros casos con múltiples ":"
-            patron_mensaje = r'\[\d{1,2}/\d{1,2}/\d{2,4},?\s+\d{1,2}:\d{2}(?::\d{2})?\s*[AP]?M?\]\s*-\s*[^:]+:\s*(.+)'
-            match = re.match(patron_mensaje, linea_stripped)
-            
-            if match:
-                mensaje = match.group(1).strip()
-                mensaje = aplicar_reemplazo(mensaje)
-                lineas_procesadas.append(f"user: {mensaje}")
-            else:
-                # Si no coincide con el patrón estándar, buscar manualmente
-                # Buscar el patrón " - " que separa fecha de remitente
-                if ' - ' in linea_stripped:
-                    # Dividir por " - " y tomar la segunda parte (remitente: mensaje)
-                    partes_guion = linea_stripped.split(' - ', 1)
-                    if len(partes_guion) > 1:
-                        parte_derecha = partes_guion[1]
-                        # Buscar el primer ":" que separa el nombre del mensaje
-                        # Usar find() para encontrar el primer ":" después del nombre
-                        indice_dos_puntos = parte_derecha.find(':')
-                        if indice_dos_puntos >= 0:
-                            # Extraer todo después del primer ":" (incluye URLs completas)
-                            mensaje = parte_derecha[indice_dos_puntos + 1:].strip()
-                            mensaje = aplicar_reemplazo(mensaje)
-                            lineas_procesadas.append(f"user: {mensaje}")
-                        else:
-                            # Si no hay ":", la parte derecha es el mensaje completo
-                            mensaje = aplicar_reemplazo(parte_derecha)
-                            lineas_procesadas.append(f"user: {mensaje}")
-                    else:
-                        mensaje = aplicar_reemplazo(linea_stripped)
-                        lineas_procesadas.append(f"user: {mensaje}")
-                elif ':' in linea_stripped:
-                    # Si no hay " - ", buscar el primer ":" que separa nombre de mensaje
-                    # Pero verificar primero si la línea empieza con http (es solo el mensaje)
-                    if linea_stripped.startswith(('http://', 'https://')):
-                        mensaje = aplicar_reemplazo(linea_stripped)
-                        lineas_procesadas.append(f"user: {mensaje}")
-                    else:
-                        # Buscar el primer ":" que probablemente separa nombre de mensaje
-                        indice_primer_dos_puntos = linea_stripped.find(':')
-                        if indice_primer_dos_puntos >= 0:
-                            mensaje = linea_stripped[indice_primer_dos_puntos + 1:].strip()
-                            mensaje = aplicar_reemplazo(mensaje)
-                            lineas_procesadas.append(f"user: {mensaje}")
-                        else:
-                            mensaje = aplicar_reemplazo(linea_stripped)
-                            lineas_procesadas.append(f"user: {mensaje}")
-                else:
-                    # No hay ":" ni " - ", es probablemente solo el mensaje
-                    mensaje = aplicar_reemplazo(linea_stripped)
-                    lineas_procesadas.append(f"user: {mensaje}")
-        
-        else:
-            # Si no se puede identificar, intentar extraer el mensaje
-            patron_mensaje = r'\[\d{1,2}/\d{1,2}/\d{2,4},?\s+\d{1,2}:\d{2}(?::\d{2})?\s*[AP]?M?\]\s*-\s*[^:]+:\s*(.+)'
-            match = re.match(patron_mensaje, linea_stripped)
-            
-            if match:
-                mensaje = match.group(1).strip()
-                mensaje = aplicar_reemplazo(mensaje)
-                # Por defecto, asumir que es del usuario si no se puede identificar
-                lineas_procesadas.append(f"user: {mensaje}")
-            elif ':' in linea_stripped:
-                # Intentar extraer después del último ":"
-                partes = linea_stripped.rsplit(':', 1)
-                if len(partes) > 1:
-                    mensaje = partes[1].strip()
-                    mensaje = aplicar_reemplazo(mensaje)
-                    lineas_procesadas.append(f"user: {mensaje}")
-                else:
-                    mensaje = aplicar_reemplazo(linea_stripped)
-                    lineas_procesadas.append(mensaje)
-            else:
-                mensaje = aplicar_reemplazo(linea_stripped)
-                lineas_procesadas.append(mensaje)
-    
-    # Combinar líneas consecutivas que empiezan con "ai:" o "user:"
-    lineas_finales = []
-    i = 0
-    while i < len(lineas_procesadas):
-        linea_actual = lineas_procesadas[i]
-        
-        # Si la línea empieza con "ai:", buscar líneas consecutivas
-        if linea_actual.startswith("ai: "):
-            mensajes_ai = []
-            # Extraer el mensaje de la primera línea (sin "ai: ")
-            mensaje = linea_actual[4:].strip()  # Quitar "ai: " (4 caracteres)
-            mensajes_ai.append(mensaje)
-            
-            # Buscar líneas consecutivas que también empiecen con "ai:"
-            j = i + 1
-            while j < len(lineas_procesadas) and lineas_procesadas[j].startswith("ai: "):
-                mensaje_siguiente = lineas_procesadas[j][4:].strip()  # Quitar "ai: "
-                mensajes_ai.append(mensaje_siguiente)
-                j += 1
-            
-            # Si hay más de un mensaje, combinarlos
-            if len(mensajes_ai) > 1:
-                mensaje_combinado = "\\n".join(mensajes_ai)
-                lineas_finales.append(f"ai: {mensaje_combinado}")
-                print(f"🔗 Líneas {i+1}-{j} combinadas: {len(mensajes_ai)} mensajes de ai")
-            else:
-                # Solo una línea, mantenerla como está
-                lineas_finales.append(linea_actual)
-            
-            # Avanzar al siguiente índice después de las líneas procesadas
-            i = j
-        
-        # Si la línea empieza con "user:", buscar líneas consecutivas
-        elif linea_actual.startswith("user: "):
-            mensajes_user = []
-            # Extraer el mensaje de la primera línea (sin "user: ")
-            mensaje = linea_actual[6:].strip()  # Quitar "user: " (6 caracteres)
-            mensajes_user.append(mensaje)
-            
-            # Buscar líneas consecutivas que también empiecen con "user:"
-            j = i + 1
-            while j < len(lineas_procesadas) and lineas_procesadas[j].startswith("user: "):
-                mensaje_siguiente = lineas_procesadas[j][6:].strip()  # Quitar "user: "
-                mensajes_user.append(mensaje_siguiente)
-                j += 1
-            
-            # Si hay más de un mensaje, combinarlos
-            if len(mensajes_user) > 1:
-                mensaje_combinado = "\\n".join(mensajes_user)
-                lineas_finales.append(f"user: {mensaje_combinado}")
-                print(f"🔗 Líneas {i+1}-{j} combinadas: {len(mensajes_user)} mensajes de user")
-            else:
-                # Solo una línea, mantenerla como está
-                lineas_finales.append(linea_actual)
-            
-            # Avanzar al siguiente índice después de las líneas procesadas
-            i = j
-        else:
-            # No es una línea "ai:" ni "user:", mantenerla como está
-            lineas_finales.append(linea_actual)
-            i += 1
+    def contar(lineas: Iterable[str]) -> Iterator[str]:
+        for linea in lineas:
+            contador["procesadas"] += 1
+            yield linea
     
-    # Escribir el archivo procesado
-    print(f"💾 Escribiendo archivo procesado: {archivo_salida}")
-    with open(archivo_salida, 'w', encoding='utf-8') as f:
-        f.write('\n'.join(lineas_finales))
-        if lineas_finales and lineas_finales[-1]:  # Agregar nueva línea final si es necesario
-            f.write('\n')
+    if incremental:
+        ruta_punto = ruta_punto_control(archivo_salida)
+        punto = leer_punto_control(ruta_punto) if os.path.exists(archivo_salida) else None
+        if punto:
+            print(f"📍 Punto de control: mensaje del {punto.marca_tiempo}, se agregan solo los posteriores")
+        ultimo = {}
+        registros = registros_chat(leer_lineas(archivo_entrada), texto_empresa, telefono, formato=formato_exportacion)
+        registros = filtrar_nuevos(registros, punto, ultimo, final)
+        escribir_lineas(combinar_turnos(contar(formatear_registros(registros))), archivo_salida, anexar=punto is not None)
+        if ultimo:
+            guardar_punto_control(ruta_punto, PuntoControl(**ultimo))
+    elif procesos > 1 and os.path.getsize(archivo_entrada) > tamano_rango and not es_zip(archivo_entrada):
+        turnos = procesar_en_paralelo(archivo_entrada, texto_empresa, telefono, procesos, tamano_rango, contador,
+                                      formato_exportacion)
+        escribir_lineas(turnos, archivo_salida)
+    else:
+        lineas = clasificar_lineas(leer_lineas(archivo_entrada), texto_empresa, telefono, formato=formato_exportacion)
+        escribir_lineas(combinar_turnos(contar(lineas)), archivo_salida)
     
     print(f"✅ Procesamiento completado!")
-    print(f"   Líneas procesadas: {len(lineas_procesadas)}")
+    print(f"   Líneas procesadas: {contador['procesadas']}")
     print(f"   Archivo guardado en: {archivo_salida}")
     
     return archivo_salida
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Convierte un chat exportado de WhatsApp en líneas ai:/user:",
+        epilog='Ejemplo: %(prog)s "Limpieza de pozos:" "+591 69023378" chat.txt salida.txt --procesos 4'
+    )
+    parser.add_argument("texto_empresa", help="Texto que identifica a la empresa")
+    parser.add_argument("telefono", help="Número de teléfono del usuario")
+    parser.add_argument("archivo_entrada", help="Chat exportado (.txt o .zip de WhatsApp)")
+    parser.add_argument("archivo_salida", nargs="?", help="Archivo de salida (default: entrada_procesado.txt)")
+    parser.add_argument("--procesos", type=int, default=1,
+                        help="Procesos para parsear archivos grandes en paralelo (default: 1)")
+    parser.add_argument("--tamano-rango-mb", type=float, default=TAMANO_RANGO / (1024 * 1024),
+                        help="Tamaño de cada rango del modo paralelo en MB (default: %(default)g)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Agregar solo los mensajes posteriores al punto de control de la salida")
+    parser.add_argument("--final", action="store_true",
+                        help="Con --incremental, incluir el último par en lugar de dejarlo pendiente")
+    parser.add_argument("--reglas", default=ARCHIVO_REGLAS,
+                        help="JSON con reglas de descarte y reemplazo (default: $WHATSAPP_REGLAS o las incluidas)")
+    parser.add_argument("--formato-exportacion", choices=list(FORMATOS_EXPORTACION),
+                        help="Formato de las líneas del chat (default: detectarlo en las primeras líneas)")
+    parser.add_argument("--debug", action="store_true", help="Mostrar el traceback en caso de error")
+    return parser.parse_args()
+
+
 def main():
     """Función principal del script"""
-    if len(sys.argv) < 4:
-        print("❌ Error: Faltan argumentos")
-        print("\nUso:")
-        print(f"  {sys.argv[0]} \"texto_empresa\" \"telefono\" archivo_entrada.txt [archivo_salida.txt]")
-        print("\nEjemplo:")
-        print(f"  {sys.argv[0]} \"Limpieza de pozos:\" \"+591 69023378\" chat.txt")
-        print(f"  {sys.argv[0]} \"Limpieza de pozos:\" \"+591 69023378\" chat.txt salida.txt")
-        sys.exit(1)
-    
-    texto_empresa = sys.argv[1]
-    telefono = sys.argv[2]
-    archivo_entrada = sys.argv[3]
-    archivo_salida = sys.argv[4] if len(sys.argv) > 4 else None
+    args = parse_args()
     
     try:
+        usar_reglas(cargar_reglas(args.reglas))
         archivo_procesado = procesar_archivo_whatsapp(
-            archivo_entrada=archivo_entrada,
-            texto_empresa=texto_empresa,
-            telefono=telefono,
-            archivo_salida=archivo_salida
+            archivo_entrada=args.archivo_entrada,
+            texto_empresa=args.texto_empresa,
+            telefono=args.telefono,
+            archivo_salida=args.archivo_salida,
+            procesos=max(1, args.procesos),
+            tamano_rango=max(1, int(args.tamano_rango_mb * 1024 * 1024)),
+            incremental=args.incremental,
+            formato=args.formato_exportacion,
+            final=args.final
         )
         print(f"\n✨ Archivo procesado exitosamente: {archivo_procesado}")
     except Exception as e:
         print(f"❌ Error al procesar el archivo: {str(e)}")
         import traceback
-        if '--debug' in sys.argv:
+        if args.debug:
             traceback.print_exc()
         sys.exit(1)
 
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Script para separar por contacto un chat exportado de una cuenta de empresa.
+
+Cuando la exportación mezcla las conversaciones de la empresa con varios clientes,
+se lee una sola vez: cada remitente que no es la empresa tiene su propia
+conversación, y las respuestas de la empresa (y las líneas de continuación) van a la
+conversación del último cliente que escribió. Las salidas de todos los contactos se
+escriben a la vez durante esa pasada, en lugar de procesar el archivo completo una
+vez por teléfono.
+
+Cada salida es la misma que daría process_whatsapp.py (o whatsapp_pairs.py) con el
+remitente como teléfono sobre las líneas de ese contacto. La primera línea con el
+texto de la empresa se descarta una sola vez para todo el archivo.
+
+Uso:
+    python split_whatsapp.py "texto_empresa" archivo_entrada.txt [directorio_salida] [--formato txt|json|jsonl]
+
+Ejemplo:
+    python split_whatsapp.py "Limpieza de pozos:" chat_empresa.txt
+    python split_whatsapp.py "Limpieza de pozos:" chat_empresa.zip contactos/ --formato json
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from typing import Dict, List, Optional
+
+from convert_to_json import procesar_linea
+from process_whatsapp import ARCHIVO_REGLAS, FORMATOS_EXPORTACION, ClasificadorLineas, RegistroLinea, cargar_reglas, \
+    formatear_registro, formato_archivo, leer_lineas, mensajes_chat, prefijo_turno, unir_turno, usar_reglas
+from whatsapp_pairs import formatear_par_json
+
+FORMATOS = ("txt", "json", "jsonl")
+
+# Líneas (o pares) que se acumulan por contacto antes de escribirlas: así no queda un
+# archivo abierto por contacto
+LINEAS_BUFFER = 1000
+
+# Caracteres que no se usan en el nombre del archivo de un contacto
+_PATRON_NOMBRE_INVALIDO = re.compile(r'[^\w+\-. ]+')
+
+# Índice de contactos, en el directorio de salida
+ARCHIVO_INDICE = "contactos.json"
+
+
+def nombre_archivo_contacto(contacto: str, formato: str = "txt") -> str:
+    """Nombre del archivo de salida de un contacto: "<contacto>_procesado.<formato>" """
+    nombre = _PATRON_NOMBRE_INVALIDO.sub('_', contacto).strip(' .') or "contacto"
+    return f"{nombre}_procesado.{formato}"
+
+
+class SalidaContacto:
+    """
+    Conversación de un contacto, escrita a medida que llegan sus líneas.
+
+    Combina los turnos igual que combinar_turnos (y empareja igual que
+    convert_to_json en json/jsonl), pero recibiendo las líneas de a una: los
+    contactos se intercalan en el archivo y cada uno guarda solo su turno en curso.
+    """
+
+    def __init__(self, contacto: str, texto_empresa: str, ruta: str, formato: str = "txt"):
+        self.contacto = contacto
+        self.ruta = ruta
+        self.formato = formato
+        self.clasificador = ClasificadorLineas(texto_empresa, contacto)
+        self.mensajes = 0  # Líneas del chat recibidas
+        self.escritas = 0  # Líneas (txt) o pares (json/jsonl) escritos
+        self._prefijo = None
+        self._grupo = []
+        self._user_actual = None
+        self._ultima = ''
+        self._pendiente = []
+        open(ruta, 'w', encoding='utf-8').close()
+
+    def agregar(self, registro: Optional[RegistroLinea]):
+        """Agrega una línea interpretada (None por cada línea vacía)"""
+        self.mensajes += 1
+        linea = '' if registro is None else formatear_registro(registro)
+        prefijo = prefijo_turno(linea)
+        if self._grupo and prefijo == self._prefijo:
+            self._grupo.append(linea)
+            return
+        if self._grupo:
+            self._emitir(unir_turno(self._prefijo, self._grupo))
+            self._grupo = []
+        if prefijo is None:
+            self._emitir(linea)
+        else:
+            self._prefijo = prefijo
+            self._grupo = [linea]
+
+    def _emitir(self, linea: str):
+        if self.formato == "txt":
+            self._pendiente.append(f"\n{linea}" if self.escritas else linea)
+            self._ultima = linea
+            self.escritas += 1
+        else:
+            turno = procesar_linea(linea)
+            if turno is None:
+                return
+            if turno["tipo"] == "user":
+                if self._user_actual is not None:
+                    self._emitir_par({"user": self._user_actual, "ai": ""})
+                self._user_actual = turno["mensaje"]
+                return
+            self._emitir_par({"user": self._user_actual or "", "ai": turno["mensaje"]})
+            self._user_actual = None
+        if len(self._pendiente) >= LINEAS_BUFFER:
+            self._volcar()
+
+    def _emitir_par(self, par: Dict[str, str]):
+        if self.formato == "jsonl":
+            self._pendiente.append(json.dumps(par, ensure_ascii=False) + "\n")
+        else:
+            self._pendiente.append((",\n  " if self.escritas else "[\n  ") + formatear_par_json(par))
+        self.escritas += 1
+
+    def _volcar(self):
+        if self._pendiente:
+            with open(self.ruta, 'a', encoding='utf-8') as f:
+                f.write(''.join(self._pendiente))
+            self._pendiente = []
+
+    def cerrar(self) -> int:
+        """
+        Cierra el turno en curso y termina de escribir el archivo.
+
+        Returns:
+            Cantidad de líneas (txt) o pares (json/jsonl) escritos
+        """
+        if self._grupo:
+            self._emitir(unir_turno(self._prefijo, self._grupo))
+            self._grupo = []
+        if self.formato == "txt":
+            if self.escritas and self._ultima:
+                self._pendiente.append('\n')
+        else:
+            if self._user_actual is not None:
+                self._emitir_par({"user": self._user_actual, "ai": ""})
+                self._user_actual = None
+            if self.formato == "json":
+                self._pendiente.append("\n]" if self.escritas else "[]")
+        self._volcar()
+        return self.escritas
+
+
+def separar_por_contacto(
+    archivo_entrada: str,
+    texto_empresa: str,
+    directorio_salida: Optional[str] = None,
+    formato: str = "txt",
+    formato_exportacion: Optional[str] = None
+) -> Dict[str, SalidaContacto]:
+    """
+    Separa un chat de cuenta de empresa en una conversación por contacto, en una pasada.
+
+    Es empresa el remitente que contiene texto_empresa; cualquier otro remitente es
+    un contacto. Las líneas sin remitente (respuestas de la empresa, continuaciones,
+    líneas vacías) siguen al último contacto que escribió. Las líneas anteriores al
+    primer contacto van a ese primer contacto.
+
+    Args:
+        archivo_entrada: Chat exportado (.txt o .zip de WhatsApp)
+        texto_empresa: Texto que identifica a la empresa
+        directorio_salida: Directorio de las salidas (default: <entrada>_contactos)
+        formato: "txt" (líneas ai:/user:), "json" o "jsonl" (pares user/ai)
+        formato_exportacion: Formato de las líneas del chat (default: detectarlo)
+
+    Returns:
+        Salida de cada contacto, por remitente, en orden de aparición
+
+    Raises:
+        FileNotFoundError: Si el archivo no existe
+    """
+    if not os.path.exists(archivo_entrada):
+        raise FileNotFoundError(f"El archivo {archivo_entrada} no existe")
+    if formato not in FORMATOS:
+        raise Exception(f"Formato desconocido: {formato} (opciones: {', '.join(FORMATOS)})")
+
+    if directorio_salida is None:
+        base, _ = os.path.splitext(archivo_entrada)
+        directorio_salida = f"{base}_contactos"
+    os.makedirs(directorio_salida, exist_ok=True)
+
+    print(f"📖 Leyendo archivo: {archivo_entrada}")
+    print(f"🔍 Buscando empresa: '{texto_empresa}'")
+    exportacion = formato_archivo(archivo_entrada, formato_exportacion)
+    print(f"🧭 Formato: {exportacion.nombre} ({exportacion.ejemplo})")
+    print(f"💾 Escribiendo conversaciones en: {directorio_salida}")
+
+    empresa = texto_empresa.lower().strip()
+    salidas: Dict[str, SalidaContacto] = {}
+    nombres = set()
+    previas: List[tuple] = []  # Mensajes anteriores al primer contacto
+    actual: Optional[SalidaContacto] = None
+
+    def salida_de(contacto: str) -> SalidaContacto:
+        salida = salidas.get(contacto)
+        if salida is None:
+            nombre = nombre_archivo_contacto(contacto, formato)
+            base, ext = os.path.splitext(nombre)
+            numero = 2
+            while nombre.lower() in nombres:
+                nombre = f"{base}_{numero}{ext}"
+                numero += 1
+            nombres.add(nombre.lower())
+            salida = SalidaContacto(contacto, texto_empresa, os.path.join(directorio_salida, nombre), formato)
+            salidas[contacto] = salida
+        return salida
+
+    # Mismos descartes que registros_chat, una sola vez para todo el archivo
+    for mensaje in mensajes_chat(leer_lineas(archivo_entrada), texto_empresa, exportacion):
+        if mensaje is None:
+            if actual:
+                actual.agregar(None)
+            else:
+                previas.append(None)
+            continue
+
+        linea, grupos = mensaje
+        # El patrón corta el remitente en el primer ":", que puede ser parte de texto_empresa
+        if grupos and empresa not in f"{grupos[1]}:".lower():
+            contacto = grupos[1].strip()
+            if actual is None or actual.contacto != contacto:
+                actual = salida_de(contacto)
+                for previo in previas:
+                    actual.agregar(None if previo is None else actual.clasificador.interpretar(*previo))
+                previas = []
+
+        if actual:
+            actual.agregar(actual.clasificador.interpretar(linea, grupos))
+        else:
+            previas.append(mensaje)
+
+    if previas:
+        print(f"⚠️  {len(previas)} mensajes sin ningún contacto (solo mensajes de la empresa), no se escriben")
+
+    for salida in salidas.values():
+        salida.cerrar()
+
+    indice = [
+        {"contacto": salida.contacto, "archivo": os.path.basename(salida.ruta),
+         "mensajes": salida.mensajes, "escritas": salida.escritas}
+        for salida in salidas.values()
+    ]
+    with open(os.path.join(directorio_salida, ARCHIVO_INDICE), 'w', encoding='utf-8') as f:
+        json.dump(indice, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ Separación completada!")
+    print(f"   Contactos: {len(salidas)}")
+    print(f"   Índice: {os.path.join(directorio_salida, ARCHIVO_INDICE)}")
+    return salidas
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Separa un chat de cuenta de empresa en una conversación por contacto",
+        epilog='Ejemplo: %(prog)s "Limpieza de pozos:" chat_empresa.txt contactos/ --formato json'
+    )
+    parser.add_argument("texto_empresa", help="Texto que identifica a la empresa")
+    parser.add_argument("archivo_entrada", help="Chat exportado (.txt o .zip de WhatsApp)")
+    parser.add_argument("directorio_salida", nargs="?", help="Directorio de salida (default: entrada_contactos)")
+    parser.add_argument("--formato", choices=FORMATOS, default="txt",
+                        help="txt: líneas ai:/user:, json/jsonl: pares user/ai (default: txt)")
+    parser.add_argument("--reglas", default=ARCHIVO_REGLAS,
+                        help="JSON con reglas de descarte y reemplazo (default: $WHATSAPP_REGLAS o las incluidas)")
+    parser.add_argument("--formato-exportacion", choices=list(FORMATOS_EXPORTACION),
+                        help="Formato de las líneas del chat (default: detectarlo en las primeras líneas)")
+    parser.add_argument("--debug", action="store_true", help="Mostrar el traceback en caso de error")
+    return parser.parse_args()
+
+
+def main():
+    """Función principal del script"""
+    args = parse_args()
+
+    try:
+        usar_reglas(cargar_reglas(args.reglas))
+        salidas = separar_por_contacto(args.archivo_entrada, args.texto_empresa, args.directorio_salida, args.formato,
+                                       args.formato_exportacion)
+    except Exception as e:
+        print(f"❌ Error al procesar el archivo: {str(e)}")
+        if args.debug:
+            import traceback
+            traceback.print_exc()
+        sys.exit(1)
+
+    for salida in salidas.values():
+        print(f"   - {salida.contacto}: {salida.escritas} {'líneas' if args.formato == 'txt' else 'conversaciones'}"
+              f" → {os.path.basename(salida.ruta)}")
+
+
+if __name__ == "__main__":
+    main()
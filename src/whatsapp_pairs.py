@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Script para convertir un chat exportado de WhatsApp directamente en pares user/ai.
+
+Hace en una sola pasada lo mismo que process_whatsapp.py + convert_to_json.py, sin
+archivo _procesado.txt intermedio ni volver a parsear los prefijos "ai:"/"user:".
+Los pares son idénticos a los de los dos scripts por separado.
+
+Uso:
+    python whatsapp_pairs.py "texto_empresa" "telefono" archivo_entrada.txt [archivo_salida | -] [--jsonl]
+
+Ejemplo:
+    python whatsapp_pairs.py "Limpieza de pozos:" "+591 69023378" chat.txt
+    python whatsapp_pairs.py "Limpieza de pozos:" "+591 69023378" chat.txt - --jsonl | consumidor
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+from typing import Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+from convert_to_json import anexar_pares_json, emparejar_turnos
+from process_whatsapp import ARCHIVO_REGLAS, FORMATOS_EXPORTACION, FormatoExportacion, PuntoControl, RegistroLinea, \
+    aplicar_reemplazo, cargar_reglas, filtrar_nuevos, formato_archivo, guardar_punto_control, leer_lineas, \
+    leer_punto_control, prefijo_turno, registros_chat, ruta_punto_control, usar_reglas
+
+TIPOS_PREFIJO = {"ai: ": "ai", "user: ": "user"}
+
+
+def turno_de_registro(registro: Optional[RegistroLinea]) -> Optional[Tuple[str, str]]:
+    """
+    Tipo y texto de una línea interpretada.
+
+    Returns:
+        ("ai" | "user", texto), o None si la línea corta el turno (vacía o sin hablante)
+    """
+    if registro is None:
+        return None
+    texto = aplicar_reemplazo(registro.texto)
+    if registro.rol == 'empresa':
+        return "ai", texto
+    if registro.rol == 'usuario':
+        return "user", texto
+    # Texto suelto que ya viene con prefijo: se toma como ese hablante
+    prefijo = prefijo_turno(texto)
+    if prefijo:
+        return TIPOS_PREFIJO[prefijo], texto[len(prefijo):]
+    return None
+
+
+def agrupar_turnos(turnos: Iterable[Optional[Tuple[str, str]]]) -> Iterator[Tuple[str, str]]:
+    """
+    Une los mensajes consecutivos del mismo hablante con saltos de línea.
+
+    Mismo resultado que combinar_turnos + procesar_linea de convert_to_json: un turno
+    de un solo mensaje vacío se descarta y "\\n" literal se convierte en salto de línea.
+    """
+    tipo_actual = None
+    grupo = []
+
+    def cerrar_turno() -> Optional[Tuple[str, str]]:
+        if len(grupo) == 1:
+            mensaje = grupo[0].strip()
+            return (tipo_actual, mensaje.replace("\\n", "\n")) if mensaje else None
+        return tipo_actual, "\n".join(texto.strip().replace("\\n", "\n") for texto in grupo)
+
+    for turno in turnos:
+        if turno is not None and grupo and turno[0] == tipo_actual:
+            grupo.append(turno[1])
+            continue
+        if grupo:
+            cerrado = cerrar_turno()
+            if cerrado:
+                yield cerrado
+            grupo = []
+        if turno is not None:
+            tipo_actual, texto = turno
+            grupo = [texto]
+
+    if grupo:
+        cerrado = cerrar_turno()
+        if cerrado:
+            yield cerrado
+
+
+def pares_de_registros(registros: Iterable[Optional[RegistroLinea]]) -> Iterator[Dict[str, str]]:
+    """Pares {user, ai} a partir de las líneas interpretadas, a medida que llegan"""
+    return emparejar_turnos(agrupar_turnos(turno_de_registro(registro) for registro in registros))
+
+
+def pares_de_lineas(
+    lineas: Iterable[str],
+    texto_empresa: str,
+    telefono: str,
+    formato: Optional[FormatoExportacion] = None
+) -> Iterator[Dict[str, str]]:
+    """Pares {user, ai} a partir de las líneas de un chat exportado, a medida que se leen"""
+    return pares_de_registros(registros_chat(lineas, texto_empresa, telefono, formato=formato))
+
+
+def pares_whatsapp(
+    archivo_entrada: str,
+    texto_empresa: str,
+    telefono: str,
+    punto: Optional[PuntoControl] = None,
+    ultimo: Optional[dict] = None,
+    formato: Optional[str] = None,
+    final: bool = False
+) -> Iterator[Dict[str, str]]:
+    """
+    Pares {user, ai} de un archivo de WhatsApp, leído en streaming.
+
+    Args:
+        punto: Si se pasa, solo se emparejan los mensajes posteriores a este punto de control
+        ultimo: Se actualiza con el punto de control del último mensaje leído (ver filtrar_nuevos)
+        formato: Formato de la exportación (default: detectarlo en las primeras líneas)
+        final: Con punto de control, emparejar también el último par
+
+    Raises:
+        FileNotFoundError: Si el archivo no existe
+    """
+    if not os.path.exists(archivo_entrada):
+        raise FileNotFoundError(f"El archivo {archivo_entrada} no existe")
+    exportacion = formato_archivo(archivo_entrada, formato)
+    registros = registros_chat(leer_lineas(archivo_entrada), texto_empresa, telefono, formato=exportacion)
+    if punto is not None or ultimo is not None:
+        registros = filtrar_nuevos(registros, punto, {} if ultimo is None else ultimo, final)
+    return pares_de_registros(registros)
+
+
+def _json(valor: str) -> str:
+    return json.dumps(valor, ensure_ascii=False)
+
+
+def formatear_par_json(par: Dict[str, str]) -> str:
+    """Un par como objeto JSON con el indent=2 de un elemento del array"""
+    campos = ",\n    ".join(f"{_json(clave)}: {_json(valor)}" for clave, valor in par.items())
+    return f"{{\n    {campos}\n  }}"
+
+
+def escribir_json(pares: Iterable[Dict[str, str]], f: TextIO) -> int:
+    """
+    Escribe los pares como array JSON a medida que llegan.
+
+    El formato es el mismo que json.dump(..., ensure_ascii=False, indent=2) de
+    convert_to_json.py, pero cada campo se codifica con el encoder en C de json
+    (con indent, json usa el encoder en Python, varias veces más lento).
+
+    Returns:
+        Cantidad de pares escritos
+    """
+    total = 0
+    for par in pares:
+        f.write(",\n  " if total else "[\n  ")
+        f.write(formatear_par_json(par))
+        total += 1
+    f.write("\n]" if total else "[]")
+    return total
+
+
+def escribir_jsonl(pares: Iterable[Dict[str, str]], f: TextIO) -> int:
+    """
+    Escribe un par JSON por línea (JSON Lines), haciendo flush de cada uno.
+
+    Returns:
+        Cantidad de pares escritos
+    """
+    total = 0
+    for par in pares:
+        f.write(json.dumps(par, ensure_ascii=False) + "\n")
+        f.flush()
+        total += 1
+    return total
+
+
+def convertir_whatsapp(
+    archivo_entrada: str,
+    texto_empresa: str,
+    telefono: str,
+    archivo_salida: Optional[str] = None,
+    jsonl: bool = False,
+    incremental: bool = False,
+    formato: Optional[str] = None,
+    final: bool = False
+) -> int:
+    """
+    Convierte un archivo de WhatsApp en un JSON (o JSON Lines) de pares user/ai.
+
+    Con incremental, el punto de control del último mensaje se guarda junto a la
+    salida. Con una exportación nueva del mismo chat solo se emparejan los mensajes
+    posteriores: se agregan al final del JSON (y a <base>_nuevos.json) o del JSONL, sin
+    tocar los pares anteriores. El último par queda pendiente hasta la próxima
+    exportación (ver filtrar_nuevos), salvo con final.
+
+    Args:
+        archivo_entrada: Ruta al archivo de WhatsApp original
+        texto_empresa: Texto que identifica a la empresa
+        telefono: Número de teléfono del usuario
+        archivo_salida: Ruta de salida (default: entrada_procesado.json/.jsonl)
+        jsonl: Escribir JSON Lines en lugar de un array JSON
+        incremental: Agregar solo lo posterior al punto de control
+        formato: Formato de la exportación (default: detectarlo)
+        final: Con incremental, incluir el último par (el chat no va a seguir)
+
+    Returns:
+        Cantidad de pares escritos
+    """
+    if archivo_salida is None:
+        base, _ = os.path.splitext(archivo_entrada)
+        archivo_salida = f"{base}_procesado.{'jsonl' if jsonl else 'json'}"
+
+    punto = None
+    ultimo = {} if incremental else None
+    if incremental:
+        ruta_punto = ruta_punto_control(archivo_salida)
+        punto = leer_punto_control(ruta_punto) if os.path.exists(archivo_salida) else None
+        if punto:
+            print(f"📍 Punto de control: mensaje del {punto.marca_tiempo}, se agregan solo los posteriores")
+    pares = pares_whatsapp(archivo_entrada, texto_empresa, telefono, punto, ultimo, formato, final)
+
+    if punto is not None and not jsonl:
+        nuevos = list(pares)
+        archivo_nuevos = anexar_pares_json(archivo_salida, nuevos)
+        total = len(nuevos)
+        print(f"✅ {total} conversaciones nuevas agregadas a: {archivo_salida}")
+        print(f"   Solo las nuevas: {archivo_nuevos}")
+    else:
+        with open(archivo_salida, 'a' if punto is not None else 'w', encoding='utf-8') as f:
+            total = (escribir_jsonl if jsonl else escribir_json)(pares, f)
+        print(f"✅ Archivo {'JSONL' if jsonl else 'JSON'} {'actualizado' if punto else 'creado'}: {archivo_salida}")
+
+    if ultimo:
+        guardar_punto_control(ruta_punto, PuntoControl(**ultimo))
+    return total
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Convierte un chat exportado de WhatsApp en pares user/ai")
+    parser.add_argument("texto_empresa", help="Texto que identifica a la empresa")
+    parser.add_argument("telefono", help="Número de teléfono del usuario")
+    parser.add_argument("archivo_entrada", help="Chat exportado (.txt o .zip de WhatsApp)")
+    parser.add_argument("archivo_salida", nargs="?",
+                        help="Archivo de salida, '-' para stdout (default: entrada_procesado.json)")
+    parser.add_argument("--jsonl", action="store_true", help="Un par JSON por línea (JSON Lines)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Agregar solo los mensajes posteriores al punto de control de la salida")
+    parser.add_argument("--final", action="store_true",
+                        help="Con --incremental, incluir el último par en lugar de dejarlo pendiente")
+    parser.add_argument("--checkpoint",
+                        help="Punto de control con salida por stdout (default: junto al archivo de entrada)")
+    parser.add_argument("--reglas", default=ARCHIVO_REGLAS,
+                        help="JSON con reglas de descarte y reemplazo (default: $WHATSAPP_REGLAS o las incluidas)")
+    parser.add_argument("--formato-exportacion", choices=list(FORMATOS_EXPORTACION),
+                        help="Formato de las líneas del chat (default: detectarlo en las primeras líneas)")
+    parser.add_argument("--debug", action="store_true", help="Mostrar el traceback en caso de error")
+    return parser.parse_args()
+
+
+def main():
+    """Función principal del script"""
+    args = parse_args()
+    salida_estandar = args.archivo_salida == "-"
+    stdout = sys.stdout
+
+    # Con salida por stdout, los mensajes de progreso van a stderr
+    with contextlib.redirect_stdout(sys.stderr) if salida_estandar else contextlib.nullcontext():
+        print(f"📖 Leyendo archivo: {args.archivo_entrada}")
+        try:
+            usar_reglas(cargar_reglas(args.reglas))
+            if salida_estandar:
+                # Con --incremental por stdout se emiten solo los pares nuevos
+                ruta_punto = args.checkpoint or ruta_punto_control(args.archivo_entrada)
+                punto = leer_punto_control(ruta_punto) if args.incremental else None
+                ultimo = {} if args.incremental else None
+                pares = pares_whatsapp(args.archivo_entrada, args.texto_empresa, args.telefono, punto, ultimo,
+                                       args.formato_exportacion, args.final)
+                total = (escribir_jsonl if args.jsonl else escribir_json)(pares, stdout)
+                if ultimo:
+                    guardar_punto_control(ruta_punto, PuntoControl(**ultimo))
+            else:
+                total = convertir_whatsapp(args.archivo_entrada, args.texto_empresa, args.telefono,
+                                           args.archivo_salida, args.jsonl, args.incremental,
+                                           args.formato_exportacion, args.final)
+        except Exception as e:
+            print(f"❌ Error al procesar el archivo: {str(e)}")
+            if args.debug:
+                import traceback
+                traceback.print_exc()
+            sys.exit(1)
+
+        if total:
+            print(f"   Conversaciones procesadas: {total}")
+        else:
+            print(f"⚠️  No se encontraron conversaciones en {args.archivo_entrada}")
+
+
+if __name__ == "__main__":
+    main()